@@ -9,10 +9,20 @@ from dotenv import load_dotenv
 import ast
 import pickle
 from rank_bm25 import BM25Okapi
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-import string
+from text_processing import preprocess_text
+from similarity_engine import ComponentSimilarityEngine, top_k_rows
+from bm25_index import SparseBM25
+from bm25_neighbors import BM25NeighborTable
+from embedding_store import EmbeddingStore, PackedTexts
+from index_cache import CompositeIndex, CompositeIndexCache, weights_cache_key
+from memory_report import array_bytes, build_report
+from db_pool import get_pool
+from response_cache import ResponseCache
+from ranking_cache import RankingCache
+from random_pool import RandomSamplePool
+from catalog_version import CatalogVersion, VersionedResource
+from title_index import TitleIndex
+from genre_index import GenreIndex
 
 # --- AYARLAR ---
 # Environment belirleme (default: development)
@@ -33,6 +43,10 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 EMBEDDINGS_DIR = os.path.join(BASE_DIR, 'embeddings')
 POPULAR_ITEMS_LIMIT = 10000
 EMB_DIM = 2560
+# `scripts/export_embedding_store.py` ile üretilen mmap bileşen dosyası
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", os.path.join(EMBEDDINGS_DIR, 'popular_components.bin'))
+# `scripts/build_bm25_neighbors.py` ile önceden hesaplanan BM25 komşu tablosu
+BM25_NEIGHBORS_PATH = os.getenv("BM25_NEIGHBORS_PATH", os.path.join(EMBEDDINGS_DIR, 'bm25_neighbors.bin'))
 
 # --- VARSAYILAN AĞIRLIKLAR ---
 DEFAULT_QUERY_TIME_WEIGHTS = {
@@ -53,45 +67,158 @@ if not app.secret_key:
         app.secret_key = "dev-secret-key-change-me"
 
 # --- GLOBAL KAYNAKLAR ---
-BM25_MODEL = None
-BM25_IDS = None
-POPULAR_ITEMS_COMPONENTS = {}
-
-# --- NLTK VE METİN İŞLEME ---
-try:
-    stopwords.words('english')
-except LookupError:
-    nltk.download('stopwords')
-    nltk.download('punkt')
-
-
-def preprocess_text(text):
-    if not text: return []
-    stop_words = set(stopwords.words('english'))
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    word_tokens = word_tokenize(text.lower())
-    return [w for w in word_tokens if not w in stop_words]
-
+BM25_INDEX = None  # SparseBM25
+BM25_NEIGHBORS = None  # BM25NeighborTable, yoksa BM25 sorgusu istek anında çalışır
+SIMILARITY_ENGINE = None
+POPULAR_ITEMS_OVERVIEWS = None  # PackedTexts, SIMILARITY_ENGINE satır sırasında
+# Kaynakları yükleyen sürecin pid'i. gunicorn preload modunda master'dır ve
+# worker'lar kaynakları fork ile (copy-on-write) paylaşır; bkz. gunicorn.conf.py
+RESOURCES_LOADED_PID = None
+
+# Bileşen saklama hassasiyeti: float32 | float16 | int8. float32 dışındaki
+# modlarda ilk geçiş nicemlenmiş veri üzerinde yapılır, en iyi adaylar
+# (RERANK_FACTOR x K) diskteki float32 veriden birebir yeniden skorlanır.
+# Bu yüzden nicemleme sadece bileşenler embedding store'dan (mmap) açıldığında
+# yapılır; veritabanından yüklenen float32 kopyanın üstüne ikinci bir kopya eklenmez.
+COMPONENT_STORAGE = os.getenv("COMPONENT_STORAGE", "float32")
+RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", "4"))
+QUANTIZATION_RECALL_SAMPLE = int(os.getenv("QUANTIZATION_RECALL_SAMPLE", "50"))
+QUANTIZATION_REPORT = None
+
+# Ağırlık profiline özel bileşik FAISS indeksleri (LRU + bellek bütçesi)
+INDEX_CACHE = CompositeIndexCache(
+    max_entries=int(os.getenv("INDEX_CACHE_MAX_ENTRIES", "8")),
+    max_bytes=int(os.getenv("INDEX_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# Katalog listesi endpoint'lerinin hazır JSON cevapları (ETag/304 destekli).
+# Girdiler süre dolunca ya da `scripts/import_data.py` katalog sürümünü
+# artırınca (bkz. catalog_version.py) yeniden üretilir.
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE = ResponseCache(max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")))
+
+# /popular-movies ve /popular-books için rastgele örnekleme havuzu. Posteri
+# olan dizilerin id'leri RANDOM_POOL_REFRESH saniyede bir (veya katalog
+# sürümü değişince) yüklenir; her istek bu havuzdan 50 id çeker.
+RANDOM_POOL_REFRESH = float(os.getenv("RANDOM_POOL_REFRESH", "600"))
+RANDOM_POOL_SEED = int(os.environ["RANDOM_POOL_SEED"]) if os.getenv("RANDOM_POOL_SEED") else None
+
+# /search için bellek içi n-gram başlık indeksi. Kapatılırsa (TITLE_INDEX_ENABLED=0)
+# sorgu veritabanında çalışır; bu durumda `004_add_title_trgm_index.sql`
+# migration'ı ile gelen pg_trgm GIN indeksi kullanılır.
+TITLE_INDEX_ENABLED = os.getenv("TITLE_INDEX_ENABLED", "1").lower() in ("1", "true", "yes")
+SEARCH_LIMIT = 100
+
+# Benzerlik haritası: tek seferde sıralanan en fazla komşu (30 satır x 7)
+SIMILAR_MAP_MAX = 210
+# Harita sayfaları aynı sıralamadan dilimlenir; sıralama (dizi, ağırlıklar)
+# başına önbellekte tutulur, böylece her sayfa ilk 210'u yeniden hesaplamaz.
+SIMILAR_MAP_CACHE_TTL = int(os.getenv("SIMILAR_MAP_CACHE_TTL", "600"))
+SIMILAR_MAP_CACHE = RankingCache(max_entries=int(os.getenv("SIMILAR_MAP_CACHE_MAX_ENTRIES", "256")))
+# Haritada aday dışı eklenen BM25 dokümanı sayısı; BM25 komşu tablosunun
+# top_n değerini (varsayılan 50) aşmadığı sürece sorgu tablodan cevaplanır.
+SIMILAR_MAP_BM25_TOP_K = int(os.getenv("SIMILAR_MAP_BM25_TOP_K", "50"))
+# Toplu benzerlik isteğinde en fazla kaynak dizi
+SIMILAR_BATCH_MAX_SEEDS = int(os.getenv("SIMILAR_BATCH_MAX_SEEDS", "50"))
+# Favorilere göre öneride merkez (centroid) skorunun payı; kalan pay
+# kaynak başına en yüksek benzerliğe verilir.
+FAVORITES_CENTROID_WEIGHT = float(os.getenv("FAVORITES_CENTROID_WEIGHT", "0.5"))
 
 def load_resources():
-    global BM25_MODEL, BM25_IDS, POPULAR_ITEMS_COMPONENTS
+    global BM25_INDEX, BM25_NEIGHBORS, SIMILARITY_ENGINE, POPULAR_ITEMS_OVERVIEWS, RESOURCES_LOADED_PID, \
+        QUANTIZATION_REPORT
     print("Kaynaklar yükleniyor...")
 
     try:
-        bm25_path = os.path.join(EMBEDDINGS_DIR, 'bm25_overview.pkl')
-        with open(bm25_path, 'rb') as f:
-            bm25_data = pickle.load(f)
-            BM25_MODEL = bm25_data['bm25_model']
-            BM25_IDS = bm25_data['item_ids']
+        # Öncelik `scripts/export_bm25_index.py` ile üretilen .npz; yoksa
+        # pickle yüklenip seyrek matrise çevrilir.
+        npz_path = os.path.join(EMBEDDINGS_DIR, 'bm25_overview.npz')
+        if os.path.exists(npz_path):
+            BM25_INDEX = SparseBM25.load(npz_path)
+        else:
+            bm25_path = os.path.join(EMBEDDINGS_DIR, 'bm25_overview.pkl')
+            with open(bm25_path, 'rb') as f:
+                bm25_data = pickle.load(f)
+            BM25_INDEX = SparseBM25.from_okapi(bm25_data['bm25_model'], bm25_data['item_ids'])
         print("BM25 indeksi yüklendi.")
     except Exception as e:
         print(f"Uyarı: BM25 indeksi yüklenemedi. {e}")
 
+    if BM25_INDEX is not None and os.path.exists(BM25_NEIGHBORS_PATH):
+        try:
+            table = BM25NeighborTable.load(BM25_NEIGHBORS_PATH)
+            # Farklı bir BM25 modeline göre üretilmiş tablo istek anındaki
+            # sonuçla aynı olmaz; bu durumda kullanılmaz.
+            if table.fingerprint != BM25_INDEX.fingerprint():
+                raise ValueError("tablo güncel BM25 indeksine ait değil, yeniden üretin")
+            BM25_NEIGHBORS = table
+            print(f"BM25 komşu tablosu yüklendi: {len(table)} dizi")
+        except Exception as e:
+            print(f"Uyarı: BM25 komşu tablosu kullanılamıyor. {e}")
+
+    required_keys = list(key for key in DEFAULT_QUERY_TIME_WEIGHTS.keys() if key.startswith('emb_'))
+    if os.path.exists(EMBEDDING_STORE_PATH):
+        try:
+            store = EmbeddingStore(EMBEDDING_STORE_PATH)
+            if store.component_keys != required_keys:
+                raise ValueError(f"bileşenler uyuşmuyor: {store.component_keys}")
+            SIMILARITY_ENGINE = store.engine()
+            POPULAR_ITEMS_OVERVIEWS = store.overviews()
+            print(f"{len(SIMILARITY_ENGINE)} adet dizinin bileşenleri diskten (mmap) açıldı: {EMBEDDING_STORE_PATH}")
+        except Exception as e:
+            print(f"Uyarı: Embedding store açılamadı, veritabanından yüklenecek. {e}")
+
+    if SIMILARITY_ENGINE is None:
+        load_popular_items_from_db(required_keys)
+
+    if SIMILARITY_ENGINE is not None:
+        INDEX_CACHE.clear()
+        default_weight_vec = SIMILARITY_ENGINE.weight_vector(DEFAULT_QUERY_TIME_WEIGHTS)
+
+    if SIMILARITY_ENGINE is not None and COMPONENT_STORAGE != 'float32':
+        try:
+            # İlk geçişi önbellekteki nicemlenmiş (SQ) bileşik indeks yapar;
+            # motorun nicemlenmiş kopyası sadece indeks bütçeye sığmazsa kurulur.
+            SIMILARITY_ENGINE.quantize(COMPONENT_STORAGE, RERANK_FACTOR, copy=False)
+            composite = get_composite_index(default_weight_vec)
+            if composite is None:
+                SIMILARITY_ENGINE.quantize(COMPONENT_STORAGE, RERANK_FACTOR)
+            QUANTIZATION_REPORT = SIMILARITY_ENGINE.quantization_report(
+                default_weight_vec, sample=QUANTIZATION_RECALL_SAMPLE, index=composite)
+            print(f"Bileşenler {COMPONENT_STORAGE} olarak tutuluyor: "
+                  f"ilk geçiş {QUANTIZATION_REPORT['resident_bytes'] / 1e6:.1f} MB bellekte, "
+                  f"float32 {QUANTIZATION_REPORT['float32_mapped_bytes'] / 1e6:.1f} MB mmap, "
+                  f"recall@{QUANTIZATION_REPORT['k']}={QUANTIZATION_REPORT['recall_at_k']:.3f}")
+        except Exception as e:
+            print(f"Uyarı: Bileşenler nicemlenemedi, float32 kullanılacak. {e}")
+            SIMILARITY_ENGINE.quantize('float32')
+            INDEX_CACHE.clear()
+
+    if SIMILARITY_ENGINE is not None:
+        get_composite_index(default_weight_vec)
+
+    if TITLE_INDEX_ENABLED:
+        try:
+            title_index = TITLE_INDEX.load()
+            print(f"Başlık indeksi hazır: {len(title_index)} kayıt, {title_index.nbytes / 1e6:.1f} MB")
+        except Exception as e:
+            print(f"Uyarı: Başlık indeksi kurulamadı, arama veritabanından yapılacak. {e}")
+
+    try:
+        genre_index = GENRE_INDEX.load()
+        print(f"Tür indeksi hazır: {len(genre_index)} dizi, {len(genre_index.genre_names)} tür")
+    except Exception as e:
+        print(f"Uyarı: Tür indeksi kurulamadı, tür sorguları veritabanından yapılacak. {e}")
+
+    RESOURCES_LOADED_PID = os.getpid()
+
+
+def load_popular_items_from_db(required_keys):
+    """Embedding store yoksa bileşenleri `embeddings` JSONB kolonundan yükler (yavaş yol)."""
+    global SIMILARITY_ENGINE, POPULAR_ITEMS_OVERVIEWS
     print(f"En popüler {POPULAR_ITEMS_LIMIT} dizinin bileşenleri hafızaya yükleniyor...")
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            required_keys = list(key for key in DEFAULT_QUERY_TIME_WEIGHTS.keys() if key.startswith('emb_'))
+        with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
                 SELECT id, embeddings, overview
                 FROM media_items
@@ -100,92 +227,252 @@ def load_resources():
                 LIMIT %s
             """, (POPULAR_ITEMS_LIMIT,))
             rows = cur.fetchall()
-            for row in rows:
-                components = {key: row['embeddings'].get(key) for key in required_keys if
-                              row['embeddings'] and row['embeddings'].get(key)}
-                components['overview_text'] = row.get('overview', '')
-                POPULAR_ITEMS_COMPONENTS[row['id']] = components
-        conn.close()
-        print(f"{len(POPULAR_ITEMS_COMPONENTS)} adet dizinin bileşenleri hafızaya yüklendi.")
+            items = {row['id']: row['embeddings'] or {} for row in rows}
+            overviews = [row.get('overview', '') for row in rows]
+        # Bileşenler birim normlu float32 matrislere ve Gram tablosuna dönüştürülür;
+        # JSON listeleri sadece bu adımda tutulur.
+        SIMILARITY_ENGINE = ComponentSimilarityEngine.from_item_components(items, required_keys, EMB_DIM)
+        POPULAR_ITEMS_OVERVIEWS = PackedTexts.from_strings(overviews)
+        print(f"{len(SIMILARITY_ENGINE)} adet dizinin bileşenleri hafızaya yüklendi.")
     except Exception as e:
         print(f"Uyarı: Popüler item'lar yüklenemedi. {e}")
 
 
 def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+    """Havuzdan bağlantı ödünç verir; `with` bloğu bitince havuza geri döner."""
+    return get_pool(DATABASE_URL).connection()
+
+
+def load_random_pool_ids():
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id
+            FROM media_items
+            WHERE source_type = 'tv'
+              AND poster_path IS NOT NULL
+              AND poster_path != ''
+        """)
+        return np.array([row[0] for row in cur.fetchall()], dtype=np.int64)
+
+
+RANDOM_POOL = RandomSamplePool(load_random_pool_ids, refresh_interval=RANDOM_POOL_REFRESH,
+                               seed=RANDOM_POOL_SEED, catalog_version=CatalogVersion())
+
+
+LIST_COLUMNS = "id, title, poster_path, year, overview, genres, popularity, source_type"
+
+
+def fetch_media_items(cur, item_ids, columns=LIST_COLUMNS):
+    """Verilen id'lerin satırlarını tek sorguda, id listesinin sırasıyla döner."""
+    if not item_ids:
+        return []
+    cur.execute(f"SELECT {columns} FROM media_items WHERE id = ANY(%s)", (list(item_ids),))
+    results_map = {row['id']: row for row in cur.fetchall()}
+    return [results_map[item_id] for item_id in item_ids if item_id in results_map]
+
+
+def random_tv_page(limit):
+    """Havuzdan rastgele `limit` dizi; sıralama örneklemin sırasıdır."""
+    sampled_ids = RANDOM_POOL.sample(limit)
+    if not sampled_ids:
+        return []
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        return fetch_media_items(cur, sampled_ids)
+
+
+def load_title_index():
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, title, poster_path, year, source_type
+            FROM media_items
+            ORDER BY popularity DESC NULLS LAST, id
+        """)
+        return TitleIndex.build(cur.fetchall())
+
+
+# Katalog sürümü değişince (import sonrası) arka planda yeniden kurulur
+TITLE_INDEX = VersionedResource('title index', load_title_index)
+
+
+def load_genre_index():
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, genres, poster_path
+            FROM media_items
+            WHERE source_type = 'tv'
+            ORDER BY popularity DESC NULLS LAST, id
+        """)
+        return GenreIndex.build(cur.fetchall())
+
+
+# Tür listeleri ve tür örtüşmesi benzerliği için bitmap indeksi
+GENRE_INDEX = VersionedResource('genre index', load_genre_index)
+
+
+def get_composite_index(weight_vec):
+    """
+    Ağırlık profili için önbellekteki bileşik indeksi döner (yoksa kurar).
+
+    Yuvarlanmış anahtar sadece önbellek araması içindir; indeks isteğin
+    yuvarlanmamış ağırlıklarıyla kurulur. Ölçeği farklı profiller aynı
+    skorları verir; normalize ağırlıkları 1e-4'ten yakın olan profiller ise
+    ilk kurulan profilin indeksini paylaşır.
+    """
+    key = weights_cache_key(weight_vec)
+    nbytes = CompositeIndex.expected_nbytes(len(SIMILARITY_ENGINE), SIMILARITY_ENGINE.dim, SIMILARITY_ENGINE.storage)
+
+    def build():
+        vectors = SIMILARITY_ENGINE.composite_vectors(np.asarray(weight_vec, dtype=np.float64))
+        return CompositeIndex(key, vectors, SIMILARITY_ENGINE.item_ids, storage=SIMILARITY_ENGINE.storage)
+
+    return INDEX_CACHE.get_or_build(key, nbytes, build)
+
+
+def similar_candidates(source_row, weight_vec, k, query_vector=None):
+    """
+    Kaynak satır için bileşik skora göre ilk k adayı (id, skor) döner.
+
+    Önbellekte tam hassasiyetli indeks varsa doğrudan ondan, nicemlenmiş
+    indeks varsa k * RERANK_FACTOR aday alınıp float32 veriden yeniden
+    skorlanarak, indeks yoksa doğrudan motor üzerinden aranır. Popüler
+    listede olmayan kaynaklar için sorgu vektörü dışarıdan verilir.
+    """
+    composite = get_composite_index(weight_vec)
+    if composite is not None and composite.exact:
+        if query_vector is None:
+            query_vector = composite.query_vector(source_row)
+        return composite.search(query_vector, k)
+
+    if query_vector is None:
+        query_vector = SIMILARITY_ENGINE.query_vector(source_row, weight_vec)
+    if composite is not None:
+        rows, _ = composite.search_rows(query_vector, k * SIMILARITY_ENGINE.rerank_factor)
+        return SIMILARITY_ENGINE.rerank(query_vector, weight_vec, rows, k)
+    return SIMILARITY_ENGINE.search(query_vector, weight_vec, k)
+
+
+def similar_candidates_batch(source_rows, weight_vec, k):
+    """
+    similar_candidates() ile aynı sonuçları birden çok kaynak satır için tek
+    matris araması (GEMM) ile döner: kaynak başına (id'ler, skorlar).
+    """
+    composite = get_composite_index(weight_vec)
+    if composite is not None and composite.exact:
+        return composite.search_batch(composite.query_vectors(source_rows), k)
+
+    query_vectors = SIMILARITY_ENGINE.query_vectors(source_rows, weight_vec)
+    if composite is not None:
+        rerank_k = k * SIMILARITY_ENGINE.rerank_factor
+        return [SIMILARITY_ENGINE.rerank(query_vector, weight_vec, rows, k)
+                for query_vector, (rows, _) in zip(query_vectors, composite.search_rows_batch(query_vectors, rerank_k))]
+    return SIMILARITY_ENGINE.search_batch(query_vectors, weight_vec, k)
+
+
+def bm25_scores(tv_id, source_row, candidate_ids, k, overview=None):
+    """
+    Dizinin özetine göre en yüksek skorla normalize edilmiş BM25 skorları:
+    (vektör adaylarının skorları, en iyi k BM25 dokümanının (id, skor) listesi).
+
+    Her vektör adayı kendi BM25 skorunu alır; ilk k doküman yalnızca
+    adaylar dışındaki dokümanları eklemek için kullanılır. Önceden
+    hesaplanmış tabloda dizi güncel özetiyle varsa ve k dokümanı kapsıyorsa
+    normalizasyon skoru ve ilk k oradan okunur, sadece adaylar puanlanır;
+    yoksa bütün korpus skorlanır.
+
+    Eklenen dokümanlar korpus sırasında döner, böylece eşit skorlu sonuçlar
+    bütün korpusu sırayla skorlamakla aynı sırada kalır.
+    """
+    no_scores = np.zeros(len(candidate_ids)), []
+    source_overview = POPULAR_ITEMS_OVERVIEWS.get(source_row) if source_row is not None else overview
+    if BM25_INDEX is None or not source_overview:
+        return no_scores
+    candidate_rows = BM25_INDEX.rows_of(candidate_ids)
+
+    table_row = BM25_NEIGHBORS.current_row(tv_id, source_overview) if BM25_NEIGHBORS is not None else None
+    if table_row is not None and BM25_NEIGHBORS.top_n >= k:
+        max_score = float(BM25_NEIGHBORS.max_scores[table_row])
+        if max_score <= 0:
+            return no_scores
+        neighbor_ids, neighbor_scores = BM25_NEIGHBORS.lookup(tv_id)
+        order = np.argsort(BM25_INDEX.rows_of(neighbor_ids), kind='stable')
+        # Sorgu terimleri tabloda saklı, özet yeniden işlenmez
+        terms = BM25_NEIGHBORS.query_terms_of(table_row)
+        return (BM25_INDEX.scores_for_terms(terms, candidate_rows) / max_score,
+                list(zip(neighbor_ids[order].tolist(), neighbor_scores[order].tolist())))
+
+    doc_scores = BM25_INDEX.get_scores(preprocess_text(source_overview))
+    max_score = doc_scores.max() if len(doc_scores) else 0
+    if max_score <= 0:
+        return no_scores
+    candidate_scores = np.where(candidate_rows >= 0, doc_scores[candidate_rows], 0.0) / max_score
+    top_rows = np.sort(top_k_rows(doc_scores, k))
+    return candidate_scores, list(zip(BM25_INDEX.item_ids[top_rows].tolist(),
+                                      (doc_scores[top_rows] / max_score).tolist()))
+
+
+def rank_similar(tv_id, weight_vec, bm25_weight, limit, source_row=None, query_vector=None, overview=None,
+                 candidates=None, bm25_top_k=None):
+    """
+    Vektör adayları ile BM25 skorlarını birleştirip en iyi `limit` sonucu
+    (id, skor) olarak, skora göre azalan sırada döner. Kaynak dizi hariçtir.
+    Vektör adayları (limit + 1 adet) toplu aramadan hazır verilebilir.
+    `bm25_top_k` verilirse aday dışı eklenen BM25 dokümanları ilk
+    `bm25_top_k` ile sınırlanır (adayların BM25 skoru yine tam hesaplanır).
+    """
+    final_scores = {}
+
+    if candidates is None:
+        candidates = similar_candidates(source_row, weight_vec, limit + 1, query_vector)
+    candidate_ids, distances = candidates
+    candidate_ids = candidate_ids.tolist()
+    candidate_bm25, bm25_top = np.zeros(len(candidate_ids)), []
+    if bm25_weight > 0:
+        # Aday olmayan bir doküman sadece BM25 payıyla yarışır; ilk `limit`
+        # sonuca girebilecek olanlar adaylar ve kaynak dizi dışındaki ilk
+        # `limit` BM25 dokümanıdır, bu yüzden ilk (aday sayısı + limit + 1) yeterlidir.
+        k = len(candidate_ids) + limit + 1
+        if bm25_top_k is not None:
+            k = min(k, bm25_top_k)
+        candidate_bm25, bm25_top = bm25_scores(tv_id, source_row, candidate_ids, k, overview)
+
+    for item_id, score, bm25_score in zip(candidate_ids, distances.tolist(), candidate_bm25.tolist()):
+        if item_id == tv_id: continue
+        final_scores[item_id] = score + bm25_score * bm25_weight
+
+    for item_id, score in bm25_top:
+        if item_id == tv_id or item_id in final_scores: continue
+        final_scores[item_id] = score * bm25_weight
+
+    sorted_candidates = sorted(final_scores.items(), key=lambda item: item[1], reverse=True)
+    return sorted_candidates[:limit]
 
 
 # --- ANA ARAMA VE SIRALAMA MANTIĞI ---
 @app.route('/similar/<int:tv_id>')
 def show_similar(tv_id):
-    if not POPULAR_ITEMS_COMPONENTS:
+    if SIMILARITY_ENGINE is None:
         return "Popüler dizi bileşenleri hafızaya yüklenemedi.", 500
 
-    source_item_components = POPULAR_ITEMS_COMPONENTS.get(tv_id)
-    if not source_item_components:
+    source_row = SIMILARITY_ENGINE.row_of(tv_id)
+    if source_row is None:
         return f"Aranan dizi (ID: {tv_id}), en popüler {POPULAR_ITEMS_LIMIT} listesinde bulunmuyor.", 404
 
     active_weights = session.get('query_weights', DEFAULT_QUERY_TIME_WEIGHTS)
 
-    # --- ANLIK AĞIRLIKLANDIRMA VE FAISS İNDEKSİ OLUŞTURMA ---
-    candidate_ids, candidate_vectors = [], []
-    for item_id, components in POPULAR_ITEMS_COMPONENTS.items():
-        final_vec = np.zeros(EMB_DIM, dtype=np.float32)
-        total_weight = 0
-        for key, weight in active_weights.items():
-            if key.startswith('emb_') and key in components and weight > 0:
-                final_vec += np.array(components[key], dtype=np.float32) * weight
-                total_weight += weight
-        if total_weight > 0: final_vec /= total_weight
-        candidate_ids.append(item_id)
-        candidate_vectors.append(final_vec)
-
-    candidate_vectors = np.array(candidate_vectors, dtype=np.float32)
-    faiss.normalize_L2(candidate_vectors)
-    index = faiss.IndexFlatIP(EMB_DIM)
-    id_map = np.array(candidate_ids, dtype=np.int64)
-    index.add(candidate_vectors)
-
-    query_final_vec = np.zeros(EMB_DIM, dtype=np.float32)
-    query_total_weight = 0
-    for key, weight in active_weights.items():
-        if key.startswith('emb_') and key in source_item_components and weight > 0:
-            query_final_vec += np.array(source_item_components[key], dtype=np.float32) * weight
-            query_total_weight += weight
-    if query_total_weight > 0: query_final_vec /= query_total_weight
-
-    query_vector = query_final_vec.reshape(1, -1)
-    faiss.normalize_L2(query_vector)
+    # --- ANLIK AĞIRLIKLANDIRMA ---
+    # Sık kullanılan ağırlık profilleri önbellekteki bileşik indeksten aranır;
+    # bütçeye sığmayan durumda skorlar bileşen matrisleri ve Gram tablosu
+    # üzerinden birebir aynı şekilde hesaplanır.
+    weight_vec = SIMILARITY_ENGINE.weight_vector(active_weights)
 
     # --- STAGE 1: RETRIEVAL & FUSION ---
-    final_scores = {}
-
-    distances, indices = index.search(query_vector, 21)
-    for i in range(len(indices[0])):
-        item_id = int(id_map[indices[0][i]])
-        if item_id == tv_id: continue
-        score = distances[0][i]
-        final_scores[item_id] = final_scores.get(item_id, 0) + score
-
-    bm25_weight = active_weights.get("bm25_overview", 0)
-    if BM25_MODEL and bm25_weight > 0 and source_item_components.get('overview_text'):
-        tokenized_query = preprocess_text(source_item_components['overview_text'])
-        doc_scores = BM25_MODEL.get_scores(tokenized_query)
-        max_score = np.max(doc_scores)
-        if max_score > 0:
-            normalized_scores = doc_scores / max_score
-            for item_id, score in zip(BM25_IDS, normalized_scores):
-                if item_id == tv_id: continue
-                weighted_score = score * bm25_weight
-                final_scores[item_id] = final_scores.get(item_id, 0) + weighted_score
-
-    sorted_candidates = sorted(final_scores.items(), key=lambda item: item[1], reverse=True)
-    top_20_ids = [item_id for item_id, score in sorted_candidates[:20]]
+    top_20 = rank_similar(tv_id, weight_vec, active_weights.get("bm25_overview", 0), 20, source_row=source_row)
+    final_scores = dict(top_20)
+    top_20_ids = [item_id for item_id, score in top_20]
 
     # --- Sonuçları Getirme ve Gösterme ---
     similar_items = []
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("SELECT * FROM media_items WHERE id = %s AND source_type = 'tv'", (tv_id,))
         source_item_details = cur.fetchone()
 
@@ -198,12 +485,144 @@ def show_similar(tv_id):
                 if item_details:
                     item_details['similarity_percent'] = int(min(final_scores[item_id], 1.0) * 100)
                     similar_items.append(item_details)
-    conn.close()
 
     return render_template('similar.html', source_item=source_item_details, similar_items=similar_items,
                            image_url=TMDB_IMAGE_URL)
 
 
+@app.route('/api/similar/batch', methods=['POST'])
+def similar_batch():
+    """
+    Birden çok dizinin benzerlerini tek istekte döner.
+
+    Gövde: {"ids": [...], "limit": 20}. Bütün kaynaklar tek matris
+    aramasıyla sıralanır, tüm sonuçların metadata'sı tek sorguda getirilir.
+    """
+    if SIMILARITY_ENGINE is None:
+        return jsonify({"error": "Similarity engine is not loaded"}), 500
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        seed_ids = list(dict.fromkeys(int(seed_id) for seed_id in payload.get('ids') or []))
+        limit = min(max(int(payload.get('limit', 20)), 1), SIMILAR_MAP_MAX)
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids must be a list of integers"}), 400
+    if not seed_ids:
+        return jsonify({"error": "ids must be a non-empty list"}), 400
+    if len(seed_ids) > SIMILAR_BATCH_MAX_SEEDS:
+        return jsonify({"error": f"At most {SIMILAR_BATCH_MAX_SEEDS} ids per request"}), 400
+
+    active_weights = session.get('query_weights', DEFAULT_QUERY_TIME_WEIGHTS)
+    weight_vec = SIMILARITY_ENGINE.weight_vector(active_weights)
+    bm25_weight = active_weights.get("bm25_overview", 0)
+
+    seeds = [(seed_id, SIMILARITY_ENGINE.row_of(seed_id)) for seed_id in seed_ids]
+    missing = [seed_id for seed_id, row in seeds if row is None]
+    seeds = [(seed_id, row) for seed_id, row in seeds if row is not None]
+
+    ranked = {}
+    if seeds:
+        batch = similar_candidates_batch([row for _, row in seeds], weight_vec, limit + 1)
+        for (seed_id, row), candidates in zip(seeds, batch):
+            ranked[seed_id] = rank_similar(seed_id, weight_vec, bm25_weight, limit, source_row=row,
+                                           candidates=candidates)
+
+    # Kaynaklar arasında tekrar eden sonuçlar bir kez getirilir.
+    unique_ids = list(dict.fromkeys(item_id for results in ranked.values() for item_id, _ in results))
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        rows_by_id = {row['id']: row for row in fetch_media_items(cur, unique_ids)}
+
+    results = []
+    for seed_id, _ in seeds:
+        similar_items = []
+        for item_id, score in ranked[seed_id]:
+            row = rows_by_id.get(item_id)
+            if row:
+                similar_items.append(dict(row, similarity_percent=int(min(score, 1.0) * 100)))
+        results.append({"source_id": seed_id, "similar_items": similar_items})
+
+    return jsonify({"results": results, "missing": missing})
+
+
+def parse_seeds(raw_seeds):
+    """[id, ...] veya [{"id": ..., "weight": ...}, ...] listesini {id: ağırlık} yapar."""
+    seeds = {}
+    for seed in raw_seeds:
+        if isinstance(seed, dict):
+            seed_id, weight = int(seed['id']), float(seed.get('weight', 1.0))
+        else:
+            seed_id, weight = int(seed), 1.0
+        if weight < 0:
+            raise ValueError("negative weight")
+        seeds[seed_id] = seeds.get(seed_id, 0.0) + weight
+    return seeds
+
+
+@app.route('/api/similar/favorites', methods=['POST'])
+def similar_to_favorites():
+    """
+    Birden çok favori diziye birlikte benzeyen diziler.
+
+    Gövde: {"seeds": [{"id": 1399, "weight": 2}, 1396, ...], "limit": 20}.
+    Tüm kaynaklar ve ağırlıklı merkezleri bileşen matrislerine karşı tek
+    geçişte skorlanır; skor merkez benzerliği ile kaynak başına en yüksek
+    benzerliğin karışımıdır. Kaynak diziler sonuçlarda yer almaz.
+    """
+    if SIMILARITY_ENGINE is None:
+        return jsonify({"error": "Similarity engine is not loaded"}), 500
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        seeds = parse_seeds(payload.get('seeds') or payload.get('ids') or [])
+        limit = min(max(int(payload.get('limit', 20)), 1), SIMILAR_MAP_MAX)
+    except (TypeError, ValueError, KeyError):
+        return jsonify({"error": "seeds must be a list of ids or {id, weight} objects"}), 400
+    if not seeds:
+        return jsonify({"error": "seeds must be a non-empty list"}), 400
+    if len(seeds) > SIMILAR_BATCH_MAX_SEEDS:
+        return jsonify({"error": f"At most {SIMILAR_BATCH_MAX_SEEDS} seeds per request"}), 400
+
+    active_weights = session.get('query_weights', DEFAULT_QUERY_TIME_WEIGHTS)
+    weight_vec = SIMILARITY_ENGINE.weight_vector(active_weights)
+
+    seed_rows = {seed_id: SIMILARITY_ENGINE.row_of(seed_id) for seed_id in seeds}
+    indexed = [seed_id for seed_id, row in seed_rows.items() if row is not None]
+    query_ids = list(indexed)
+    queries = [SIMILARITY_ENGINE.query_vectors([seed_rows[seed_id] for seed_id in indexed], weight_vec)]
+
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        # Popüler listede olmayan kaynakların sorgu vektörleri kendi bileşenlerinden kurulur.
+        others = [seed_id for seed_id, row in seed_rows.items() if row is None]
+        if others:
+            cur.execute("SELECT id, embeddings FROM media_items WHERE id = ANY(%s) AND source_type = 'tv'",
+                        (others,))
+            for row in cur.fetchall():
+                query_vector = SIMILARITY_ENGINE.query_from_components(row['embeddings'] or {}, weight_vec)
+                if query_vector.any():
+                    query_ids.append(row['id'])
+                    queries.append(query_vector[None, :])
+        found = set(query_ids)
+        missing = [seed_id for seed_id in seeds if seed_id not in found]
+
+        ranked = []
+        if query_ids:
+            result_ids, scores = SIMILARITY_ENGINE.search_multi_seed(
+                np.vstack(queries), [seeds[seed_id] for seed_id in query_ids], weight_vec, limit,
+                exclude_rows=[seed_rows[seed_id] for seed_id in indexed],
+                centroid_weight=FAVORITES_CENTROID_WEIGHT)
+            ranked = list(zip(result_ids.tolist(), scores.tolist()))
+        rows_by_id = {row['id']: row for row in fetch_media_items(cur, [item_id for item_id, _ in ranked])}
+
+    similar_items = []
+    for item_id, score in ranked:
+        row = rows_by_id.get(item_id)
+        if row:
+            row['similarity_percent'] = int(min(max(score, 0.0), 1.0) * 100)
+            similar_items.append(row)
+
+    return jsonify({"seeds": query_ids, "missing": missing, "similar_items": similar_items})
+
+
 @app.route('/get-weights', methods=['GET'])
 def get_weights():
     """Mevcut aktif ağırlıkları arayüze gönderir."""
@@ -226,6 +645,56 @@ def update_weights():
     return jsonify({"status": "success", "message": "Ağırlıklar güncellendi."})
 
 
+@app.route('/api/debug/memory', methods=['GET'])
+def debug_memory():
+    """Worker bellek raporu: RSS/PSS ve paylaşılan/özel sayfalar ile kaynak boyutları."""
+    engine_arrays = []
+    if SIMILARITY_ENGINE is not None:
+        engine_arrays = list(SIMILARITY_ENGINE.unit_components.values()) + [
+            SIMILARITY_ENGINE.norms, SIMILARITY_ENGINE.gram, SIMILARITY_ENGINE.item_ids]
+    overview_arrays = []
+    if POPULAR_ITEMS_OVERVIEWS is not None:
+        overview_arrays = [POPULAR_ITEMS_OVERVIEWS.offsets, POPULAR_ITEMS_OVERVIEWS.blob]
+
+    resources = {
+        'similarity_engine': array_bytes(engine_arrays),
+        'overviews': array_bytes(overview_arrays),
+        'index_cache_bytes': INDEX_CACHE.stats()['bytes'],
+        'component_storage': COMPONENT_STORAGE,
+        'quantization': QUANTIZATION_REPORT,
+        'bm25_bytes': BM25_INDEX.nbytes if BM25_INDEX is not None else 0,
+        'bm25_neighbors': array_bytes([BM25_NEIGHBORS.neighbor_ids, BM25_NEIGHBORS.neighbor_scores,
+                                       BM25_NEIGHBORS.max_scores, BM25_NEIGHBORS.query_indptr,
+                                       BM25_NEIGHBORS.query_terms])
+        if BM25_NEIGHBORS is not None else None,
+    }
+    return jsonify(build_report(resources, RESOURCES_LOADED_PID))
+
+
+@app.route('/api/index-cache/stats', methods=['GET'])
+def index_cache_stats():
+    """Bileşik indeks önbelleğinin isabet/kaçırma sayaçlarını döner."""
+    return jsonify(INDEX_CACHE.stats())
+
+
+@app.route('/api/db-pool/stats', methods=['GET'])
+def db_pool_stats():
+    """Bu worker'ın bağlantı havuzu durumu (açık/kullanımda bağlantı, zaman aşımları)."""
+    return jsonify(get_pool(DATABASE_URL).stats())
+
+
+@app.route('/api/response-cache/stats', methods=['GET'])
+def response_cache_stats():
+    """Cevap önbelleğinin isabet/304 sayaçları ve katalog sürümü."""
+    return jsonify(RESPONSE_CACHE.stats())
+
+
+@app.route('/api/similar-map-cache/stats', methods=['GET'])
+def similar_map_cache_stats():
+    """Harita sıralama önbelleğinin isabet/kaçırma sayaçları."""
+    return jsonify(SIMILAR_MAP_CACHE.stats())
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -236,22 +705,31 @@ def index():
 def search():
     query = request.args.get('q', '')
     if len(query) < 2: return jsonify([])
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(
-            "SELECT id, title, poster_path, year, source_type FROM media_items WHERE title ILIKE %s LIMIT 100",
-            (f'%{query}%',))
+    prefix = request.args.get('mode') == 'prefix'
+
+    title_index = TITLE_INDEX.get() if TITLE_INDEX_ENABLED else None
+    if title_index is not None:
+        return jsonify(title_index.search(query, SEARCH_LIMIT, prefix=prefix))
+
+    pattern = f'{query}%' if prefix else f'%{query}%'
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute("""
+            SELECT id, title, poster_path, year, source_type
+            FROM media_items
+            WHERE title ILIKE %s
+            ORDER BY popularity DESC NULLS LAST, id
+            LIMIT %s
+        """, (pattern, SEARCH_LIMIT))
         results = cur.fetchall()
-    conn.close()
     return jsonify(results)
 
 
 @app.route('/popular-tv', methods=['GET'])
 @app.route('/api/popular-tv', methods=['GET'])
+@RESPONSE_CACHE.cached(ttl=RESPONSE_CACHE_TTL)
 def popular_tv():
     """En popüler ilk 50 TV dizisini döner."""
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("""
             SELECT
                 id,
@@ -268,7 +746,6 @@ def popular_tv():
             LIMIT 50
         """)
         results = cur.fetchall()
-    conn.close()
     return jsonify(results)
 
 
@@ -276,64 +753,22 @@ def popular_tv():
 @app.route('/api/popular-movies', methods=['GET'])
 def popular_movies():
     """Returns top 50 random TV shows (temporary - will be movies later)"""
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
-            SELECT
-                id,
-                title,
-                poster_path,
-                year,
-                overview,
-                genres,
-                popularity,
-                source_type
-            FROM media_items
-            WHERE source_type = 'tv'
-              AND poster_path IS NOT NULL
-              AND poster_path != ''
-            ORDER BY RANDOM()
-            LIMIT 50
-        """)
-        results = cur.fetchall()
-    conn.close()
-    return jsonify(results)
+    return jsonify(random_tv_page(50))
 
 
 @app.route('/popular-books', methods=['GET'])
 @app.route('/api/popular-books', methods=['GET'])
 def popular_books():
     """Returns top 50 random TV shows (temporary - will be books later)"""
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
-            SELECT
-                id,
-                title,
-                poster_path,
-                year,
-                overview,
-                genres,
-                popularity,
-                source_type
-            FROM media_items
-            WHERE source_type = 'tv'
-              AND poster_path IS NOT NULL
-              AND poster_path != ''
-            ORDER BY RANDOM()
-            LIMIT 50
-        """)
-        results = cur.fetchall()
-    conn.close()
-    return jsonify(results)
+    return jsonify(random_tv_page(50))
 
 
 @app.route('/top-rated', methods=['GET'])
 @app.route('/api/top-rated', methods=['GET'])
+@RESPONSE_CACHE.cached(ttl=RESPONSE_CACHE_TTL)
 def top_rated():
     """Returns top 50 highest rated TV shows"""
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("""
             SELECT
                 id,
@@ -352,12 +787,12 @@ def top_rated():
             LIMIT 50
         """)
         results = cur.fetchall()
-    conn.close()
     return jsonify(results)
 
 
 @app.route('/most-loved', methods=['GET'])
 @app.route('/api/most-loved', methods=['GET'])
+@RESPONSE_CACHE.cached(ttl=RESPONSE_CACHE_TTL, query_args=('platform', 'type'))
 def most_loved():
     """Returns most-loved content filtered by platform and type"""
     platform = request.args.get('platform', 'Netflix')
@@ -366,8 +801,7 @@ def most_loved():
     # Map to source_type
     source_type = 'movie' if content_type == 'Movies' else 'tv'
 
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         # Use vote_average as "most-loved" metric
         # Platform filtering is placeholder for future enhancement
         cur.execute("""
@@ -391,17 +825,23 @@ def most_loved():
             LIMIT 20
         """, (source_type,))
         results = cur.fetchall()
-    conn.close()
     return jsonify(results)
 
 
 @app.route('/genre/<genre_name>', methods=['GET'])
 @app.route('/api/genre/<genre_name>', methods=['GET'])
+@RESPONSE_CACHE.cached(ttl=RESPONSE_CACHE_TTL)
 def by_genre(genre_name):
     """Returns top 50 TV shows by genre"""
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        genre_index = GENRE_INDEX.get()
+        if genre_index is not None:
+            # Tür başına popülerlik sıralı pozisyon listeleri: sonuç bir dilim
+            with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                results = fetch_media_items(cur, genre_index.by_genre(genre_name, 50))
+            return jsonify(results)
+
+        with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             # Use jsonb_array_elements_text to expand the JSON string array and ILIKE for matching
             cur.execute("""
                 SELECT
@@ -426,7 +866,6 @@ def by_genre(genre_name):
                 LIMIT 50
             """, (f'%{genre_name}%',))
             results = cur.fetchall()
-        conn.close()
         return jsonify(results)
     except Exception as e:
         print(f"Error in by_genre endpoint for genre '{genre_name}': {e}")
@@ -436,16 +875,29 @@ def by_genre(genre_name):
 @app.route('/simple-similar/<int:tv_id>')
 def simple_similar(tv_id):
     """Genre-based simple similarity without embeddings - for testing"""
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         # Get source show
         cur.execute("SELECT * FROM media_items WHERE id = %s AND source_type = 'tv'", (tv_id,))
         source_item = cur.fetchone()
         
         if not source_item:
-            conn.close()
             return jsonify({"error": "Show not found"}), 404
         
+        # Genre bitmaps: overlap with every show in the catalog (AND + popcount)
+        genre_index = GENRE_INDEX.get()
+        scored = genre_index.overlap_similar(tv_id, 10) if genre_index is not None else None
+        if scored is not None:
+            percents = dict(scored)
+            similar_shows = fetch_media_items(cur, [item_id for item_id, _ in scored],
+                                              "id, title, poster_path, year, overview, genres, popularity")
+            for show in similar_shows:
+                show['similarity_percent'] = percents[show['id']]
+            return jsonify({
+                "source_item": source_item,
+                "similar_items": similar_shows
+            })
+        
+        # Fallback without the index: the 50 most popular shows only
         # Get source genres
         source_genres = source_item.get('genres', [])
         if isinstance(source_genres, str):
@@ -482,66 +934,106 @@ def simple_similar(tv_id):
         similar_shows.sort(key=lambda x: x['similarity_percent'], reverse=True)
         similar_shows = similar_shows[:10]
     
-    conn.close()
-    
     return jsonify({
         "source_item": source_item,
         "similar_items": similar_shows
     })
 
 
+def with_posters(cur, ranked):
+    """
+    Sıralamadan posteri olmayan dizileri tek sorguyla çıkarır; harita
+    sadece posterli dizileri gösterir. Filtre sayfalamadan önce uygulanır,
+    böylece sayfalar aynı listeden dilimlenir.
+    """
+    if not ranked:
+        return ranked
+    cur.execute("""
+        SELECT id FROM media_items
+        WHERE id = ANY(%s) AND source_type = 'tv'
+          AND poster_path IS NOT NULL AND poster_path != ''
+    """, ([item_id for item_id, score in ranked],))
+    with_poster = {row['id'] for row in cur.fetchall()}
+    return [(item_id, score) for item_id, score in ranked if item_id in with_poster]
+
+
+def rank_similar_map(item_id, weight_vec, bm25_weight):
+    """
+    Haritanın ilk SIMILAR_MAP_MAX posterli komşusu; dizi bulunamazsa None.
+    """
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        source_row = SIMILARITY_ENGINE.row_of(item_id)
+        if source_row is not None:
+            ranked = rank_similar(item_id, weight_vec, bm25_weight, SIMILAR_MAP_MAX, source_row=source_row,
+                                  bm25_top_k=SIMILAR_MAP_BM25_TOP_K)
+        else:
+            # Popüler listede olmayan dizi: sorgu vektörü kendi bileşenlerinden kurulur.
+            cur.execute("SELECT embeddings, overview FROM media_items WHERE id = %s AND source_type = 'tv'",
+                        (item_id,))
+            source = cur.fetchone()
+            if not source:
+                return None
+            query_vector = SIMILARITY_ENGINE.query_from_components(source['embeddings'] or {}, weight_vec)
+            ranked = []
+            if query_vector.any():
+                ranked = rank_similar(item_id, weight_vec, bm25_weight, SIMILAR_MAP_MAX,
+                                      query_vector=query_vector, overview=source['overview'],
+                                      bm25_top_k=SIMILAR_MAP_BM25_TOP_K)
+        return with_posters(cur, ranked)
+
+
 @app.route('/similar-map/<int:item_id>')
 @app.route('/api/similar-map/<int:item_id>')
 def similar_map(item_id):
-    """Enhanced similar items endpoint for visual similarity map with real database fields"""
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        # Get source item with all available fields from actual schema
-        cur.execute("""
-            SELECT id, title, poster_path, overview, genres, popularity,
-                   year, original_language, source_type
-            FROM media_items
-            WHERE id = %s AND source_type = 'tv'
-        """, (item_id,))
-        source_item = cur.fetchone()
+    """
+    Benzerlik haritası için /similar ile aynı sıralama: tek bir ilk-210
+    araması ve tek bir toplu metadata sorgusu. `offset`/`limit` ile bu
+    sıralamanın bir sayfası döner, böylece satırlar tembel yüklenebilir.
+    Sıralama (dizi, ağırlıklar) başına önbelleğe alınır; sonraki sayfalar
+    sadece kendi dilimlerinin metadata'sını getirir.
+    """
+    if SIMILARITY_ENGINE is None:
+        return jsonify({"error": "Similarity engine is not loaded"}), 500
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', SIMILAR_MAP_MAX, type=int), 0), SIMILAR_MAP_MAX)
+    end = min(offset + limit, SIMILAR_MAP_MAX)
 
-        if not source_item:
-            conn.close()
-            return jsonify({"error": "Item not found"}), 404
+    active_weights = session.get('query_weights', DEFAULT_QUERY_TIME_WEIGHTS)
+    weight_vec = SIMILARITY_ENGINE.weight_vector(active_weights)
+    bm25_weight = active_weights.get("bm25_overview", 0)
 
-        # Get up to 210 similar items (30 rows * 7 items)
-        # We order by popularity here as a fallback since this is the mocked/fast endpoint.
-        # Ideally this would use FAISS like the /similar/ endpoint but for 210 items.
-        cur.execute("""
-            SELECT id, title, poster_path, overview, genres, popularity, year, source_type
-            FROM media_items
-            WHERE source_type = 'tv'
-              AND id != %s
-              AND poster_path IS NOT NULL
-              AND poster_path != ''
-            ORDER BY popularity DESC
-            LIMIT 210
-        """, (item_id,))
-
-        similar_items = cur.fetchall()
-
-        # Generate similarity_percent
-        # We want to span roughly 98% down to 40% over 210 items.
-        # Formula: 98 - (i * 0.28) ~ 98 - 58 = 40.
-        for i, item in enumerate(similar_items):
-            # Calculate mock similarity decreasing with rank
-            sim = 98 - (i * 0.28)
-            item['similarity_percent'] = int(max(40, sim))
-            
-            # Convert popularity (0-1000+) to vote_average (0-10) for display
-            if item.get('popularity'):
-                item['vote_average'] = min(10.0, (item['popularity'] / 100.0) * 1.2)
+    # Anahtar yuvarlanmamış ağırlıklardır; farklı profiller aynı girdiyi paylaşmaz.
+    key = (item_id, tuple(float(w) for w in weight_vec), float(bm25_weight))
+    ranked = SIMILAR_MAP_CACHE.get_or_compute(key, SIMILAR_MAP_CACHE_TTL,
+                                              lambda: rank_similar_map(item_id, weight_vec, bm25_weight))
+    if ranked is None:
+        return jsonify({"error": "Item not found"}), 404
+
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        # Sıralama her sayfada aynıdır (hep ilk 210); sadece istenen dilim getirilir.
+        page = ranked[offset:end]
+        rows = fetch_media_items(cur, [item_id] + [similar_id for similar_id, score in page],
+                                 columns=LIST_COLUMNS + ", original_language")
+
+    if not rows or rows[0]['id'] != item_id or rows[0]['source_type'] != 'tv':
+        return jsonify({"error": "Item not found"}), 404
+    source_item, similar_items = rows[0], rows[1:]
+
+    scores = dict(page)
+    for item in similar_items:
+        item.pop('original_language', None)
+        item['similarity_percent'] = int(min(scores[item['id']], 1.0) * 100)
 
-    conn.close()
+        # Convert popularity (0-1000+) to vote_average (0-10) for display
+        if item.get('popularity'):
+            item['vote_average'] = min(10.0, (item['popularity'] / 100.0) * 1.2)
 
     return jsonify({
         "source_item": source_item,
-        "similar_items": similar_items
+        "similar_items": similar_items,
+        "offset": offset,
+        "has_more": end < len(ranked)
     })
 
 
@@ -0,0 +1,201 @@
+"""
+Sparse-matrix BM25 scorer.
+
+Precomputes the BM25 contribution of every (term, document) pair of a
+rank_bm25.BM25Okapi model into a CSR matrix with one row per term:
+
+    W[t, d] = idf(t) * tf(t, d) * (k1 + 1) / (tf(t, d) + k1 * (1 - b + b * |d| / avgdl))
+
+A query is then one row gather per query token and a bincount-sum over the
+gathered documents. The per-entry expression and the order in which query
+tokens are accumulated are the same as in BM25Okapi.get_scores, so scores are
+bit-for-bit identical.
+
+The index is stored as an uncompressed .npz of plain arrays (no pickle).
+Term lookup uses a sorted vocabulary array and np.searchsorted, so a loaded
+index holds no per-term Python objects.
+"""
+
+import hashlib
+import logging
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from similarity_engine import top_k_rows
+
+logger = logging.getLogger(__name__)
+
+
+class SparseBM25:
+    """
+    BM25 scores from a precomputed term-document weight matrix.
+    """
+
+    def __init__(self, item_ids: np.ndarray, vocabulary: np.ndarray, indptr: np.ndarray,
+                 indices: np.ndarray, data: np.ndarray):
+        """
+        Args:
+            item_ids: (N,) database id of every document
+            vocabulary: (V,) sorted unicode array of terms
+            indptr: (V + 1,) CSR row pointers
+            indices: (nnz,) document positions of each entry
+            data: (nnz,) float64 BM25 weights of each entry
+        """
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self._id_order = np.argsort(self.item_ids, kind='stable')
+        self._sorted_ids = self.item_ids[self._id_order]
+
+    @classmethod
+    def from_okapi(cls, model, item_ids: Sequence[int]) -> 'SparseBM25':
+        """
+        Compile a fitted rank_bm25.BM25Okapi model.
+
+        Args:
+            model: BM25Okapi instance (doc_freqs, doc_len, avgdl, idf, k1, b)
+            item_ids: Database id of every document in the model's corpus order
+
+        Returns:
+            SparseBM25
+        """
+        doc_len = np.array(model.doc_len)
+        postings = {}
+        for position, frequencies in enumerate(model.doc_freqs):
+            for term, tf in frequencies.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(position)
+                postings[term][1].append(tf)
+
+        terms = sorted(term for term in postings if (model.idf.get(term) or 0) != 0)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indices_parts, data_parts = [], []
+        for row, term in enumerate(terms):
+            docs = np.array(postings[term][0], dtype=np.int32)
+            q_freq = np.array(postings[term][1])
+            # Same expression as BM25Okapi.get_scores, evaluated per posting.
+            weights = (model.idf.get(term) or 0) * (
+                q_freq * (model.k1 + 1) /
+                (q_freq + model.k1 * (1 - model.b + model.b * doc_len[docs] / model.avgdl))
+            )
+            indices_parts.append(docs)
+            data_parts.append(weights.astype(np.float64))
+            indptr[row + 1] = indptr[row] + len(docs)
+
+        indices = np.concatenate(indices_parts) if indices_parts else np.zeros(0, dtype=np.int32)
+        data = np.concatenate(data_parts) if data_parts else np.zeros(0, dtype=np.float64)
+        vocabulary = np.array(terms, dtype=str) if terms else np.zeros(0, dtype='<U1')
+        return cls(item_ids, vocabulary, indptr, indices, data)
+
+    @classmethod
+    def load(cls, path: str) -> 'SparseBM25':
+        """Load an index written by save()."""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(
+                arrays['item_ids'],
+                arrays['vocabulary'],
+                arrays['indptr'],
+                arrays['indices'],
+                arrays['data']
+            )
+
+    def save(self, path: str):
+        """Write the index as an uncompressed .npz."""
+        np.savez(
+            path,
+            item_ids=self.item_ids,
+            vocabulary=self.vocabulary,
+            indptr=self.indptr,
+            indices=self.indices,
+            data=self.data
+        )
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.item_ids.nbytes + self.vocabulary.nbytes + self.indptr.nbytes +
+                   self.indices.nbytes + self.data.nbytes + self._id_order.nbytes + self._sorted_ids.nbytes)
+
+    def fingerprint(self) -> str:
+        """Content hash of the index; changes whenever the model is rebuilt."""
+        digest = hashlib.blake2b(digest_size=16)
+        for array in (self.item_ids, self.vocabulary, self.indptr, self.indices, self.data):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def rows_of(self, item_ids: Sequence[int]) -> np.ndarray:
+        """Document positions of ids (-1 for ids that are not indexed)."""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(len(item_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, item_ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[pos] == item_ids, self._id_order[pos], -1)
+
+    def term_rows(self, tokens: List[str]) -> List[int]:
+        """CSR rows of the query tokens in query order (unknown terms dropped)."""
+        if not tokens or len(self.vocabulary) == 0:
+            return []
+        positions = np.searchsorted(self.vocabulary, tokens)
+        rows = []
+        for token, pos in zip(tokens, positions.tolist()):
+            if pos < len(self.vocabulary) and self.vocabulary[pos] == token:
+                rows.append(pos)
+        return rows
+
+    def get_scores(self, tokens: List[str]) -> np.ndarray:
+        """
+        Dense BM25 scores of every document, identical to
+        BM25Okapi.get_scores(tokens).
+        """
+        rows = self.term_rows(tokens)
+        if not rows:
+            return np.zeros(len(self.item_ids), dtype=np.float64)
+        # Every occurrence of a token is gathered separately and in order, so
+        # each document sums its contributions exactly like BM25Okapi does.
+        indices = np.concatenate([self.indices[self.indptr[r]:self.indptr[r + 1]] for r in rows])
+        data = np.concatenate([self.data[self.indptr[r]:self.indptr[r + 1]] for r in rows])
+        return np.bincount(indices, weights=data, minlength=len(self.item_ids))
+
+    def scores_for(self, tokens: List[str], rows: np.ndarray) -> np.ndarray:
+        """
+        BM25 scores of the given documents only, identical to
+        get_scores(tokens)[rows] (0 for rows < 0).
+        """
+        return self.scores_for_terms(self.term_rows(tokens), rows)
+
+    def scores_for_terms(self, term_rows: Sequence[int], rows: np.ndarray) -> np.ndarray:
+        """
+        scores_for() with the query already resolved by term_rows().
+
+        Each term's CSR row is sorted by document position, so a candidate's
+        entry is found with one searchsorted per term instead of scoring the
+        whole corpus.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.zeros(len(rows), dtype=np.float64)
+        for r in term_rows:
+            start, end = int(self.indptr[r]), int(self.indptr[r + 1])
+            if start == end:
+                continue
+            docs = self.indices[start:end]
+            pos = np.minimum(np.searchsorted(docs, rows), end - start - 1)
+            hit = (docs[pos] == rows) & (rows >= 0)
+            # Terms are added in query order, as in get_scores.
+            scores += np.where(hit, self.data[start:end][pos], 0.0)
+        return scores
+
+    def top_k(self, tokens: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best k documents for a query.
+
+        Returns:
+            Tuple of (item_ids, scores) sorted by descending score
+        """
+        scores = self.get_scores(tokens)
+        rows = top_k_rows(scores, k)
+        return self.item_ids[rows], scores[rows]
@@ -0,0 +1,253 @@
+"""
+Precomputed item-to-item BM25 neighbor table.
+
+For every item of the popular set the overview is used as a BM25 query once,
+offline, and the best neighbors are stored with their scores already
+normalized by the query's top score (the same normalization /similar applies
+at request time). The item itself is removed after normalization, so a lookup
+returns the same neighbors SparseBM25.top_k + normalization would have
+produced (scores rounded to float32).
+
+The top score itself is stored too. /similar adds a BM25 term to every vector
+candidate, not only to the stored neighbors; candidates outside the row are
+scored at request time with SparseBM25.scores_for_terms (a CSR gather over
+the candidates only) and divided by the stored top score. The query's term
+rows are stored as well, so the request never has to tokenize the overview
+again while the row is current.
+
+Arrays (stored with embedding_store.write_array_file, memory-mapped on load):
+
+    item_ids         int64   (M,)     sorted
+    overview_hash    uint64  (M,)     hash of the overview the row was built from
+    neighbor_ids     int64   (M, N)   -1 padded
+    neighbor_scores  float32 (M, N)
+    max_score        float64 (M,)     top BM25 score of the query (0 if none)
+    query_indptr     int64   (M + 1,) row i's terms are query_terms[indptr[i]:indptr[i+1]]
+    query_terms      int32   (T,)     SparseBM25 term rows of the query, in query order
+
+The header meta records the BM25 index fingerprint; a table built against
+another model is rejected by the app and fully rebuilt by the job.
+"""
+
+import hashlib
+import logging
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bm25_index import SparseBM25
+from embedding_store import read_array_file, write_array_file
+
+logger = logging.getLogger(__name__)
+
+TABLE_KIND = 'bm25_neighbors'
+
+
+def overview_hash(text: Optional[str]) -> int:
+    """Stable 64-bit hash of an overview text."""
+    digest = hashlib.blake2b((text or '').encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def compute_neighbors(
+    index: SparseBM25,
+    item_id: int,
+    tokens: List[str],
+    top_n: int
+) -> Tuple[np.ndarray, np.ndarray, float, np.ndarray]:
+    """
+    Normalized BM25 neighbors of one item.
+
+    Args:
+        index: BM25 index
+        item_id: Query item (excluded from the result)
+        tokens: Preprocessed overview tokens of the item
+        top_n: Number of BM25 documents considered (self included)
+
+    Returns:
+        Tuple of (neighbor_ids int64, scores float32, max_score, query_terms
+        int32); the arrays have length top_n and are padded with -1 / 0,
+        max_score is the normalization (0 if the query matches nothing) and
+        query_terms are the query's term rows (SparseBM25.term_rows)
+    """
+    neighbor_ids = np.full(top_n, -1, dtype=np.int64)
+    neighbor_scores = np.zeros(top_n, dtype=np.float32)
+    query_terms = np.asarray(index.term_rows(tokens), dtype=np.int32)
+    if not tokens:
+        return neighbor_ids, neighbor_scores, 0.0, query_terms
+
+    ids, scores = index.top_k(tokens, top_n)
+    max_score = float(scores[0]) if len(scores) else 0.0
+    if max_score <= 0:
+        return neighbor_ids, neighbor_scores, 0.0, query_terms
+
+    keep = ids != item_id
+    ids, scores = ids[keep], (scores / max_score)[keep]
+    neighbor_ids[:len(ids)] = ids
+    neighbor_scores[:len(scores)] = scores
+    return neighbor_ids, neighbor_scores, max_score, query_terms
+
+
+class BM25NeighborTable:
+    """
+    Lookup of precomputed BM25 neighbors by item id.
+    """
+
+    def __init__(self, item_ids: np.ndarray, overview_hashes: np.ndarray,
+                 neighbor_ids: np.ndarray, neighbor_scores: np.ndarray, max_scores: np.ndarray,
+                 query_indptr: np.ndarray, query_terms: np.ndarray, meta: Optional[dict] = None):
+        self.item_ids = item_ids
+        self.overview_hashes = overview_hashes
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+        self.max_scores = max_scores
+        self.query_indptr = query_indptr
+        self.query_terms = query_terms
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25NeighborTable':
+        """Map a table written by save() read-only."""
+        arrays, header = read_array_file(path)
+        meta = header.get('meta', {})
+        if meta.get('kind') != TABLE_KIND:
+            raise ValueError(f"{path} is not a BM25 neighbor table")
+        for name in ('max_score', 'query_indptr', 'query_terms'):
+            if name not in arrays:
+                raise ValueError(f"{path} has no {name} array, rebuild it")
+        return cls(arrays['item_ids'], arrays['overview_hash'],
+                   arrays['neighbor_ids'], arrays['neighbor_scores'], arrays['max_score'],
+                   arrays['query_indptr'], arrays['query_terms'], meta)
+
+    @classmethod
+    def build(
+        cls,
+        index: SparseBM25,
+        item_ids: Sequence[int],
+        overviews: Sequence[Optional[str]],
+        tokenize: Callable[[str], List[str]],
+        top_n: int,
+        previous: Optional['BM25NeighborTable'] = None
+    ) -> Tuple['BM25NeighborTable', int]:
+        """
+        Build the table for a popular set, reusing unchanged rows.
+
+        Args:
+            index: BM25 index queried for every item
+            item_ids: Ids of the popular set
+            overviews: Overview of every item (same order)
+            tokenize: Overview preprocessing (text_processing.preprocess_text)
+            top_n: BM25 documents considered per item
+            previous: Existing table; rows whose overview hash is unchanged
+                are copied when it was built against the same index and top_n
+
+        Returns:
+            Tuple of (table, number of rows recomputed)
+        """
+        fingerprint = index.fingerprint()
+        if previous is not None and (previous.fingerprint != fingerprint or previous.top_n != top_n):
+            logger.info("BM25 index or top_n changed, rebuilding every row")
+            previous = None
+
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        hashes = np.array([overview_hash(text) for text in overviews], dtype=np.uint64)
+        order = np.argsort(item_ids, kind='stable')
+        item_ids, hashes = item_ids[order], hashes[order]
+        overviews = [overviews[i] for i in order.tolist()]
+
+        neighbor_ids = np.full((len(item_ids), top_n), -1, dtype=np.int64)
+        neighbor_scores = np.zeros((len(item_ids), top_n), dtype=np.float32)
+        max_scores = np.zeros(len(item_ids), dtype=np.float64)
+        terms = []
+        recomputed = 0
+        for row, (item_id, text_hash) in enumerate(zip(item_ids.tolist(), hashes.tolist())):
+            old_row = previous.row_of(item_id) if previous is not None else None
+            if old_row is not None and int(previous.overview_hashes[old_row]) == text_hash:
+                neighbor_ids[row] = previous.neighbor_ids[old_row]
+                neighbor_scores[row] = previous.neighbor_scores[old_row]
+                max_scores[row] = previous.max_scores[old_row]
+                terms.append(np.array(previous.query_terms_of(old_row), dtype=np.int32))
+                continue
+            neighbor_ids[row], neighbor_scores[row], max_scores[row], row_terms = compute_neighbors(
+                index, item_id, tokenize(overviews[row]), top_n)
+            terms.append(row_terms)
+            recomputed += 1
+
+        query_indptr = np.zeros(len(item_ids) + 1, dtype=np.int64)
+        query_indptr[1:] = np.cumsum([len(t) for t in terms], dtype=np.int64)
+        query_terms = np.concatenate(terms) if terms else np.zeros(0, dtype=np.int32)
+
+        meta = {'kind': TABLE_KIND, 'bm25_fingerprint': fingerprint, 'top_n': top_n}
+        table = cls(item_ids, hashes, neighbor_ids, neighbor_scores, max_scores,
+                    query_indptr, query_terms.astype(np.int32, copy=False), meta)
+        return table, recomputed
+
+    def save(self, path: str):
+        """Write the table atomically."""
+        write_array_file(path, {
+            'item_ids': self.item_ids,
+            'overview_hash': self.overview_hashes,
+            'neighbor_ids': self.neighbor_ids,
+            'neighbor_scores': self.neighbor_scores,
+            'max_score': self.max_scores,
+            'query_indptr': self.query_indptr,
+            'query_terms': self.query_terms,
+        }, self.meta)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        return self.meta.get('bm25_fingerprint')
+
+    @property
+    def top_n(self) -> Optional[int]:
+        return self.meta.get('top_n')
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.item_ids.nbytes + self.overview_hashes.nbytes +
+                   self.neighbor_ids.nbytes + self.neighbor_scores.nbytes + self.max_scores.nbytes +
+                   self.query_indptr.nbytes + self.query_terms.nbytes)
+
+    def row_of(self, item_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.item_ids, item_id))
+        if pos < len(self.item_ids) and self.item_ids[pos] == item_id:
+            return pos
+        return None
+
+    def current_row(self, item_id: int, overview: Optional[str]) -> Optional[int]:
+        """Row of an item if it was built from this overview, else None."""
+        row = self.row_of(item_id)
+        if row is None or int(self.overview_hashes[row]) != overview_hash(overview):
+            return None
+        return row
+
+    def query_terms_of(self, row: int) -> np.ndarray:
+        """BM25 term rows of a row's query (SparseBM25.scores_for_terms input)."""
+        return self.query_terms[int(self.query_indptr[row]):int(self.query_indptr[row + 1])]
+
+    def lookup(self, item_id: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Neighbors of an item.
+
+        Returns:
+            Tuple of (neighbor_ids, normalized scores) without padding, or
+            None if the item is not in the table
+        """
+        row = self.row_of(item_id)
+        if row is None:
+            return None
+        ids = self.neighbor_ids[row]
+        valid = ids >= 0
+        return ids[valid], self.neighbor_scores[row][valid]
+
+    def changed_items(self, item_ids: Iterable[int], overviews: Iterable[Optional[str]]) -> List[int]:
+        """Ids whose overview differs from the one the table was built with."""
+        changed = []
+        for item_id, text in zip(item_ids, overviews):
+            row = self.row_of(item_id)
+            if row is None or int(self.overview_hashes[row]) != overview_hash(text):
+                changed.append(item_id)
+        return changed
@@ -0,0 +1,137 @@
+"""
+Catalog version stamp shared by every process on the host.
+
+Caches derived from media_items (HTTP response cache, in-memory indexes)
+compare the current version with the one they were built from. The version
+is the modification time of a stamp file that data jobs touch after
+writing (bump_catalog_version()), so workers learn about an import without
+querying Postgres. The file is stat()ed at most once per `check_interval`.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VERSION_FILE = '/tmp/similarhub_catalog_version'
+
+
+def version_file_path() -> str:
+    return os.getenv('CATALOG_VERSION_FILE', DEFAULT_VERSION_FILE)
+
+
+def bump_catalog_version(path: Optional[str] = None) -> int:
+    """
+    Mark the catalog as changed; caches in every worker drop their entries
+    within one check interval.
+
+    Returns:
+        The new version
+    """
+    path = path or version_file_path()
+    version = time.time_ns()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(str(version))
+    os.utime(tmp_path, ns=(version, version))
+    os.replace(tmp_path, path)
+    logger.info(f"Catalog version bumped: {path}")
+    return version
+
+
+class CatalogVersion:
+    """
+    Throttled reader of the stamp file.
+    """
+
+    def __init__(self, path: Optional[str] = None, check_interval: float = 1.0):
+        self.path = path or version_file_path()
+        self.check_interval = check_interval
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        """Current version (0 while the stamp file does not exist)."""
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return self._version
+        with self._lock:
+            try:
+                self._version = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self._version = 0
+            self._checked_at = now
+            return self._version
+
+
+_catalog_version = CatalogVersion()
+
+
+def current_catalog_version() -> int:
+    return _catalog_version.current()
+
+
+class VersionedResource:
+    """
+    In-memory object derived from the catalog (e.g. a search index) that is
+    rebuilt when the catalog version changes.
+
+    Rebuilds run in a background thread; until one finishes, get() keeps
+    returning the previous object (or None before the first build, so
+    callers can fall back to SQL).
+    """
+
+    def __init__(self, name: str, builder, catalog_version: Optional[CatalogVersion] = None,
+                 retry_interval: float = 30.0):
+        """
+        Args:
+            name: Used in log messages
+            builder: Callable returning a freshly built object
+            catalog_version: Version source (default: the shared stamp file)
+            retry_interval: Seconds to wait after a failed build before
+                trying again
+        """
+        self.name = name
+        self.builder = builder
+        self.catalog_version = catalog_version or _catalog_version
+        self.retry_interval = retry_interval
+        self._value = None
+        self._version = None
+        self._building = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Build synchronously (startup path)."""
+        version = self.catalog_version.current()
+        value = self.builder()
+        with self._lock:
+            self._value, self._version, self._failed_at = value, version, None
+        return value
+
+    def _rebuild(self):
+        try:
+            self.load()
+            logger.info(f"{self.name} rebuilt for catalog version {self._version}")
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            logger.warning(f"{self.name} rebuild failed: {e}")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def get(self):
+        """Current object; schedules a rebuild if it is missing or stale."""
+        if self._value is None or self._version != self.catalog_version.current():
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+                return self._value
+            with self._lock:
+                start = not self._building
+                self._building = True
+            if start:
+                threading.Thread(target=self._rebuild, name=f"rebuild-{self.name}", daemon=True).start()
+        return self._value
@@ -0,0 +1,254 @@
+"""
+Per-process PostgreSQL connection pool shared by the Flask routes and VectorDB.
+
+Wraps psycopg2's ThreadedConnectionPool with what it lacks for serving:
+
+- checkout timeout: callers wait up to `checkout_timeout` seconds for a free
+  connection instead of failing immediately when the pool is exhausted
+- health checks: a connection idle for longer than `health_check_interval`
+  is probed with SELECT 1 on checkout and replaced if the probe fails
+- pgvector registration once per physical connection
+
+Connections must never cross a fork, so get_pool() creates one pool per
+process id. With gunicorn preload the master closes its pool after loading
+resources (close_pool()) and each worker lazily opens its own.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """No connection became available within the checkout timeout."""
+
+
+def register_vector_type(conn):
+    """Register the pgvector type adapters on a connection if available."""
+    try:
+        from pgvector.psycopg2 import register_vector
+        register_vector(conn)
+    except Exception as e:
+        # Extension or package missing: plain queries keep working.
+        conn.rollback()
+        logger.warning(f"pgvector not registered on pooled connection: {e}")
+
+
+class _ThreadedPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool that runs a hook on every new connection."""
+
+    def __init__(self, minconn: int, maxconn: int, dsn: str,
+                 on_connect: Optional[Callable] = None):
+        self._on_connect = on_connect
+        super().__init__(minconn, maxconn, dsn)
+        # minconn is only the number opened up front; psycopg2 would close
+        # every returned connection above it, so keep up to maxconn idle.
+        self.minconn = maxconn
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        if self._on_connect is not None:
+            self._on_connect(conn)
+        return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded connection pool with checkout timeout and health checks.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int = 1,
+        maxconn: int = 4,
+        checkout_timeout: float = 5.0,
+        health_check_interval: float = 30.0,
+        on_connect: Optional[Callable] = register_vector_type
+    ):
+        """
+        Args:
+            dsn: PostgreSQL connection string
+            minconn: Connections opened up front
+            maxconn: Upper bound on open connections
+            checkout_timeout: Seconds to wait for a free connection
+            health_check_interval: Idle seconds after which a connection is
+                probed before being handed out
+            on_connect: Hook run once on every new connection
+        """
+        self.dsn = dsn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.pid = os.getpid()
+        self._pool = _ThreadedPool(minconn, maxconn, dsn, on_connect)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {'checkouts': 0, 'timeouts': 0, 'replaced': 0}
+
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        Check out a healthy connection.
+
+        Args:
+            timeout: Seconds to wait for a free slot (default checkout_timeout)
+
+        Raises:
+            PoolTimeout: If no connection became available in time
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeout(f"No database connection available within {timeout}s "
+                              f"(pool size {self.maxconn})")
+        try:
+            conn = self._pool.getconn()
+            if not self._is_healthy(conn):
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+                with self._lock:
+                    self._stats['replaced'] += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['checkouts'] += 1
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """
+        Return a connection. Open transactions are rolled back; broken
+        connections are closed instead of being reused.
+        """
+        try:
+            if not conn.closed and not discard:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            discard = True
+        finally:
+            discard = discard or bool(conn.closed)
+            with self._lock:
+                if discard:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+            try:
+                self._pool.putconn(conn, close=discard)
+            finally:
+                self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator:
+        """
+        Borrow a connection for a with-block: committed on success, rolled
+        back on error, always returned to the pool (also on GeneratorExit,
+        KeyboardInterrupt or SystemExit, so the slot is never leaked).
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        with self._lock:
+            last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'pid': self.pid,
+            'max_size': self.maxconn,
+            'open': len(self._pool._used) + len(self._pool._pool),
+            'in_use': len(self._pool._used),
+        })
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+        with self._lock:
+            self._last_used.clear()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(dsn: Optional[str] = None) -> ConnectionPool:
+    """
+    Pool of the current process, created on first use.
+
+    Sizing comes from DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT /
+    DB_POOL_HEALTH_CHECK; dsn defaults to DATABASE_URL.
+    """
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            # A pool inherited through fork shares its sockets with the
+            # parent and is never reused in the child.
+            _pool = ConnectionPool(
+                dsn or os.getenv("DATABASE_URL"),
+                minconn=int(os.getenv("DB_POOL_MIN", "1")),
+                maxconn=int(os.getenv("DB_POOL_MAX", "4")),
+                checkout_timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+                health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK", "30")),
+            )
+            logger.info(f"Opened database pool for pid {_pool.pid} (max {_pool.maxconn})")
+        return _pool
+
+
+@contextmanager
+def pooled_connection(timeout: Optional[float] = None) -> Iterator:
+    """Shortcut for get_pool().connection()."""
+    with get_pool().connection(timeout) as conn:
+        yield conn
+
+
+def close_pool():
+    """Close the current process' pool (e.g. in the gunicorn master before forking)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
@@ -0,0 +1,292 @@
+"""
+Memory-mapped on-disk store for the popular-items embedding components.
+
+File layout (version 1, little endian):
+
+    magic       8 bytes   b'SHEMBST\\0'
+    version     uint32
+    header_len  uint32
+    header      JSON (utf-8): count, dim, component keys, meta and the
+                section offset table {name: {offset, dtype, shape}}
+    sections    64-byte aligned contiguous arrays:
+                item_ids          int64   (N,)
+                norms             float32 (N, K)
+                gram              float64 (N, K, K)
+                unit/<component>  float32 (N, D)   one per component
+                overview_offsets  int64   (N + 1,)
+                overview_blob     uint8   (total utf-8 bytes)
+
+The store is opened read-only with np.memmap, so startup is O(header) and
+every gunicorn worker maps the same page cache instead of holding its own
+copy of the components.
+
+write_array_file() / read_array_file() expose the same container for other
+precomputed tables (e.g. the BM25 neighbor table).
+"""
+
+import json
+import logging
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from similarity_engine import ComponentSimilarityEngine, prepare_components
+
+logger = logging.getLogger(__name__)
+
+STORE_MAGIC = b'SHEMBST\0'
+STORE_VERSION = 1
+SECTION_ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sII')
+
+
+def _align(offset: int) -> int:
+    return (offset + SECTION_ALIGNMENT - 1) // SECTION_ALIGNMENT * SECTION_ALIGNMENT
+
+
+class PackedTexts:
+    """
+    Immutable list of strings stored as one utf-8 blob plus an offset array.
+
+    Keeps per-item text out of Python object space (no per-string refcounts),
+    which also makes it safe to share across forked workers.
+    """
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_strings(cls, texts: Iterable[Optional[str]]) -> 'PackedTexts':
+        encoded = [(text or '').encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(offsets, blob)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, row: int) -> str:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.blob[start:end]).decode('utf-8')
+
+
+def _section_layout(count: int, dim: int, component_keys: Sequence[str],
+                    blob_size: int) -> List[Tuple[str, str, Tuple[int, ...]]]:
+    n_keys = len(component_keys)
+    layout = [
+        ('item_ids', '<i8', (count,)),
+        ('norms', '<f4', (count, n_keys)),
+        ('gram', '<f8', (count, n_keys, n_keys)),
+    ]
+    layout += [(f'unit/{key}', '<f4', (count, dim)) for key in component_keys]
+    layout += [
+        ('overview_offsets', '<i8', (count + 1,)),
+        ('overview_blob', 'u1', (blob_size,)),
+    ]
+    return layout
+
+
+def write_embedding_store(
+    path: str,
+    item_ids: Sequence[int],
+    overviews: Sequence[Optional[str]],
+    dim: int,
+    component_keys: Sequence[str],
+    component_blocks: Iterable[Dict[str, np.ndarray]],
+    meta: Optional[Dict] = None
+) -> Dict:
+    """
+    Write a store file atomically (temp file + rename).
+
+    Args:
+        path: Destination file
+        item_ids: Ids of the N items, defines the row order
+        overviews: Overview text of each item (same order)
+        dim: Embedding dimension
+        component_keys: Component order
+        component_blocks: Iterable of raw component blocks in row order; each
+            block is {component key: (B, dim) float32 matrix}, missing
+            components as zero rows
+        meta: Extra metadata stored in the header
+
+    Returns:
+        The header dict that was written
+    """
+    component_keys = list(component_keys)
+    count = len(item_ids)
+    texts = PackedTexts.from_strings(overviews)
+
+    sections = {}
+    layout = _section_layout(count, dim, component_keys, len(texts.blob))
+    header = {
+        'version': STORE_VERSION,
+        'count': count,
+        'dim': dim,
+        'component_keys': component_keys,
+        'meta': meta or {},
+        'sections': sections,
+    }
+    # Offsets depend on the header length, which depends on the offsets;
+    # reserve a generous fixed header area so one pass is enough.
+    header_area = _align(_PREAMBLE.size + 16384)
+    offset = header_area
+    for name, dtype, shape in layout:
+        sections[name] = {'offset': offset, 'dtype': dtype, 'shape': list(shape)}
+        offset = _align(offset + int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize)
+    total_size = offset
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    if _PREAMBLE.size + len(header_bytes) > header_area:
+        raise ValueError("Embedding store header does not fit the reserved header area")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.truncate(total_size)
+        f.write(_PREAMBLE.pack(STORE_MAGIC, STORE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+
+    arrays = _map_sections(tmp_path, sections, mode='r+')
+    arrays['item_ids'][:] = np.asarray(item_ids, dtype=np.int64)
+    arrays['overview_offsets'][:] = texts.offsets
+    arrays['overview_blob'][:] = texts.blob
+
+    row = 0
+    for block in component_blocks:
+        unit, norms, gram = prepare_components(block, component_keys)
+        end = row + norms.shape[0]
+        if end > count:
+            raise ValueError("More component rows than item ids")
+        arrays['norms'][row:end] = norms
+        arrays['gram'][row:end] = gram
+        for key in component_keys:
+            arrays[f'unit/{key}'][row:end] = unit[key]
+        row = end
+    if row != count:
+        raise ValueError(f"Expected {count} component rows, got {row}")
+
+    for array in arrays.values():
+        if isinstance(array, np.memmap):
+            array.flush()
+    del arrays
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote embedding store {path} ({count} items, {total_size / 1e6:.1f} MB)")
+    return header
+
+
+def write_array_file(path: str, arrays: Dict[str, np.ndarray], meta: Optional[Dict] = None) -> Dict:
+    """
+    Write arbitrary named arrays into the store container (atomically).
+
+    Args:
+        path: Destination file
+        arrays: Section name -> array
+        meta: Extra metadata stored in the header
+
+    Returns:
+        The header dict that was written
+    """
+    sections = {}
+    header = {'version': STORE_VERSION, 'meta': meta or {}, 'sections': sections}
+    header_area = _align(_PREAMBLE.size + 16384)
+    offset = header_area
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        sections[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset = _align(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    if _PREAMBLE.size + len(header_bytes) > header_area:
+        raise ValueError("Array file header does not fit the reserved header area")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.truncate(offset)
+        f.write(_PREAMBLE.pack(STORE_MAGIC, STORE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(sections[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_array_file(path: str) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """
+    Map every section of a store container read-only.
+
+    Returns:
+        Tuple of (arrays, header)
+    """
+    header = _read_header(path)
+    return _map_sections(path, header['sections'], mode='r'), header
+
+
+def _read_header(path: str) -> Dict:
+    with open(path, 'rb') as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != STORE_MAGIC:
+            raise ValueError(f"{path} is not an embedding store file")
+        if version != STORE_VERSION:
+            raise ValueError(f"Unsupported embedding store version {version} (expected {STORE_VERSION})")
+        return json.loads(f.read(header_len).decode('utf-8'))
+
+
+def _map_sections(path: str, sections: Dict, mode: str = 'r') -> Dict[str, np.ndarray]:
+    arrays = {}
+    for name, section in sections.items():
+        shape = tuple(section['shape'])
+        if int(np.prod(shape, dtype=np.int64)) == 0:
+            arrays[name] = np.zeros(shape, dtype=section['dtype'])
+            continue
+        arrays[name] = np.memmap(path, dtype=section['dtype'], mode=mode,
+                                 offset=section['offset'], shape=shape)
+    return arrays
+
+
+class EmbeddingStore:
+    """
+    Read-only view of a store file written by write_embedding_store().
+    """
+
+    def __init__(self, path: str):
+        """
+        Open and validate a store file.
+
+        Args:
+            path: Store file path
+
+        Raises:
+            ValueError: If the file is not a store or has another version
+        """
+        self.path = path
+        self.header = _read_header(path)
+
+        self.count = self.header['count']
+        self.dim = self.header['dim']
+        self.component_keys = self.header['component_keys']
+        self.meta = self.header.get('meta', {})
+        self.arrays = _map_sections(path, self.header['sections'], mode='r')
+
+    @property
+    def item_ids(self) -> np.ndarray:
+        return self.arrays['item_ids']
+
+    def unit_components(self) -> Dict[str, np.ndarray]:
+        return {key: self.arrays[f'unit/{key}'] for key in self.component_keys}
+
+    def overviews(self) -> PackedTexts:
+        return PackedTexts(self.arrays['overview_offsets'], self.arrays['overview_blob'])
+
+    def engine(self) -> ComponentSimilarityEngine:
+        """Similarity engine backed directly by the mapped arrays (no copy)."""
+        return ComponentSimilarityEngine(
+            self.item_ids,
+            self.unit_components(),
+            self.arrays['norms'],
+            self.arrays['gram'],
+            self.component_keys
+        )
@@ -0,0 +1,166 @@
+"""
+Genre inverted index and genre bitmaps for the TV catalog.
+
+Rows are the TV shows in popularity order (position 0 = most popular).
+
+- Every genre has a sorted int32 array of the positions that carry it and
+  have a poster, so "top shows of a genre" is a slice, and a union of
+  several genres only needs the first `limit` entries of each list.
+- Every show has a bitmap of its genres (uint64 words, 64 genres per word).
+  Genre overlap with a source show is AND + popcount over the whole catalog
+  in one vectorized pass.
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bit count of every byte value, for NumPy versions without np.bitwise_count
+_POPCOUNT_LUT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits per row of an (N, W) uint64 array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int32)
+    as_bytes = np.ascontiguousarray(words).view(np.uint8).reshape(len(words), -1)
+    return _POPCOUNT_LUT[as_bytes].sum(axis=1, dtype=np.int32)
+
+
+def parse_genres(value) -> List[str]:
+    """Genre list from the JSONB column (list, JSON string or None)."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = json.loads(value)
+    return list(value)
+
+
+class GenreIndex:
+    """
+    Genre postings and bitmaps over the TV catalog.
+    """
+
+    def __init__(self, item_ids: np.ndarray, genre_names: List[str], masks: np.ndarray,
+                 genre_counts: np.ndarray, postings: List[np.ndarray]):
+        """
+        Args:
+            item_ids: (N,) ids in popularity order
+            genre_names: Genre of each bit, sorted
+            masks: (N, W) uint64 genre bitmaps
+            genre_counts: (N,) length of each show's genre list
+            postings: Per genre, sorted positions of shows with a poster
+        """
+        self.item_ids = item_ids
+        self.genre_names = genre_names
+        self.masks = masks
+        self.genre_counts = genre_counts
+        self.postings = postings
+        self._id_order = np.argsort(item_ids, kind='stable')
+        self._sorted_ids = item_ids[self._id_order]
+        self._folded_names = [name.lower() for name in genre_names]
+
+    @classmethod
+    def build(cls, rows: Sequence[Tuple]) -> 'GenreIndex':
+        """
+        Build from catalog rows.
+
+        Args:
+            rows: (id, genres, poster_path) tuples of the TV shows ordered by
+                popularity, most popular first
+
+        Returns:
+            GenreIndex
+        """
+        genre_lists = [parse_genres(row[1]) for row in rows]
+        genre_names = sorted({genre for genres in genre_lists for genre in genres})
+        bit_of = {genre: bit for bit, genre in enumerate(genre_names)}
+        n_words = max(1, (len(genre_names) + 63) // 64)
+
+        masks = np.zeros((len(rows), n_words), dtype=np.uint64)
+        genre_counts = np.zeros(len(rows), dtype=np.int32)
+        positions = [[] for _ in genre_names]
+        for position, (row, genres) in enumerate(zip(rows, genre_lists)):
+            genre_counts[position] = len(genres)
+            has_poster = bool(row[2])
+            for genre in set(genres):
+                bit = bit_of[genre]
+                masks[position, bit // 64] |= np.uint64(1 << (bit % 64))
+                if has_poster:
+                    positions[bit].append(position)
+
+        return cls(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            genre_names,
+            masks,
+            genre_counts,
+            [np.array(p, dtype=np.int32) for p in positions],
+        )
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.item_ids.nbytes + self.masks.nbytes + self.genre_counts.nbytes +
+                   sum(p.nbytes for p in self.postings))
+
+    def row_of(self, item_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self._sorted_ids, item_id))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == item_id:
+            return int(self._id_order[pos])
+        return None
+
+    def matching_genres(self, text: str) -> List[int]:
+        """Genres whose name contains text (case-insensitive, like ILIKE '%text%')."""
+        text = text.lower()
+        return [bit for bit, name in enumerate(self._folded_names) if text in name]
+
+    def by_genre(self, text: str, limit: int = 50) -> List[int]:
+        """
+        Ids of the most popular shows (with a poster) in any genre matching
+        text, most popular first.
+        """
+        bits = self.matching_genres(text)
+        if not bits:
+            return []
+        if len(bits) == 1:
+            positions = self.postings[bits[0]][:limit]
+        else:
+            # The first `limit` of the union are among the first `limit` of
+            # each list.
+            heads = [self.postings[bit][:limit] for bit in bits]
+            positions = np.unique(np.concatenate(heads))[:limit]
+        return self.item_ids[positions].tolist()
+
+    def overlap_similar(self, item_id: int, limit: int = 10) -> Optional[List[Tuple[int, int]]]:
+        """
+        Shows sharing genres with an item, scored like simple_similar:
+        int(shared / max(len(a), len(b)) * 100), ties by popularity.
+
+        Returns:
+            List of (id, similarity_percent), or None if the item is unknown
+        """
+        source = self.row_of(item_id)
+        if source is None:
+            return None
+        shared = popcount(self.masks & self.masks[source])
+        shared[source] = 0
+        candidates = np.flatnonzero(shared > 0)
+        if len(candidates) == 0:
+            return []
+
+        denominators = np.maximum(self.genre_counts[candidates], self.genre_counts[source])
+        percents = (shared[candidates] / denominators * 100).astype(np.int64)
+        if len(percents) > limit:
+            # Only rows scoring at least the limit-th best value can make it.
+            threshold = np.partition(percents, len(percents) - limit)[len(percents) - limit]
+            keep = np.flatnonzero(percents >= threshold)
+            candidates, percents = candidates[keep], percents[keep]
+        # Stable sort on the score keeps popularity order between ties.
+        order = np.argsort(-percents, kind='stable')[:limit]
+        return list(zip(self.item_ids[candidates[order]].tolist(), percents[order].tolist()))
@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for the SimilarHub backend.
+
+Resources (similarity engine, BM25 index, composite index cache) are loaded
+once in the master process and inherited by the forked workers. Everything
+loaded is NumPy arrays or memory-mapped files, and gc.freeze() moves the
+remaining Python objects out of the collector's reach, so workers share
+those pages copy-on-write instead of each holding a private copy.
+
+Set GUNICORN_PRELOAD=0 to load resources separately in every worker.
+"""
+
+import gc
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "3"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+
+def when_ready(server):
+    """Master is ready to fork: load shared resources before any worker exists."""
+    if not preload_app:
+        return
+    import app as main_app
+    import db_pool
+
+    main_app.load_resources()
+    # Database connections must not be inherited by the workers; each one
+    # opens its own pool on first use.
+    db_pool.close_pool()
+    # Objects alive now are never collected; keep GC from writing to their
+    # headers in the workers (which would dirty the shared pages).
+    gc.freeze()
+    server.log.info("Resources preloaded in master (pid %s)", os.getpid())
+
+
+def post_worker_init(worker):
+    """Without preload, each worker loads its own copy."""
+    import app as main_app
+
+    if main_app.RESOURCES_LOADED_PID is None:
+        main_app.load_resources()
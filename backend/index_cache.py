@@ -0,0 +1,225 @@
+"""
+Bounded LRU cache of weight-specific composite FAISS indexes.
+
+A composite index holds the unit composite vectors of every popular item for
+one weight profile, so a /similar request for a cached profile is a single
+FAISS inner-product search. Profiles are keyed by their quantized, sum-
+normalized component weights: the composite cosine score does not depend on
+the scale of the weights, so e.g. {0.4, 0.2} and {0.8, 0.4} share an entry.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+# Bytes per stored value of each index storage type
+STORAGE_VALUE_BYTES = {'float32': 4, 'float16': 2, 'int8': 1}
+
+
+def weights_cache_key(weight_vec: np.ndarray, decimals: int = 4) -> Tuple[float, ...]:
+    """
+    Quantize a component weight vector into a hashable cache key.
+
+    Args:
+        weight_vec: Non-negative component weights (engine component order)
+        decimals: Rounding precision applied after normalizing to sum 1
+
+    Returns:
+        Tuple of rounded weights (all zeros if every weight is zero)
+    """
+    total = float(np.sum(weight_vec))
+    if total <= 0:
+        return tuple(0.0 for _ in weight_vec)
+    return tuple(round(float(w) / total, decimals) for w in weight_vec)
+
+
+class CompositeIndex:
+    """
+    FAISS inner-product index over the composite vectors of one weight profile.
+    """
+
+    def __init__(self, key: Tuple[float, ...], vectors: np.ndarray, item_ids: np.ndarray,
+                 storage: str = 'float32'):
+        """
+        Args:
+            key: Weight profile key from weights_cache_key()
+            vectors: (N, D) float32 unit composite vectors, row order of item_ids
+            item_ids: (N,) database ids
+            storage: 'float32' for an exact IndexFlatIP, 'float16' or 'int8'
+                for a (per-dimension) IndexScalarQuantizer whose results
+                should be rescored exactly by the caller
+        """
+        self.key = key
+        self.item_ids = item_ids
+        self.storage = storage
+        dim = vectors.shape[1]
+        if storage == 'float32':
+            self.index = faiss.IndexFlatIP(dim)
+        else:
+            qtype = faiss.ScalarQuantizer.QT_fp16 if storage == 'float16' else faiss.ScalarQuantizer.QT_8bit
+            self.index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+            self.index.train(vectors)
+        self.index.add(vectors)
+
+    @property
+    def exact(self) -> bool:
+        return self.storage == 'float32'
+
+    @property
+    def nbytes(self) -> int:
+        code_size = getattr(self.index, 'code_size', self.index.d * 4)
+        return self.index.ntotal * code_size
+
+    @staticmethod
+    def expected_nbytes(n_items: int, dim: int, storage: str = 'float32') -> int:
+        """Size nbytes will report for an index of n_items vectors, before building it."""
+        return n_items * dim * STORAGE_VALUE_BYTES[storage]
+
+    def query_vector(self, row: int) -> np.ndarray:
+        """
+        Composite (query) vector of an indexed item, reconstructed from the
+        index. Only exact for float32 storage.
+        """
+        return self.index.reconstruct(int(row))
+
+    def search_rows(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k inner-product search returning matrix rows.
+
+        Returns:
+            Tuple of (rows, scores) sorted by descending score
+        """
+        distances, indices = self.index.search(query.reshape(1, -1).astype(np.float32), k)
+        valid = indices[0] >= 0
+        return indices[0][valid], distances[0][valid]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k inner-product search.
+
+        Returns:
+            Tuple of (item_ids, scores) sorted by descending score
+        """
+        rows, scores = self.search_rows(query, k)
+        return self.item_ids[rows], scores
+
+    def query_vectors(self, rows) -> np.ndarray:
+        """(Q, D) composite vectors of several indexed items."""
+        return np.vstack([self.query_vector(row) for row in rows]).astype(np.float32)
+
+    def search_rows_batch(self, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Top-k inner-product search for a (Q, D) query matrix in one FAISS
+        call (a single GEMM for the flat index).
+
+        Returns:
+            List of (rows, scores) per query, sorted by descending score
+        """
+        distances, indices = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        return [(row_indices[row_indices >= 0], row_distances[row_indices >= 0])
+                for row_indices, row_distances in zip(indices, distances)]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Batched search().
+
+        Returns:
+            List of (item_ids, scores) per query, sorted by descending score
+        """
+        return [(self.item_ids[rows], scores) for rows, scores in self.search_rows_batch(queries, k)]
+
+
+class CompositeIndexCache:
+    """
+    Thread-safe LRU cache of CompositeIndex objects bounded by entry count
+    and memory budget.
+    """
+
+    def __init__(self, max_entries: int = 8, max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple[float, ...], CompositeIndex]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def get_or_build(
+        self,
+        key: Tuple[float, ...],
+        nbytes: int,
+        builder: Callable[[], CompositeIndex]
+    ) -> Optional[CompositeIndex]:
+        """
+        Return the cached index for a key, building it on a miss.
+
+        Args:
+            key: Weight profile key from weights_cache_key()
+            nbytes: Expected size of the index, checked against the budget
+            builder: Zero-argument callable that builds the index
+
+        Returns:
+            CompositeIndex, or None if a single index does not fit the budget
+            (callers should fall back to scoring without an index).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            if nbytes > self.max_bytes or self.max_entries <= 0:
+                self.rejected += 1
+                return None
+
+        # Build outside the lock so hits on other profiles are not blocked.
+        entry = builder()
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            self._evict()
+        logger.info(f"Built composite index for weights {key} ({entry.nbytes / 1e6:.1f} MB)")
+        return entry
+
+    def _evict(self):
+        """Drop least recently used entries until both limits hold."""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current memory use."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'profiles': [list(key) for key in self._entries.keys()]
+            }
@@ -0,0 +1,192 @@
+"""
+Weighted MinHash sketches and an LSH band index over show keywords.
+
+A keyword set is the set of its (category, keyword) terms, each weighted by
+its category weight (see keyword_matrix.py). For every hash function i and
+term t a deterministic exponential variate
+
+    E_i(t) = -ln(U_i(t)) / w(t),   U_i(t) uniform in (0, 1), derived from t
+
+is drawn, and the sketch of a set is min_t E_i(t) per hash function. Two
+sets get the same minimum exactly when the minimizing term is shared, which
+happens with probability |A ∩ B|_w / |A ∪ B|_w, i.e. the Weighted Jaccard
+similarity used for reranking. U_i(t) depends only on the term string, so
+query terms unknown to the catalog behave correctly too.
+
+The sketch is cut into `bands` bands; shows whose band values all match a
+query band land in the same bucket. Candidates are ranked by the number of
+matching bands, so the keyword channel returns a bounded list without
+touching the table. With one value per band (the default) that count is the
+MinHash estimate of the Weighted Jaccard similarity itself; keyword
+similarities between shows are mostly low, where wider bands miss too many
+true neighbors.
+"""
+
+import hashlib
+import logging
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+from keyword_matrix import KeywordMatrix, keyword_terms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 64
+ROW_BLOCK = 2048
+
+
+def term_hashes(terms: Iterable[str]) -> np.ndarray:
+    """Stable 64-bit hash of every term."""
+    return np.array([int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+                     for term in terms], dtype=np.uint64)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def exponential_variates(hashes: np.ndarray, weights: np.ndarray, num_perm: int) -> np.ndarray:
+    """
+    E_i(t) for every term and hash function.
+
+    Args:
+        hashes: (T,) term hashes from term_hashes()
+        weights: (T,) term weights
+        num_perm: Number of hash functions
+
+    Returns:
+        (T, num_perm) float32 variates
+    """
+    seeds = _splitmix64(np.arange(num_perm, dtype=np.uint64))
+    with np.errstate(over='ignore'):
+        mixed = _splitmix64(hashes[:, None] ^ seeds[None, :])
+    # 53 random bits, shifted off zero
+    uniform = ((mixed >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+    return (-np.log(uniform) / np.asarray(weights, dtype=np.float64)[:, None]).astype(np.float32)
+
+
+def band_keys(sketches: np.ndarray, bands: int) -> np.ndarray:
+    """
+    One 64-bit bucket key per band.
+
+    Args:
+        sketches: (N, num_perm) float32 sketches
+        bands: Number of bands (must divide num_perm)
+
+    Returns:
+        (bands, N) uint64 keys
+    """
+    words = np.ascontiguousarray(sketches).view(np.uint32).astype(np.uint64)
+    words = words.reshape(len(sketches), bands, -1)
+    keys = np.full((len(sketches), bands), 0xCBF29CE484222325, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in range(words.shape[2]):
+            keys = (keys ^ words[:, :, column]) * np.uint64(0x100000001B3)
+    return np.ascontiguousarray(keys.T)
+
+
+class KeywordLSH:
+    """
+    LSH band index of weighted MinHash sketches.
+    """
+
+    def __init__(self, item_ids: np.ndarray, sorted_keys: np.ndarray, sorted_rows: np.ndarray,
+                 num_perm: int, bands: int):
+        """
+        Args:
+            item_ids: (N,) database id of every row
+            sorted_keys: (bands, M) bucket keys of the rows with keywords, sorted per band
+            sorted_rows: (bands, M) int32 rows in the order of sorted_keys
+            num_perm: Number of hash functions
+            bands: Number of bands
+        """
+        self.item_ids = item_ids
+        self.sorted_keys = sorted_keys
+        self.sorted_rows = sorted_rows
+        self.num_perm = num_perm
+        self.bands = bands
+
+    @classmethod
+    def build(cls, matrix: KeywordMatrix, num_perm: int = DEFAULT_NUM_PERM,
+              bands: int = DEFAULT_BANDS) -> 'KeywordLSH':
+        """
+        Sketch every show of a compiled keyword matrix.
+
+        Args:
+            matrix: KeywordMatrix of the catalog
+            num_perm: Number of hash functions
+            bands: Number of bands (must divide num_perm)
+
+        Returns:
+            KeywordLSH
+        """
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        variates = exponential_variates(term_hashes(matrix.vocabulary.tolist()), matrix.column_weights, num_perm)
+
+        # Shows without keywords are left out of the index.
+        rows = np.flatnonzero(np.diff(matrix.indptr) > 0)
+        sketches = np.empty((len(rows), num_perm), dtype=np.float32)
+        for start in range(0, len(rows), ROW_BLOCK):
+            block = rows[start:start + ROW_BLOCK]
+            begin, end = matrix.indptr[block[0]], matrix.indptr[block[-1] + 1]
+            entries = variates[matrix.indices[begin:end]]
+            # Empty rows are skipped, so every offset starts a non-empty
+            # segment and the block's entries are contiguous.
+            offsets = matrix.indptr[block] - begin
+            sketches[start:start + len(block)] = np.minimum.reduceat(entries, offsets, axis=0)
+
+        keys = band_keys(sketches, bands)
+        order = np.argsort(keys, axis=1, kind='stable')
+        sorted_keys = np.take_along_axis(keys, order, axis=1)
+        sorted_rows = rows[order].astype(np.int32)
+        logger.info(f"Keyword LSH built: {len(rows)} shows, {num_perm} hashes, {bands} bands")
+        return cls(matrix.item_ids, sorted_keys, sorted_rows, num_perm, bands)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.item_ids.nbytes + self.sorted_keys.nbytes + self.sorted_rows.nbytes)
+
+    def sketch(self, keywords) -> np.ndarray:
+        """(num_perm,) sketch of a keyword dict (all +inf without keywords)."""
+        terms = keyword_terms(keywords)
+        if not terms:
+            return np.full(self.num_perm, np.inf, dtype=np.float32)
+        variates = exponential_variates(term_hashes(terms), np.array(list(terms.values())), self.num_perm)
+        return variates.min(axis=0)
+
+    def candidates(self, keywords, limit: int, exclude: Sequence[int] = ()) -> List[int]:
+        """
+        Ids of shows sharing at least one band with the query, the most
+        matching bands first.
+
+        Args:
+            keywords: Query keyword dict (or JSON string)
+            limit: Maximum number of ids
+            exclude: Ids never returned (e.g. the source show)
+        """
+        if not keyword_terms(keywords) or self.sorted_keys.shape[1] == 0:
+            return []
+        query_keys = band_keys(self.sketch(keywords)[None, :], self.bands)[:, 0]
+        hits = []
+        for band, key in enumerate(query_keys):
+            keys = self.sorted_keys[band]
+            low = np.searchsorted(keys, key, side='left')
+            high = np.searchsorted(keys, key, side='right')
+            hits.append(self.sorted_rows[band, low:high])
+        hits = np.concatenate(hits)
+        if len(hits) == 0:
+            return []
+
+        rows, counts = np.unique(hits, return_counts=True)
+        ids = self.item_ids[rows]
+        if len(exclude):
+            keep = ~np.isin(ids, np.asarray(exclude, dtype=np.int64))
+            ids, counts = ids[keep], counts[keep]
+        order = np.argsort(-counts, kind='stable')[:limit]
+        return ids[order].tolist()
@@ -0,0 +1,261 @@
+"""
+Compiled keyword matrix for vectorized Weighted Jaccard similarity.
+
+Every distinct (category, keyword) pair of the catalog's `keywords_json` is
+a column of a CSR matrix with one row per show; the column weight is the
+category weight from CATEGORY_WEIGHTS. With |A|_w the summed column weights
+of a keyword set A, weighted_jaccard_similarity is
+
+    J(q, d) = I / (|q|_w + |d|_w - I),   I = |q ∩ d|_w
+
+since the per-category unions add up to |q|_w + |d|_w - I. I for a query
+against any set of rows is a gather over the rows' CSR segments and a
+bincount. The category weights are multiples of 0.5, so all weighted counts
+are exact in float64 and the scores are identical to
+keyword_similarity.weighted_jaccard_similarity.
+"""
+
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from keyword_similarity import CATEGORY_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+# Separates category and keyword in a vocabulary term
+TERM_SEPARATOR = '\x1f'
+
+
+def category_weight(category: str) -> float:
+    """Weight of a keyword category (unknown categories count 1.0)."""
+    return CATEGORY_WEIGHTS.get(category, 1.0)
+
+
+def keyword_terms(keywords) -> Dict[str, float]:
+    """
+    Distinct (category, keyword) terms of a keyword dict with their weights.
+
+    Args:
+        keywords: Dict of category -> list of keywords (or its JSON string)
+
+    Returns:
+        term -> category weight
+    """
+    if isinstance(keywords, str):
+        keywords = json.loads(keywords)
+    terms = {}
+    for category, keyword_list in (keywords or {}).items():
+        weight = category_weight(category)
+        for keyword in set(keyword_list):
+            terms[f"{category}{TERM_SEPARATOR}{keyword}"] = weight
+    return terms
+
+
+def segment_positions(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Entry positions of several CSR rows.
+
+    Returns:
+        Tuple of (positions, lengths): the concatenated entry positions of
+        the rows and the number of entries of each row
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.arange(int(lengths.sum()), dtype=np.int64) - np.repeat(offsets - starts, lengths)
+    return positions, lengths
+
+
+class KeywordMatrix:
+    """
+    Weighted Jaccard similarity of keyword dicts against the catalog.
+    """
+
+    def __init__(self, item_ids: np.ndarray, vocabulary: np.ndarray, column_weights: np.ndarray,
+                 indptr: np.ndarray, indices: np.ndarray):
+        """
+        Args:
+            item_ids: (N,) database id of every row
+            vocabulary: (V,) sorted unicode array of category/keyword terms
+            column_weights: (V,) float64 category weight of every term
+            indptr: (N + 1,) CSR row pointers
+            indices: (nnz,) int32 term columns of each entry
+        """
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.vocabulary = vocabulary
+        self.column_weights = column_weights
+        self.indptr = indptr
+        self.indices = indices
+        # Weighted size |d|_w of every row
+        entry_weights = column_weights[indices]
+        entry_rows = np.repeat(np.arange(len(self.item_ids)), np.diff(indptr))
+        self.row_weights = np.bincount(entry_rows, weights=entry_weights, minlength=len(self.item_ids))
+        self._id_order = np.argsort(self.item_ids, kind='stable')
+        self._sorted_ids = self.item_ids[self._id_order]
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, object]]) -> 'KeywordMatrix':
+        """
+        Compile catalog rows.
+
+        Args:
+            rows: (id, keywords_json) pairs; keywords_json may be a dict or
+                a JSON string
+
+        Returns:
+            KeywordMatrix
+        """
+        item_ids, row_terms = [], []
+        for item_id, keywords in rows:
+            item_ids.append(item_id)
+            row_terms.append(keyword_terms(keywords))
+
+        all_terms = {}
+        for terms in row_terms:
+            all_terms.update(terms)
+        vocabulary_list = sorted(all_terms)
+        column_of = {term: column for column, term in enumerate(vocabulary_list)}
+
+        indptr = np.zeros(len(item_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(terms) for terms in row_terms])
+        indices = np.fromiter((column_of[term] for terms in row_terms for term in sorted(terms)),
+                              dtype=np.int32, count=int(indptr[-1]))
+        vocabulary = np.array(vocabulary_list, dtype=str) if vocabulary_list else np.zeros(0, dtype='<U1')
+        column_weights = np.array([all_terms[term] for term in vocabulary_list], dtype=np.float64)
+        return cls(np.array(item_ids, dtype=np.int64), vocabulary, column_weights, indptr, indices)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.item_ids.nbytes + self.vocabulary.nbytes + self.column_weights.nbytes +
+                   self.indptr.nbytes + self.indices.nbytes + self.row_weights.nbytes)
+
+    def rows_of(self, item_ids: Sequence[int]) -> np.ndarray:
+        """Matrix rows of ids (-1 for ids that are not compiled)."""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(len(item_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, item_ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[pos] == item_ids, self._id_order[pos], -1)
+
+    def query(self, keywords) -> Tuple[np.ndarray, float]:
+        """
+        Compile a query keyword dict.
+
+        Returns:
+            Tuple of (mask, weight): a (V,) bool mask of the query's known
+            terms and its weighted size |q|_w (unknown terms included)
+        """
+        terms = keyword_terms(keywords)
+        mask = np.zeros(len(self.vocabulary), dtype=bool)
+        if terms and len(self.vocabulary):
+            candidates = np.array(list(terms), dtype=str)
+            pos = np.minimum(np.searchsorted(self.vocabulary, candidates), len(self.vocabulary) - 1)
+            mask[pos[self.vocabulary[pos] == candidates]] = True
+        return mask, float(sum(terms.values()))
+
+    def similarity(self, keywords, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Weighted Jaccard similarity of a keyword dict against matrix rows.
+
+        Args:
+            keywords: Query keyword dict (or JSON string)
+            rows: Matrix rows to score (default: every row)
+
+        Returns:
+            (R,) float64 scores, 0 where either side has no keywords
+        """
+        rows = np.arange(len(self.item_ids)) if rows is None else np.asarray(rows, dtype=np.int64)
+        mask, query_weight = self.query(keywords)
+        scores = np.zeros(len(rows), dtype=np.float64)
+        if query_weight == 0 or len(rows) == 0:
+            return scores
+
+        positions, lengths = segment_positions(self.indptr, rows)
+        columns = self.indices[positions]
+        shared = np.where(mask[columns], self.column_weights[columns], 0.0)
+        intersection = np.bincount(np.repeat(np.arange(len(rows)), lengths), weights=shared,
+                                   minlength=len(rows))
+        union = query_weight + self.row_weights[rows] - intersection
+        np.divide(intersection, union, out=scores, where=union > 0)
+        return scores
+
+    def similarity_by_id(self, keywords, item_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Weighted Jaccard similarity against shows given by id.
+
+        Returns:
+            Tuple of (scores, found): (R,) scores and a bool mask of the ids
+            that are compiled (scores of the others are 0)
+        """
+        rows = self.rows_of(item_ids)
+        found = rows >= 0
+        scores = np.zeros(len(rows), dtype=np.float64)
+        scores[found] = self.similarity(keywords, rows[found])
+        return scores, found
+
+    def similarity_batch(self, keyword_list: Sequence, row_groups: Sequence[Sequence[int]]) -> List[np.ndarray]:
+        """
+        Weighted Jaccard similarity of several queries, each against its own
+        matrix rows, in one pass over the CSR entries.
+
+        An entry is shared when (query, column) is among the query terms,
+        tested on the combined key query * V + column.
+
+        Args:
+            keyword_list: Query keyword dicts (or JSON strings / None)
+            row_groups: Matrix rows to score for each query
+
+        Returns:
+            One (R_i,) float64 score array per query
+        """
+        row_groups = [np.asarray(rows, dtype=np.int64) for rows in row_groups]
+        sizes = np.array([len(rows) for rows in row_groups], dtype=np.int64)
+        if sizes.sum() == 0:
+            return [np.zeros(size, dtype=np.float64) for size in sizes]
+
+        vocabulary_size = len(self.vocabulary)
+        query_weights = np.zeros(len(row_groups), dtype=np.float64)
+        query_keys = []
+        for position, keywords in enumerate(keyword_list):
+            mask, query_weights[position] = self.query(keywords)
+            query_keys.append(position * vocabulary_size + np.flatnonzero(mask))
+        query_keys = np.concatenate(query_keys)
+
+        rows = np.concatenate(row_groups)
+        owners = np.repeat(np.arange(len(row_groups)), sizes)
+        positions, lengths = segment_positions(self.indptr, rows)
+        columns = self.indices[positions]
+        entry_keys = np.repeat(owners, lengths) * vocabulary_size + columns
+        shared = np.where(np.isin(entry_keys, query_keys), self.column_weights[columns], 0.0)
+        intersection = np.bincount(np.repeat(np.arange(len(rows)), lengths), weights=shared,
+                                   minlength=len(rows))
+        union = query_weights[owners] + self.row_weights[rows] - intersection
+        scores = np.zeros(len(rows), dtype=np.float64)
+        np.divide(intersection, union, out=scores, where=(union > 0) & (query_weights[owners] > 0))
+        return np.split(scores, np.cumsum(sizes)[:-1])
+
+    def similarity_by_id_batch(self, keyword_list: Sequence,
+                               id_groups: Sequence[Sequence[int]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        similarity_by_id for several queries at once.
+
+        Returns:
+            One (scores, found) tuple per query
+        """
+        row_groups = [self.rows_of(item_ids) for item_ids in id_groups]
+        found_groups = [rows >= 0 for rows in row_groups]
+        score_groups = self.similarity_batch(
+            keyword_list, [rows[found] for rows, found in zip(row_groups, found_groups)]
+        )
+        results = []
+        for found, found_scores in zip(found_groups, score_groups):
+            scores = np.zeros(len(found), dtype=np.float64)
+            scores[found] = found_scores
+            results.append((scores, found))
+        return results
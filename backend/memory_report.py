@@ -0,0 +1,90 @@
+"""
+Process memory reporting for confirming copy-on-write sharing between
+gunicorn workers.
+
+Reads /proc/self/smaps_rollup (Linux >= 4.14). PSS (proportional set size)
+divides shared pages between the processes mapping them, so with a preloaded
+master RSS stays high in every worker while PSS and Private_Dirty stay small.
+"""
+
+import logging
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SMAPS_FIELDS = {
+    'Rss': 'rss_kb',
+    'Pss': 'pss_kb',
+    'Shared_Clean': 'shared_clean_kb',
+    'Shared_Dirty': 'shared_dirty_kb',
+    'Private_Clean': 'private_clean_kb',
+    'Private_Dirty': 'private_dirty_kb',
+    'Swap': 'swap_kb',
+}
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """
+    Memory counters of the current process in kB.
+
+    Returns:
+        Dict with rss/pss/shared/private counters; fields that cannot be read
+        on this platform are None.
+    """
+    report = {name: None for name in _SMAPS_FIELDS.values()}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(':') in _SMAPS_FIELDS:
+                    report[_SMAPS_FIELDS[parts[0].rstrip(':')]] = int(parts[1])
+    except OSError:
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        report['rss_kb'] = int(line.split()[1])
+        except OSError as e:
+            logger.warning(f"Could not read process memory: {e}")
+    return report
+
+
+def array_bytes(arrays) -> Dict[str, int]:
+    """
+    Split the size of a collection of arrays into memory-mapped and
+    in-process (heap) bytes.
+    """
+    mapped, resident = 0, 0
+    for array in arrays:
+        if array is None:
+            continue
+        if isinstance(array, np.memmap):
+            mapped += array.nbytes
+        else:
+            resident += array.nbytes
+    return {'mapped_bytes': mapped, 'heap_bytes': resident}
+
+
+def build_report(resources: Dict, preloaded_pid: Optional[int]) -> Dict:
+    """
+    Assemble the memory report returned by the debug endpoint.
+
+    Args:
+        resources: Name -> size dict of the loaded resources
+        preloaded_pid: Pid of the process that loaded the resources
+
+    Returns:
+        Report dict
+    """
+    pid = os.getpid()
+    return {
+        'pid': pid,
+        'ppid': os.getppid(),
+        'resources_loaded_by': preloaded_pid,
+        'shared_from_master': preloaded_pid is not None and preloaded_pid != pid,
+        'memory': process_memory(),
+        'resources': resources,
+    }
@@ -0,0 +1,251 @@
+"""
+In-process exact all-pairs similarity for the batch similarity job.
+
+VectorDB.search_multi_vector ranks every show by
+
+    w_a * cos(q_a, d_a) + w_p * cos(q_p, d_p)
+
+keeps the best `candidate_limit` rows and reranks them with Weighted Jaccard
+keyword similarity. Running it once per show is an O(N^2) job done one full
+table sort at a time. Here the analytical and plot matrices are loaded once
+and the weighted score of a block of source rows against a block of target
+rows is two float32 matrix products; a running top-K per source row is kept
+with argpartition, so memory stays at one (rows x columns) block.
+
+float32 products can reorder near-tied candidates, so a few extra candidates
+are kept and their cosines are recomputed in float64 before the cut to
+`candidate_limit`. The keyword rerank then runs on those candidates only,
+with the same formula and tie order as search_multi_vector.
+"""
+
+import logging
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from keyword_matrix import KeywordMatrix
+from keyword_similarity import normalize_keywords
+
+logger = logging.getLogger(__name__)
+
+# Source rows per block and target columns per matrix product; a score
+# block is BLOCK_ROWS x BLOCK_COLUMNS float32 (4 MiB).
+BLOCK_ROWS = 256
+BLOCK_COLUMNS = 4096
+# Extra float32 candidates kept before the exact float64 cut
+SELECTION_SLACK = 16
+# Source rows per float64 recompute (bounds the gathered candidate vectors)
+EXACT_CHUNK = 16
+# Target rows per float64 chunk of a reverse_scores column
+REVERSE_CHUNK = BLOCK_COLUMNS
+
+
+def unit_rows(matrix: np.ndarray) -> np.ndarray:
+    """(N, D) float32 copy of a matrix with unit (or zero) rows."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.sqrt(np.einsum('nd,nd->n', matrix, matrix, dtype=np.float64))
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return matrix * scale[:, None].astype(np.float32)
+
+
+def running_top_k(scores: np.ndarray, columns_offset: int, keep: int,
+                  top_scores: np.ndarray, top_columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge a block of scores into the running top-`keep` of every row.
+
+    Args:
+        scores: (B, C) scores of the block
+        columns_offset: Column index of the block's first column
+        keep: Number of columns kept per row
+        top_scores, top_columns: (B, keep) current top scores and columns
+            (-inf / -1 where not filled yet)
+
+    Returns:
+        Updated (top_scores, top_columns), unordered within a row
+    """
+    if scores.shape[1] > keep:
+        part = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        scores = np.take_along_axis(scores, part, axis=1)
+        columns = part + columns_offset
+    else:
+        columns = np.broadcast_to(np.arange(scores.shape[1]) + columns_offset, scores.shape)
+    merged_scores = np.concatenate([top_scores, scores], axis=1)
+    merged_columns = np.concatenate([top_columns, columns], axis=1)
+    part = np.argpartition(-merged_scores, keep - 1, axis=1)[:, :keep]
+    return np.take_along_axis(merged_scores, part, axis=1), np.take_along_axis(merged_columns, part, axis=1)
+
+
+class PairwiseSimilarity:
+    """
+    Weighted vector + keyword neighbors of every show of a loaded catalog.
+    """
+
+    def __init__(self, item_ids: Sequence[int], analytical: np.ndarray, plot: np.ndarray,
+                 keywords: Optional[Sequence] = None):
+        """
+        Args:
+            item_ids: (N,) database id of every row
+            analytical: (N, D) analytical embeddings
+            plot: (N, D) plot embeddings
+            keywords: keywords_json of every row (dict, JSON string or None)
+        """
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.analytical = unit_rows(analytical)
+        self.plot = unit_rows(plot)
+        self.keywords = list(keywords) if keywords is not None else [None] * len(self.item_ids)
+        # Candidates are matrix rows, so the keyword matrix covers every row
+        # (rows without keywords score 0).
+        self.keyword_matrix = KeywordMatrix.build(zip(self.item_ids.tolist(), self.keywords))
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def _exact_cosines(self, unit: np.ndarray, rows: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """(B, C) float64 cosines of source rows against their candidate rows."""
+        cosines = np.empty(candidates.shape, dtype=np.float64)
+        for start in range(0, len(rows), EXACT_CHUNK):
+            chunk = slice(start, start + EXACT_CHUNK)
+            sources = unit[rows[chunk]].astype(np.float64)
+            targets = unit[candidates[chunk]].astype(np.float64)
+            cosines[chunk] = np.einsum('bcd,bd->bc', targets, sources)
+        return cosines
+
+    def _exact_column(self, unit: np.ndarray, row: int) -> np.ndarray:
+        """(N,) float64 cosines of every row against one row, as _exact_cosines computes them."""
+        source = unit[row].astype(np.float64)
+        cosines = np.empty(len(unit), dtype=np.float64)
+        for start in range(0, len(unit), REVERSE_CHUNK):
+            chunk = slice(start, start + REVERSE_CHUNK)
+            cosines[chunk] = np.einsum('cd,d->c', unit[chunk].astype(np.float64), source)
+        return cosines
+
+    def candidates(self, weights: Dict[str, float], candidate_limit: int,
+                   block_rows: int = BLOCK_ROWS, block_columns: int = BLOCK_COLUMNS,
+                   source_rows: Optional[np.ndarray] = None) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Best `candidate_limit` rows of every source row by weighted vector score.
+
+        Args:
+            weights: Component weights ('analytical', 'plot')
+            candidate_limit: Candidates per source row (the source row itself
+                included, as in search_multi_vector)
+            block_rows: Source rows per block
+            block_columns: Target columns per matrix product
+            source_rows: Source rows to compute (default: every row); the
+                targets are always the whole catalog
+
+        Yields:
+            Tuples of (rows, candidates, sim_analytical, sim_plot) per block:
+            (B,) source rows and (B, C) candidate rows with their float64
+            cosines, best weighted score first
+        """
+        n_items = len(self.item_ids)
+        keep = min(candidate_limit + SELECTION_SLACK, n_items)
+        weight_analytical = np.float32(weights['analytical'])
+        weight_plot = np.float32(weights['plot'])
+
+        if source_rows is None:
+            source_rows = np.arange(n_items)
+        for row_start in range(0, len(source_rows), block_rows):
+            rows = np.asarray(source_rows[row_start:row_start + block_rows], dtype=np.int64)
+            top_scores = np.full((len(rows), keep), -np.inf, dtype=np.float32)
+            top_columns = np.full((len(rows), keep), -1, dtype=np.int64)
+            for column_start in range(0, n_items, block_columns):
+                columns = slice(column_start, column_start + block_columns)
+                scores = self.analytical[rows] @ self.analytical[columns].T
+                scores *= weight_analytical
+                scores += weight_plot * (self.plot[rows] @ self.plot[columns].T)
+                top_scores, top_columns = running_top_k(scores, column_start, keep, top_scores, top_columns)
+
+            sim_analytical = self._exact_cosines(self.analytical, rows, top_columns)
+            sim_plot = self._exact_cosines(self.plot, rows, top_columns)
+            exact = weights['analytical'] * sim_analytical + weights['plot'] * sim_plot
+            order = np.argsort(-exact, axis=1, kind='stable')[:, :candidate_limit]
+            yield (
+                rows,
+                np.take_along_axis(top_columns, order, axis=1),
+                np.take_along_axis(sim_analytical, order, axis=1),
+                np.take_along_axis(sim_plot, order, axis=1)
+            )
+
+    def search_all(self, weights: Dict[str, float], limit: int, min_score: float = 0.0,
+                   block_rows: int = BLOCK_ROWS,
+                   source_ids: Optional[Sequence[int]] = None) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        search_multi_vector (exact mode) for every show (or the given
+        source shows), with the show's own keywords as query keywords.
+
+        Args:
+            weights: Component weights ('analytical', 'plot', 'keywords')
+            limit: Number of results per show (the show itself included)
+            min_score: Minimum final score
+            block_rows: Source rows per block
+            source_ids: Ids of the source shows (default: every show); ids
+                that are not loaded are skipped
+
+        Yields:
+            (item_id, results) per show in row order; results are dicts with
+            'id', 'final_score' and 'similarity_scores', best first
+        """
+        candidate_limit = min(limit * 5, 500)
+        source_rows = None
+        if source_ids is not None:
+            source_rows = np.sort(self.keyword_matrix.rows_of(source_ids))
+            source_rows = source_rows[source_rows >= 0]
+        for rows, candidates, sim_analytical, sim_plot in self.candidates(
+            weights, candidate_limit, block_rows, source_rows=source_rows
+        ):
+            keyword_list = [
+                normalize_keywords(self.keywords[row]) if self.keywords[row] else None for row in rows
+            ]
+            sim_keywords = np.stack(self.keyword_matrix.similarity_batch(keyword_list, list(candidates)))
+            final = (weights['analytical'] * sim_analytical + weights['plot'] * sim_plot +
+                     weights['keywords'] * sim_keywords)
+
+            for position, row in enumerate(rows):
+                # Stable sort over the vector-score order, as in _rerank_with_keywords
+                order = np.argsort(-final[position], kind='stable')
+                order = order[final[position, order] >= min_score][:limit]
+                yield int(self.item_ids[row]), [
+                    {
+                        'id': int(self.item_ids[candidates[position, column]]),
+                        'similarity_scores': {
+                            'analytical': float(sim_analytical[position, column]),
+                            'plot': float(sim_plot[position, column]),
+                            'keywords': float(sim_keywords[position, column])
+                        },
+                        'final_score': float(final[position, column])
+                    }
+                    for column in order
+                ]
+
+    def reverse_scores(self, target_ids: Sequence[int],
+                       weights: Dict[str, float]) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Score of each target show as a neighbor of every loaded show.
+
+        The weighted vector score and Weighted Jaccard are symmetric, so the
+        score of target t in the list of show s is computed from t's side:
+        one matrix-vector product per component and one keyword similarity
+        over the catalog, O(N) per target. Cosines are computed in float64,
+        exactly as for the stored lists, so merged scores compare with them.
+
+        Args:
+            target_ids: Ids of the target shows (ids not loaded are skipped)
+            weights: Component weights ('analytical', 'plot', 'keywords')
+
+        Yields:
+            (target_id, sim_analytical, sim_plot, sim_keywords, final) per
+            target, with (N,) float64 arrays in row order
+        """
+        rows = self.keyword_matrix.rows_of(target_ids)
+        for row in rows[rows >= 0]:
+            # float64 like the stored scores (_exact_cosines), chunked so only
+            # REVERSE_CHUNK rows are converted at a time
+            sim_analytical = self._exact_column(self.analytical, row)
+            sim_plot = self._exact_column(self.plot, row)
+            keywords = normalize_keywords(self.keywords[row]) if self.keywords[row] else None
+            sim_keywords = self.keyword_matrix.similarity(keywords)
+            final = (weights['analytical'] * sim_analytical + weights['plot'] * sim_plot +
+                     weights['keywords'] * sim_keywords)
+            yield int(self.item_ids[row]), sim_analytical, sim_plot, sim_keywords, final
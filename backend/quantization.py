@@ -0,0 +1,125 @@
+"""
+Reduced-precision storage for component matrices.
+
+Two formats are supported for the first-pass scoring of the similarity
+engine:
+
+- float16: plain half precision (2 bytes per value)
+- int8: per-dimension scalar quantization (1 byte per value). Each dimension
+  d is mapped linearly from [min_d, max_d] onto [-128, 127], so
+  x ~= offset_d + scale_d * code.
+
+Dot products are computed block-wise in float32 so the temporary memory
+stays bounded. Final rankings are expected to be rescored exactly from the
+float32 data (see ComponentSimilarityEngine.rerank).
+"""
+
+import logging
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORAGE_TYPES = ('float32', 'float16', 'int8')
+
+
+class Float16Matrix:
+    """Half-precision copy of a float32 matrix."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+    @classmethod
+    def from_float32(cls, matrix: np.ndarray, block_size: int = 4096) -> 'Float16Matrix':
+        data = np.empty(matrix.shape, dtype=np.float16)
+        for start in range(0, matrix.shape[0], block_size):
+            data[start:start + block_size] = matrix[start:start + block_size]
+        return cls(data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def dot(self, vector: np.ndarray, block_size: int = 2048) -> np.ndarray:
+        """Approximate matrix @ vector as float32 (vector may be a (D, Q) query matrix)."""
+        vector = np.asarray(vector, dtype=np.float32)
+        out = np.empty(self.data.shape[:1] + vector.shape[1:], dtype=np.float32)
+        for start in range(0, self.data.shape[0], block_size):
+            block = self.data[start:start + block_size].astype(np.float32)
+            out[start:start + block_size] = block @ vector
+        return out
+
+
+class Int8Matrix:
+    """Per-dimension scalar-quantized int8 copy of a float32 matrix."""
+
+    def __init__(self, codes: np.ndarray, scale: np.ndarray, offset: np.ndarray):
+        self.codes = codes
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def from_float32(cls, matrix: np.ndarray, block_size: int = 4096) -> 'Int8Matrix':
+        n_rows, dim = matrix.shape
+        low = np.full(dim, np.inf, dtype=np.float32)
+        high = np.full(dim, -np.inf, dtype=np.float32)
+        for start in range(0, n_rows, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            low = np.minimum(low, block.min(axis=0))
+            high = np.maximum(high, block.max(axis=0))
+        if n_rows == 0:
+            low[:] = 0.0
+            high[:] = 0.0
+
+        scale = ((high - low) / 255.0).astype(np.float32)
+        scale[scale == 0] = 1.0
+        # x ~= low + scale * (code + 128)
+        offset = (low + 128.0 * scale).astype(np.float32)
+
+        codes = np.empty((n_rows, dim), dtype=np.int8)
+        for start in range(0, n_rows, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            quantized = np.rint((block - offset) / scale)
+            codes[start:start + block_size] = np.clip(quantized, -128, 127).astype(np.int8)
+        return cls(codes, scale, offset)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scale.nbytes + self.offset.nbytes
+
+    def dot(self, vector: np.ndarray, block_size: int = 2048) -> np.ndarray:
+        """Approximate matrix @ vector as float32 (vector may be a (D, Q) query matrix)."""
+        vector = np.asarray(vector, dtype=np.float32)
+        scale = self.scale if vector.ndim == 1 else self.scale[:, None]
+        scaled = scale * vector
+        bias = (self.offset @ vector).astype(np.float32)
+        out = np.empty(self.codes.shape[:1] + vector.shape[1:], dtype=np.float32)
+        for start in range(0, self.codes.shape[0], block_size):
+            block = self.codes[start:start + block_size].astype(np.float32)
+            out[start:start + block_size] = block @ scaled
+        out += bias
+        return out
+
+
+def quantize_matrix(matrix: np.ndarray, storage: str):
+    """
+    Build a reduced-precision copy of a matrix.
+
+    Args:
+        matrix: (N, D) float32 matrix (may be memory-mapped)
+        storage: 'float16' or 'int8'
+
+    Returns:
+        Float16Matrix or Int8Matrix
+    """
+    if storage == 'float16':
+        return Float16Matrix.from_float32(matrix)
+    if storage == 'int8':
+        return Int8Matrix.from_float32(matrix)
+    raise ValueError(f"Unsupported storage type: {storage} (expected one of {STORAGE_TYPES})")
+
+
+def quantize_components(components: Dict[str, np.ndarray], storage: str) -> Dict:
+    """Quantize every component matrix of an engine."""
+    return {key: quantize_matrix(matrix, storage) for key, matrix in components.items()}
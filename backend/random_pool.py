@@ -0,0 +1,110 @@
+"""
+Random sampling from a periodically refreshed pool of eligible ids.
+
+Replaces `ORDER BY RANDOM() LIMIT k`, which scans and sorts every eligible
+row per request. The eligible ids are loaded once per refresh interval (or
+when the catalog version changes) into a NumPy array; a page is then
+k draws without replacement, which numpy's Generator does in O(k) for
+k << N, followed by a primary-key lookup of those k rows.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from catalog_version import CatalogVersion
+
+logger = logging.getLogger(__name__)
+
+
+class RandomSamplePool:
+    """
+    Thread-safe pool of ids with uniform sampling without replacement.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], np.ndarray],
+        refresh_interval: float = 600.0,
+        seed: Optional[int] = None,
+        catalog_version: Optional[CatalogVersion] = None
+    ):
+        """
+        Args:
+            loader: Returns the current eligible ids (called on refresh)
+            refresh_interval: Seconds between reloads of the id pool
+            seed: Seed of the random generator (None: OS entropy); mixed
+                with the pid, so forked workers draw different sequences
+            catalog_version: Reload as soon as this version changes
+        """
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.catalog_version = catalog_version
+        self._seed = seed
+        self._rng = None
+        self._rng_pid = None
+        self._ids = None
+        self._loaded_at = 0.0
+        self._loaded_version = None
+        self._rng_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _generator(self) -> np.random.Generator:
+        """Random generator of the current process (call with _rng_lock held)."""
+        pid = os.getpid()
+        if self._rng is None or self._rng_pid != pid:
+            # A generator created before a fork (gunicorn preload) would give
+            # every worker the same sequence, so each process creates its own.
+            seed = None if self._seed is None else [self._seed, pid]
+            self._rng, self._rng_pid = np.random.default_rng(seed), pid
+        return self._rng
+
+    def _is_stale(self) -> bool:
+        if self._ids is None:
+            return True
+        if time.monotonic() - self._loaded_at >= self.refresh_interval:
+            return True
+        return self.catalog_version is not None and self.catalog_version.current() != self._loaded_version
+
+    def refresh(self):
+        """Reload the ids now."""
+        version = self.catalog_version.current() if self.catalog_version is not None else None
+        ids = np.asarray(self.loader(), dtype=np.int64)
+        self._ids, self._loaded_at, self._loaded_version = ids, time.monotonic(), version
+        logger.info(f"Random sample pool refreshed: {len(ids)} ids")
+
+    def ids(self) -> np.ndarray:
+        """Current id pool, refreshed if stale."""
+        if self._is_stale():
+            if self._ids is None:
+                # Nothing to serve yet: every caller waits for the first load.
+                with self._refresh_lock:
+                    if self._ids is None:
+                        self.refresh()
+            elif self._refresh_lock.acquire(blocking=False):
+                # One thread reloads; the others keep sampling the old pool.
+                try:
+                    if self._is_stale():
+                        self.refresh()
+                except Exception as e:
+                    logger.warning(f"Random sample pool refresh failed, keeping old ids: {e}")
+                finally:
+                    self._refresh_lock.release()
+        return self._ids
+
+    def sample(self, k: int) -> List[int]:
+        """k distinct random ids (fewer if the pool is smaller)."""
+        ids = self.ids()
+        size = min(k, len(ids))
+        if size == 0:
+            return []
+        with self._rng_lock:
+            positions = self._generator().choice(len(ids), size=size, replace=False)
+        return ids[positions].tolist()
+
+    def __len__(self) -> int:
+        return 0 if self._ids is None else len(self._ids)
@@ -0,0 +1,110 @@
+"""
+In-process cache of similarity rankings that are paged by the client.
+
+/api/similar-map ranks the same 210 neighbors for every page it serves; the
+ranked (id, score) list is kept here per (item, exact weight profile) and
+each page is sliced from it. Entries expire after a TTL or as soon as the
+catalog version changes (see catalog_version.py).
+
+    ranked = RANKING_CACHE.get_or_compute(key, ttl, lambda: rank(...))
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from catalog_version import CatalogVersion
+
+logger = logging.getLogger(__name__)
+
+Ranking = List[Tuple[int, float]]
+
+
+class RankingCache:
+    """
+    Thread-safe LRU of ranked (id, score) lists.
+    """
+
+    def __init__(self, max_entries: int = 256, catalog_version: Optional[CatalogVersion] = None):
+        """
+        Args:
+            max_entries: Bound on cached rankings (weight profiles are user input)
+            catalog_version: Version source used for invalidation
+        """
+        self.max_entries = max_entries
+        self.catalog_version = catalog_version or CatalogVersion()
+        self._entries: 'OrderedDict[Hashable, Tuple[Ranking, float, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def _lookup(self, key: Hashable, version: int) -> Optional[Ranking]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            ranking, expires_at, entry_version = entry
+            if entry_version != version or expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return ranking
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                if len(self._key_locks) > 4 * self.max_entries:
+                    self._key_locks.clear()
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get_or_compute(self, key: Hashable, ttl: float,
+                       compute: Callable[[], Optional[Ranking]]) -> Optional[Ranking]:
+        """
+        Cached ranking for a key, computed once per key on a miss.
+
+        Args:
+            key: Hashable key (item id and the exact weights)
+            ttl: Seconds an entry stays valid
+            compute: Returns the ranking, or None (e.g. unknown item), which
+                is passed through without being cached
+
+        Returns:
+            The ranking, or None if compute() returned None
+        """
+        version = self.catalog_version.current()
+        ranking = self._lookup(key, version)
+        if ranking is None:
+            # One thread per key ranks; the others wait and reuse it.
+            with self._key_lock(key):
+                ranking = self._lookup(key, version)
+                if ranking is None:
+                    with self._lock:
+                        self._stats['misses'] += 1
+                    ranking = compute()
+                    if ranking is None:
+                        return None
+                    with self._lock:
+                        self._entries[key] = (ranking, time.monotonic() + ttl, version)
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+                    return ranking
+        with self._lock:
+            self._stats['hits'] += 1
+        return ranking
+
+    def invalidate(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['catalog_version'] = self.catalog_version.current()
+        return stats
@@ -0,0 +1,152 @@
+"""
+In-process cache of serialized JSON responses for read-mostly endpoints.
+
+Entries are keyed by endpoint, URL parameters and selected query args, hold
+the already encoded body plus a strong ETag, and expire after a per-endpoint
+TTL or as soon as the catalog version changes (see catalog_version.py).
+Conditional requests (If-None-Match) are answered with 304 and no body.
+
+    @app.route('/api/popular-tv')
+    @RESPONSE_CACHE.cached(ttl=600)
+    def popular_tv(): ...
+"""
+
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from flask import Response, make_response, request
+
+from catalog_version import CatalogVersion
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Encoded response body with its validator."""
+
+    __slots__ = ('body', 'etag', 'mimetype', 'expires_at', 'version')
+
+    def __init__(self, body: bytes, mimetype: str, expires_at: float, version: int):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.mimetype = mimetype
+        self.expires_at = expires_at
+        self.version = version
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of CachedResponse objects.
+    """
+
+    def __init__(self, max_entries: int = 1024, catalog_version: Optional[CatalogVersion] = None):
+        """
+        Args:
+            max_entries: Bound on cached responses (query args are user input)
+            catalog_version: Version source used for invalidation
+        """
+        self.max_entries = max_entries
+        self.catalog_version = catalog_version or CatalogVersion()
+        self._entries: 'OrderedDict[Tuple, CachedResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0}
+
+    def _lookup(self, key: Tuple, version: int) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: Tuple, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _key_lock(self, key: Tuple) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                if len(self._key_locks) > 4 * self.max_entries:
+                    self._key_locks.clear()
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _respond(self, entry: CachedResponse, ttl: int) -> Response:
+        if entry.etag in request.if_none_match:
+            with self._lock:
+                self._stats['not_modified'] += 1
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        # Clients revalidate every time; unchanged data costs a 304.
+        response.headers['Cache-Control'] = 'public, no-cache'
+        response.headers['X-Cache-TTL'] = str(ttl)
+        return response
+
+    def cached(self, ttl: int, query_args: Sequence[str] = ()) -> Callable:
+        """
+        Decorator caching successful JSON responses of a Flask view.
+
+        Args:
+            ttl: Seconds an entry stays valid
+            query_args: Query string arguments that are part of the key
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = (view.__name__,
+                       tuple(sorted(kwargs.items())),
+                       tuple(request.args.get(name) for name in query_args))
+                version = self.catalog_version.current()
+                entry = self._lookup(key, version)
+                if entry is None:
+                    # One thread per key renders; the others wait and reuse it.
+                    with self._key_lock(key):
+                        entry = self._lookup(key, version)
+                        if entry is None:
+                            with self._lock:
+                                self._stats['misses'] += 1
+                            response = make_response(view(*args, **kwargs))
+                            if response.status_code != 200 or not response.is_json:
+                                return response
+                            entry = CachedResponse(response.get_data(), response.mimetype,
+                                                   time.monotonic() + ttl, version)
+                            self._store(key, entry)
+                            return self._respond(entry, ttl)
+                with self._lock:
+                    self._stats['hits'] += 1
+                return self._respond(entry, ttl)
+            return wrapper
+        return decorator
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        """Drop all entries, or only those of one view function."""
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == endpoint]:
+                    del self._entries[key]
+            self._stats['invalidations'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = sum(len(entry.body) for entry in self._entries.values())
+        stats['catalog_version'] = self.catalog_version.current()
+        return stats
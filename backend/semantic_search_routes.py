@@ -6,6 +6,8 @@ Imported by app.py
 from flask import request, jsonify
 from embedding_service import get_embedding_service
 from vector_db import VectorDB, WEIGHT_PROFILES
+from db_pool import pooled_connection
+import psycopg2.extras
 import logging
 import os
 import numpy as np
@@ -15,7 +17,7 @@ logger = logging.getLogger(__name__)
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 # Pre-load resources if needed (BM25 is loaded in app.py, we might need to access it differently or pass it)
-# For now, we'll assume BM25_MODEL and BM25_IDS are available globally in app context or we re-load/access them.
+# For now, we'll assume BM25_INDEX is available globally in app context or we re-load/access it.
 # To keep it clean, we will access global variables from app.py if possible, or better, pass them.
 # But for this refactor, let's just use the functions.
 
@@ -61,19 +63,18 @@ def semantic_search():
             'keywords': emb_service.encode_single(query)
         }
         
-        # Get vector database
-        vector_db = VectorDB(DATABASE_URL)
-        
-        # Search with selected weight profile
+        # Get vector database (pooled connection)
         weights = WEIGHT_PROFILES[intent]
-        results = vector_db.search_multi_vector(
-            query_vectors=query_vectors,
-            weights=weights,
-            limit=limit,
-            min_score=min_score
-        )
-        
-        vector_db.close()
+        with pooled_connection() as conn:
+            vector_db = VectorDB(conn=conn)
+            
+            # Search with selected weight profile
+            results = vector_db.search_multi_vector(
+                query_vectors=query_vectors,
+                weights=weights,
+                limit=limit,
+                min_score=min_score
+            )
         
         return jsonify({
             "query": query,
@@ -121,16 +122,14 @@ def hybrid_search():
             'keywords': emb_service.encode_single(query)
         }
         
-        vector_db = VectorDB(DATABASE_URL)
         weights = WEIGHT_PROFILES.get(intent, WEIGHT_PROFILES['mixed'])
-        
-        semantic_results = vector_db.search_multi_vector(
-            query_vectors=query_vectors,
-            weights=weights,
-            limit=50,  # Get more for fusion
-            min_score=0.0
-        )
-        vector_db.close()
+        with pooled_connection() as conn:
+            semantic_results = VectorDB(conn=conn).search_multi_vector(
+                query_vectors=query_vectors,
+                weights=weights,
+                limit=50,  # Get more for fusion
+                min_score=0.0
+            )
         
         # 2. Keyword search (BM25)
         keyword_scores = {}
@@ -138,19 +137,19 @@ def hybrid_search():
         # Access BM25 model from app module (circular import inside function is usually fine in Python)
         try:
             import app as main_app
-            bm25_model = getattr(main_app, 'BM25_MODEL', None)
-            bm25_ids = getattr(main_app, 'BM25_IDS', None)
+            bm25_index = getattr(main_app, 'BM25_INDEX', None)
             preprocess_text = getattr(main_app, 'preprocess_text', None)
         except ImportError:
-            bm25_model = None
+            bm25_index = None
             
-        if bm25_model and preprocess_text:
+        if bm25_index is not None and preprocess_text:
             tokenized_query = preprocess_text(query)
-            doc_scores = bm25_model.get_scores(tokenized_query)
-            max_score = np.max(doc_scores) if len(doc_scores) > 0 else 1.0
+            # Only the top 50 keyword hits take part in the fusion below
+            bm25_ids, doc_scores = bm25_index.top_k(tokenized_query, 50)
+            max_score = doc_scores[0] if len(doc_scores) > 0 else 1.0
             if max_score > 0:
                 normalized_scores = doc_scores / max_score
-                for item_id, score in zip(BM25_IDS, normalized_scores):
+                for item_id, score in zip(bm25_ids.tolist(), normalized_scores.tolist()):
                     keyword_scores[item_id] = score
         
         # 3. Reciprocal Rank Fusion
@@ -173,8 +172,8 @@ def hybrid_search():
         top_ids = [item_id for item_id, score in sorted_results[:limit]]
         
         # 5. Fetch details from database
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        results_map = {}
+        with pooled_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             if top_ids:
                 cur.execute("""
                     SELECT id, title, overview, genres, poster_path, year
@@ -182,7 +181,6 @@ def hybrid_search():
                     WHERE id IN %s
                 """, (tuple(top_ids),))
                 results_map = {r['id']: r for r in cur.fetchall()}
-        conn.close()
         
         # Package results
         final_results = []
@@ -208,9 +206,8 @@ def hybrid_search():
 def embedding_stats():
     """Get statistics about stored embeddings."""
     try:
-        vector_db = VectorDB(DATABASE_URL)
-        stats = vector_db.get_embedding_stats()
-        vector_db.close()
+        with pooled_connection() as conn:
+            stats = VectorDB(conn=conn).get_embedding_stats()
         return jsonify(stats)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,608 @@
+"""
+Linear-combination similarity engine for the popular-items set.
+
+The /similar endpoint ranks items by the cosine similarity of weighted
+composite vectors:
+
+    v_i = normalize(sum_k w_k * c_ik)
+
+where c_ik is the k-th embedding component (emb_genres, emb_overview, ...)
+of item i. Instead of rebuilding every composite vector per request, the
+engine keeps each component as a unit-normalized float32 matrix together
+with the per-item component norms and the per-item component Gram table
+G_i[k, l] = c_ik . c_il. For a unit query q the exact score is then
+
+    q . v_i = sum_k w_k * |c_ik| * (q . u_ik) / sqrt(w^T G_i w)
+
+which costs one matrix-vector product per component plus a K x K
+quadratic form per item.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from quantization import STORAGE_TYPES, quantize_components
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_components(raw_components: Dict[str, np.ndarray],
+                       component_keys: Sequence[str]) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+    """
+    Split raw component matrices into unit rows, row norms and Gram tables.
+
+    Args:
+        raw_components: Dict of component key -> (N, D) matrix. Missing
+            components of an item are expected to be all-zero rows.
+        component_keys: Order of the components in the norm/Gram tables
+
+    Returns:
+        Tuple of (unit_components, norms, gram):
+        - unit_components: key -> (N, D) float32 matrix with unit (or zero) rows
+        - norms: (N, K) float32 row norms
+        - gram: (N, K, K) float64 component Gram table
+    """
+    keys = list(component_keys)
+    n_items = raw_components[keys[0]].shape[0]
+    norms = np.zeros((n_items, len(keys)), dtype=np.float32)
+    gram = np.zeros((n_items, len(keys), len(keys)), dtype=np.float64)
+    unit_components = {}
+
+    for k, key in enumerate(keys):
+        matrix = np.asarray(raw_components[key], dtype=np.float32)
+        for l in range(k, len(keys)):
+            other = np.asarray(raw_components[keys[l]], dtype=np.float32)
+            dots = np.einsum('nd,nd->n', matrix, other, dtype=np.float64)
+            gram[:, k, l] = dots
+            gram[:, l, k] = dots
+
+        row_norms = np.sqrt(gram[:, k, k]).astype(np.float32)
+        norms[:, k] = row_norms
+        safe_norms = np.where(row_norms > 0, row_norms, 1.0).astype(np.float32)
+        unit_components[key] = matrix / safe_norms[:, None]
+
+    return unit_components, norms, gram
+
+
+class ComponentSimilarityEngine:
+    """
+    Exact weighted-composite cosine search over per-component matrices.
+    """
+
+    def __init__(
+        self,
+        item_ids: np.ndarray,
+        unit_components: Dict[str, np.ndarray],
+        norms: np.ndarray,
+        gram: np.ndarray,
+        component_keys: Sequence[str]
+    ):
+        """
+        Initialize the engine from precomputed arrays.
+
+        Args:
+            item_ids: (N,) database ids, row order of every matrix
+            unit_components: key -> (N, D) float32 unit-row matrix
+            norms: (N, K) float32 component norms
+            gram: (N, K, K) component Gram table
+            component_keys: Component order used by norms and gram
+        """
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.component_keys = list(component_keys)
+        self.unit_components = unit_components
+        self.norms = norms
+        self.gram = gram
+        self.dim = unit_components[self.component_keys[0]].shape[1]
+
+        # Sorted id lookup instead of a dict keeps the engine free of
+        # per-item Python objects.
+        self._id_order = np.argsort(self.item_ids, kind='stable')
+        self._sorted_ids = self.item_ids[self._id_order]
+
+        self.storage = 'float32'
+        self.rerank_factor = 1
+        self.quantized = None
+
+    @classmethod
+    def from_item_components(
+        cls,
+        items: Dict[int, Dict[str, List[float]]],
+        component_keys: Sequence[str],
+        dim: int
+    ) -> 'ComponentSimilarityEngine':
+        """
+        Build an engine from the per-item component dicts stored in the
+        `embeddings` JSONB column.
+
+        Args:
+            items: item id -> {component key: list of floats}
+            component_keys: Components to keep (e.g. the emb_* weight keys)
+            dim: Embedding dimension of every component
+
+        Returns:
+            ComponentSimilarityEngine
+        """
+        item_ids = np.fromiter(items.keys(), dtype=np.int64, count=len(items))
+        raw = {key: np.zeros((len(items), dim), dtype=np.float32) for key in component_keys}
+        for row, components in enumerate(items.values()):
+            for key in component_keys:
+                vector = components.get(key)
+                if vector:
+                    raw[key][row] = vector
+
+        unit_components, norms, gram = prepare_components(raw, component_keys)
+        return cls(item_ids, unit_components, norms, gram, component_keys)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def row_of(self, item_id: int) -> Optional[int]:
+        """Return the matrix row of an item id, or None if it is not indexed."""
+        pos = np.searchsorted(self._sorted_ids, item_id)
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == item_id:
+            return int(self._id_order[pos])
+        return None
+
+    def weight_vector(self, weights: Dict[str, float]) -> np.ndarray:
+        """
+        Convert a weight dict to the engine's component order.
+
+        Non-positive and unknown weights are ignored, matching the original
+        per-request composition (`weight > 0` only).
+        """
+        return np.array(
+            [max(float(weights.get(key, 0.0) or 0.0), 0.0) for key in self.component_keys],
+            dtype=np.float64
+        )
+
+    def inverse_norms(self, weight_vec: np.ndarray) -> np.ndarray:
+        """
+        Inverse composite norms 1 / sqrt(w^T G_i w) for every item.
+
+        Items whose composite vector is zero get 0, so they score 0 just like
+        a zero vector left unchanged by faiss.normalize_L2.
+        """
+        squared = np.einsum('nkl,k,l->n', self.gram, weight_vec, weight_vec)
+        norms = np.sqrt(np.maximum(squared, 0.0))
+        inv = np.zeros_like(norms)
+        np.divide(1.0, norms, out=inv, where=norms > 0)
+        return inv.astype(np.float32)
+
+    def query_vector(self, row: int, weight_vec: np.ndarray) -> np.ndarray:
+        """
+        Unit composite vector of an indexed item.
+
+        Args:
+            row: Matrix row of the item
+            weight_vec: Component weights from weight_vector()
+
+        Returns:
+            (D,) float32 unit vector (zero if the item has no components)
+        """
+        query = np.zeros(self.dim, dtype=np.float32)
+        for k, key in enumerate(self.component_keys):
+            coeff = weight_vec[k] * self.norms[row, k]
+            if coeff > 0:
+                query += np.float32(coeff) * self.unit_components[key][row]
+
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query /= norm
+        return query
+
+    def query_vectors(self, rows: Sequence[int], weight_vec: np.ndarray) -> np.ndarray:
+        """
+        Unit composite vectors of several indexed items (batched query_vector()).
+
+        Returns:
+            (Q, D) float32 matrix of unit (or zero) rows
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        queries = np.zeros((len(rows), self.dim), dtype=np.float32)
+        for k, key in enumerate(self.component_keys):
+            if weight_vec[k] <= 0:
+                continue
+            coeff = np.float32(weight_vec[k]) * self.norms[rows, k]
+            queries += coeff[:, None] * self.unit_components[key][rows]
+
+        norms = np.linalg.norm(queries, axis=1)
+        np.divide(queries, norms[:, None], out=queries, where=norms[:, None] > 0)
+        return queries
+
+    def query_from_components(self, components: Dict[str, List[float]],
+                              weight_vec: np.ndarray) -> np.ndarray:
+        """
+        Unit composite vector of an item that is not indexed, built from its
+        `embeddings` JSONB dict the same way as query_vector().
+
+        Args:
+            components: component key -> list of floats
+            weight_vec: Component weights from weight_vector()
+
+        Returns:
+            (D,) float32 unit vector (zero if no weighted component is present)
+        """
+        query = np.zeros(self.dim, dtype=np.float32)
+        for k, key in enumerate(self.component_keys):
+            vector = components.get(key)
+            if weight_vec[k] > 0 and vector:
+                query += np.float32(weight_vec[k]) * np.asarray(vector, dtype=np.float32)
+
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query /= norm
+        return query
+
+    def composite_vectors(self, weight_vec: np.ndarray, block_size: int = 4096) -> np.ndarray:
+        """
+        Materialize the unit composite vector of every item for one weight
+        profile (e.g. to back a FAISS index for a frequently used profile).
+
+        Args:
+            weight_vec: Component weights from weight_vector()
+            block_size: Rows processed at a time, bounds temporary memory
+
+        Returns:
+            (N, D) float32 matrix of unit (or zero) rows
+        """
+        inv_norms = self.inverse_norms(weight_vec)
+        vectors = np.zeros((len(self.item_ids), self.dim), dtype=np.float32)
+        for start in range(0, len(self.item_ids), block_size):
+            end = min(start + block_size, len(self.item_ids))
+            for k, key in enumerate(self.component_keys):
+                if weight_vec[k] <= 0:
+                    continue
+                coeff = (np.float32(weight_vec[k]) * self.norms[start:end, k] * inv_norms[start:end])
+                vectors[start:end] += coeff[:, None] * self.unit_components[key][start:end]
+        return vectors
+
+    def quantize(self, storage: str, rerank_factor: int = 4, copy: bool = True):
+        """
+        Run the first scoring pass on float16 or int8 data. Top candidates
+        are then rescored exactly from the float32 matrices, which must be
+        memory-mapped (engine from an EmbeddingStore) so that only the
+        candidate rows are paged in. With float32 matrices on the heap the
+        quantized copy would come on top of them, so that is refused.
+
+        Args:
+            storage: 'float32' (disables quantization), 'float16' or 'int8'
+            rerank_factor: First-pass candidates per requested result
+            copy: Build the quantized copy of the component matrices used by
+                search(). Pass False when the first pass is served by a
+                scalar-quantizer composite index; search() then scores the
+                float32 matrices directly.
+
+        Raises:
+            ValueError: Unknown storage type, or float32 matrices that are
+                not memory-mapped
+        """
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unsupported storage type: {storage} (expected one of {STORAGE_TYPES})")
+        if storage != 'float32' and not all(isinstance(m, np.memmap) for m in self.unit_components.values()):
+            raise ValueError("Quantization needs memory-mapped float32 components (an EmbeddingStore)")
+        self.storage = storage
+        self.rerank_factor = max(int(rerank_factor), 1)
+        if storage == 'float32' or not copy:
+            self.quantized = None
+        else:
+            self.quantized = quantize_components(self.unit_components, storage)
+
+    def score(self, query: np.ndarray, weight_vec: np.ndarray,
+              inv_norms: Optional[np.ndarray] = None, exact: bool = True) -> np.ndarray:
+        """
+        Cosine score of a unit query against every composite vector.
+
+        Args:
+            query: (D,) unit query vector
+            weight_vec: Component weights from weight_vector()
+            inv_norms: Optional precomputed inverse_norms(weight_vec)
+            exact: Use the float32 matrices even if a quantized copy exists
+
+        Returns:
+            (N,) float32 scores
+        """
+        query = np.asarray(query, dtype=np.float32)
+        matrices = self.unit_components if exact or self.quantized is None else self.quantized
+        scores = np.zeros(len(self.item_ids), dtype=np.float32)
+        for k, key in enumerate(self.component_keys):
+            if weight_vec[k] <= 0:
+                continue
+            matrix = matrices[key]
+            dots = matrix @ query if isinstance(matrix, np.ndarray) else matrix.dot(query)
+            scores += np.float32(weight_vec[k]) * self.norms[:, k] * dots
+
+        if inv_norms is None:
+            inv_norms = self.inverse_norms(weight_vec)
+        scores *= inv_norms
+        return scores
+
+    def score_batch(self, queries: np.ndarray, weight_vec: np.ndarray,
+                    inv_norms: Optional[np.ndarray] = None, exact: bool = True) -> np.ndarray:
+        """
+        Cosine scores of several unit queries against every composite vector.
+
+        Each component costs one matrix-matrix product (N x D times D x Q)
+        instead of Q matrix-vector products, so the component matrices are
+        read once per batch.
+
+        Args:
+            queries: (Q, D) unit query vectors
+            weight_vec: Component weights from weight_vector()
+            inv_norms: Optional precomputed inverse_norms(weight_vec)
+            exact: Use the float32 matrices even if a quantized copy exists
+
+        Returns:
+            (Q, N) float32 scores
+        """
+        queries_t = np.ascontiguousarray(np.asarray(queries, dtype=np.float32).T)
+        matrices = self.unit_components if exact or self.quantized is None else self.quantized
+        scores = np.zeros((len(self.item_ids), queries_t.shape[1]), dtype=np.float32)
+        for k, key in enumerate(self.component_keys):
+            if weight_vec[k] <= 0:
+                continue
+            matrix = matrices[key]
+            dots = matrix @ queries_t if isinstance(matrix, np.ndarray) else matrix.dot(queries_t)
+            dots *= (np.float32(weight_vec[k]) * self.norms[:, k])[:, None]
+            scores += dots
+
+        if inv_norms is None:
+            inv_norms = self.inverse_norms(weight_vec)
+        scores *= inv_norms[:, None]
+        return np.ascontiguousarray(scores.T)
+
+    def score_rows(self, queries: np.ndarray, weight_vec: np.ndarray, rows: np.ndarray,
+                   inv_norms: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Exact float32 scores of several queries against selected rows.
+
+        Args:
+            queries: (Q, D) unit query vectors
+            weight_vec: Component weights from weight_vector()
+            rows: (R,) matrix rows
+            inv_norms: Optional precomputed inverse_norms(weight_vec)
+
+        Returns:
+            (Q, R) float32 scores
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        queries_t = np.ascontiguousarray(np.asarray(queries, dtype=np.float32).T)
+        scores = np.zeros((len(rows), queries_t.shape[1]), dtype=np.float32)
+        for k, key in enumerate(self.component_keys):
+            if weight_vec[k] <= 0:
+                continue
+            dots = self.unit_components[key][rows] @ queries_t
+            dots *= (np.float32(weight_vec[k]) * self.norms[rows, k])[:, None]
+            scores += dots
+
+        if inv_norms is None:
+            inv_norms = self.inverse_norms(weight_vec)
+        scores *= inv_norms[rows][:, None]
+        return np.ascontiguousarray(scores.T)
+
+    def rerank(self, query: np.ndarray, weight_vec: np.ndarray, rows: np.ndarray,
+               k: int, inv_norms: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact float32 rescoring of candidate rows.
+
+        Args:
+            query: (D,) unit query vector
+            weight_vec: Component weights from weight_vector()
+            rows: Candidate matrix rows
+            k: Number of results
+            inv_norms: Optional precomputed inverse_norms(weight_vec)
+
+        Returns:
+            Tuple of (item_ids, scores) of the best k candidates, sorted
+            by descending exact score
+        """
+        # Sorted rows read the (possibly memory-mapped) matrices sequentially.
+        rows = np.sort(np.asarray(rows, dtype=np.int64))
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.zeros(len(rows), dtype=np.float32)
+        for c, key in enumerate(self.component_keys):
+            if weight_vec[c] <= 0:
+                continue
+            dots = self.unit_components[key][rows] @ query
+            scores += np.float32(weight_vec[c]) * self.norms[rows, c] * dots
+
+        if inv_norms is None:
+            inv_norms = self.inverse_norms(weight_vec)
+        scores *= inv_norms[rows]
+        order = top_k_rows(scores, k)
+        return self.item_ids[rows[order]], scores[order]
+
+    def search(self, query: np.ndarray, weight_vec: np.ndarray, k: int,
+               inv_norms: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k search by composite cosine score.
+
+        With a quantized copy, the first pass runs on the quantized matrices
+        and the best k * rerank_factor candidates are rescored exactly.
+
+        Args:
+            query: (D,) unit query vector
+            weight_vec: Component weights from weight_vector()
+            k: Number of results
+            inv_norms: Optional precomputed inverse_norms(weight_vec)
+
+        Returns:
+            Tuple of (item_ids, scores), both sorted by descending score
+        """
+        if inv_norms is None:
+            inv_norms = self.inverse_norms(weight_vec)
+        if self.quantized is not None:
+            approx = self.score(query, weight_vec, inv_norms, exact=False)
+            candidates = top_k_rows(approx, k * self.rerank_factor)
+            return self.rerank(query, weight_vec, candidates, k, inv_norms)
+
+        scores = self.score(query, weight_vec, inv_norms)
+        rows = top_k_rows(scores, k)
+        return self.item_ids[rows], scores[rows]
+
+    def search_batch(self, queries: np.ndarray, weight_vec: np.ndarray, k: int,
+                     inv_norms: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Top-k search for several queries with one scoring pass (see
+        score_batch()). Results are identical to calling search() per query.
+
+        Args:
+            queries: (Q, D) unit query vectors
+            weight_vec: Component weights from weight_vector()
+            k: Number of results per query
+            inv_norms: Optional precomputed inverse_norms(weight_vec)
+
+        Returns:
+            List of (item_ids, scores) per query, sorted by descending score
+        """
+        if inv_norms is None:
+            inv_norms = self.inverse_norms(weight_vec)
+        if self.quantized is not None:
+            approx = self.score_batch(queries, weight_vec, inv_norms, exact=False)
+            return [self.rerank(query, weight_vec, top_k_rows(row_scores, k * self.rerank_factor), k, inv_norms)
+                    for query, row_scores in zip(queries, approx)]
+
+        scores = self.score_batch(queries, weight_vec, inv_norms)
+        results = []
+        for row_scores in scores:
+            rows = top_k_rows(row_scores, k)
+            results.append((self.item_ids[rows], row_scores[rows]))
+        return results
+
+    def search_multi_seed(self, queries: np.ndarray, seed_weights: np.ndarray, weight_vec: np.ndarray,
+                          k: int, exclude_rows: Sequence[int] = (), centroid_weight: float = 0.5,
+                          inv_norms: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k search for a set of seed items ("more like these").
+
+        The fused score of an item is
+
+            centroid_weight * (c . v_i) + (1 - centroid_weight) * max_s (a_s * q_s . v_i)
+
+        where c is the normalized weighted centroid of the seed queries q_s
+        and a_s = weight_s / max(weight). The centroid favors items close to
+        the whole set, the max term keeps items very close to a single seed.
+        All seeds and the centroid are scored in one score_batch() pass.
+
+        Args:
+            queries: (S, D) unit query vectors of the seeds
+            seed_weights: (S,) non-negative seed weights
+            weight_vec: Component weights from weight_vector()
+            k: Number of results
+            exclude_rows: Rows never returned (the seeds themselves)
+            centroid_weight: Share of the centroid term in [0, 1]
+            inv_norms: Optional precomputed inverse_norms(weight_vec)
+
+        Returns:
+            Tuple of (item_ids, scores), both sorted by descending score
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        seed_weights = np.asarray(seed_weights, dtype=np.float32)
+        if len(queries) == 0 or seed_weights.max() <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        centroid = (seed_weights / seed_weights.sum()) @ queries
+        norm = np.linalg.norm(centroid)
+        if norm > 0:
+            centroid /= norm
+        all_queries = np.vstack([queries, centroid[None, :]])
+        relative = (seed_weights / seed_weights.max())[:, None]
+
+        def fuse(scores):
+            return (np.float32(centroid_weight) * scores[-1] +
+                    np.float32(1.0 - centroid_weight) * (relative * scores[:-1]).max(axis=0))
+
+        if inv_norms is None:
+            inv_norms = self.inverse_norms(weight_vec)
+        exact = self.quantized is None
+        fused = fuse(self.score_batch(all_queries, weight_vec, inv_norms, exact=exact))
+        exclude_rows = np.asarray(exclude_rows, dtype=np.int64)
+        fused[exclude_rows] = -np.inf
+        n_candidates = len(fused) - len(np.unique(exclude_rows))
+
+        if exact:
+            rows = top_k_rows(fused, min(k, n_candidates))
+            return self.item_ids[rows], fused[rows]
+
+        candidates = top_k_rows(fused, min(k * self.rerank_factor, n_candidates))
+        rescored = fuse(self.score_rows(all_queries, weight_vec, candidates, inv_norms))
+        order = top_k_rows(rescored, k)
+        return self.item_ids[candidates[order]], rescored[order]
+
+    def quantization_report(self, weight_vec: np.ndarray, sample: int = 50,
+                            k: int = 20, seed: int = 0, index=None) -> Dict:
+        """
+        Resident memory of the first-pass data and recall@k of the
+        quantized search against the exact float32 search.
+
+        Memory-mapped float32 matrices are file-backed and paged in on
+        demand, so they are reported separately from the heap bytes.
+
+        Args:
+            weight_vec: Weight profile used for the sampled queries
+            sample: Number of sampled query items
+            k: Recall cutoff
+            seed: Sampling seed
+            index: Composite index (index_cache.CompositeIndex) serving the
+                first pass instead of the engine's quantized copy
+
+        Returns:
+            Dict with byte counts and recall figures
+        """
+        float32_heap = sum(int(m.nbytes) for m in self.unit_components.values() if not isinstance(m, np.memmap))
+        float32_mapped = sum(int(m.nbytes) for m in self.unit_components.values() if isinstance(m, np.memmap))
+        quantized_bytes = sum(int(m.nbytes) for m in self.quantized.values()) if self.quantized else 0
+        index_bytes = int(index.nbytes) if index is not None else 0
+        report = {
+            'storage': self.storage,
+            'first_pass': 'composite_index' if index is not None else 'engine',
+            'float32_heap_bytes': float32_heap,
+            'float32_mapped_bytes': float32_mapped,
+            'quantized_bytes': quantized_bytes,
+            'index_bytes': index_bytes,
+            'resident_bytes': float32_heap + quantized_bytes + index_bytes,
+            'recall_at_k': 1.0,
+            'first_pass_recall_at_k': 1.0,
+            'k': k,
+            'sample': 0,
+        }
+        if len(self.item_ids) == 0 or (index is None and self.quantized is None):
+            return report
+
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(self.item_ids), size=min(sample, len(self.item_ids)), replace=False)
+        inv_norms = self.inverse_norms(weight_vec)
+        recall, first_pass = [], []
+        for row in rows:
+            query = self.query_vector(int(row), weight_vec)
+            exact_scores = self.score(query, weight_vec, inv_norms)
+            truth = set(self.item_ids[top_k_rows(exact_scores, k)].tolist())
+
+            if index is not None:
+                candidates, _ = index.search_rows(query, k * self.rerank_factor)
+            else:
+                approx = self.score(query, weight_vec, inv_norms, exact=False)
+                candidates = top_k_rows(approx, k * self.rerank_factor)
+            first_pass.append(len(truth & set(self.item_ids[candidates[:k]].tolist())) / len(truth))
+            found, _ = self.rerank(query, weight_vec, candidates, k, inv_norms)
+            recall.append(len(truth & set(found.tolist())) / len(truth))
+
+        report['recall_at_k'] = float(np.mean(recall))
+        report['first_pass_recall_at_k'] = float(np.mean(first_pass))
+        report['sample'] = len(rows)
+        return report
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest scores, sorted descending, via argpartition.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        rows = np.argpartition(-scores, k - 1)[:k]
+    else:
+        rows = np.arange(len(scores))
+    return rows[np.argsort(-scores[rows], kind='stable')]
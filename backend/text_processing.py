@@ -0,0 +1,25 @@
+"""
+Text preprocessing shared by the BM25 query path (app.py) and the offline
+BM25 jobs, so both tokenize overviews identically.
+"""
+
+import string
+
+import nltk
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+
+# --- NLTK VE METİN İŞLEME ---
+try:
+    stopwords.words('english')
+except LookupError:
+    nltk.download('stopwords')
+    nltk.download('punkt')
+
+
+def preprocess_text(text):
+    if not text: return []
+    stop_words = set(stopwords.words('english'))
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    word_tokens = word_tokenize(text.lower())
+    return [w for w in word_tokens if not w in stop_words]
@@ -0,0 +1,198 @@
+"""
+In-memory n-gram index over media titles for the /search autocomplete.
+
+Titles are case-folded and every distinct bigram and trigram is mapped to
+the sorted list of catalog positions containing it. Catalog positions are
+popularity ranks (position 0 = most popular), so posting lists are already
+in result order.
+
+A query q (len >= 2) is answered by:
+
+1. walking the posting list of the rarest n-gram of q (n = 3, or 2 for
+   two-character queries) in chunks, filtered by the next rarest lists
+2. keeping candidates whose folded title really contains q, in popularity
+   order, until `limit` hits
+
+Prefix queries are substring queries anchored at 0 and use the same path.
+Display fields are kept in packed arrays so a search never touches the
+database.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_store import PackedTexts
+
+logger = logging.getLogger(__name__)
+
+GRAM_SIZES = (2, 3)
+# Candidates are taken from the rarest n-gram and filtered by at most this
+# many further lists; the substring check settles the rest.
+NARROW_LISTS = 2
+VERIFY_CHUNK = 256
+
+
+def fold(text: Optional[str]) -> str:
+    """Case folding applied to titles and queries (ILIKE semantics)."""
+    return (text or '').lower()
+
+
+def _grams(text: str, n: int) -> Iterable[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class _Postings:
+    """CSR posting lists of one n-gram size."""
+
+    def __init__(self, grams: Dict[str, List[int]]):
+        terms = sorted(grams)
+        self.vocabulary = np.array(terms, dtype=str) if terms else np.zeros(0, dtype='<U1')
+        self.indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(grams[term]) for term in terms])
+        self.positions = (np.concatenate([np.asarray(grams[term], dtype=np.int32) for term in terms])
+                          if terms else np.zeros(0, dtype=np.int32))
+
+    def get(self, gram: str) -> np.ndarray:
+        pos = int(np.searchsorted(self.vocabulary, gram))
+        if pos < len(self.vocabulary) and self.vocabulary[pos] == gram:
+            return self.positions[self.indptr[pos]:self.indptr[pos + 1]]
+        return self.positions[:0]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vocabulary.nbytes + self.indptr.nbytes + self.positions.nbytes)
+
+
+class TitleIndex:
+    """
+    Substring / prefix search over titles, ranked by popularity.
+    """
+
+    def __init__(self, item_ids: np.ndarray, titles: PackedTexts, folded: PackedTexts,
+                 posters: PackedTexts, has_poster: np.ndarray, years: np.ndarray,
+                 source_codes: np.ndarray, source_labels: List[Optional[str]],
+                 postings: Dict[int, _Postings]):
+        self.item_ids = item_ids
+        self.titles = titles
+        self.folded = folded
+        self.posters = posters
+        self.has_poster = has_poster
+        self.years = years
+        self.source_codes = source_codes
+        self.source_labels = source_labels
+        self.postings = postings
+        # Slicing a bytes object is several times cheaper than a NumPy blob
+        # view, and the lookup loops below run per candidate.
+        self._folded_bytes = folded.blob.tobytes()
+        self._title_bytes = titles.blob.tobytes()
+        self._poster_bytes = posters.blob.tobytes()
+
+    @classmethod
+    def build(cls, rows: Sequence[Tuple]) -> 'TitleIndex':
+        """
+        Build from catalog rows.
+
+        Args:
+            rows: (id, title, poster_path, year, source_type) tuples ordered
+                by popularity, most popular first
+
+        Returns:
+            TitleIndex
+        """
+        grams = {n: {} for n in GRAM_SIZES}
+        folded_titles = []
+        source_labels, source_lookup = [], {}
+        source_codes = np.zeros(len(rows), dtype=np.uint8)
+        for position, (_, title, _, _, source_type) in enumerate(rows):
+            folded = fold(title)
+            folded_titles.append(folded)
+            for n in GRAM_SIZES:
+                for gram in _grams(folded, n):
+                    grams[n].setdefault(gram, []).append(position)
+            if source_type not in source_lookup:
+                source_lookup[source_type] = len(source_labels)
+                source_labels.append(source_type)
+            source_codes[position] = source_lookup[source_type]
+
+        return cls(
+            item_ids=np.array([row[0] for row in rows], dtype=np.int64),
+            titles=PackedTexts.from_strings(row[1] for row in rows),
+            folded=PackedTexts.from_strings(folded_titles),
+            posters=PackedTexts.from_strings(row[2] for row in rows),
+            has_poster=np.array([row[2] is not None for row in rows], dtype=bool),
+            years=np.array([row[3] if row[3] is not None else -1 for row in rows], dtype=np.int32),
+            source_codes=source_codes,
+            source_labels=source_labels,
+            postings={n: _Postings(grams[n]) for n in GRAM_SIZES},
+        )
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def nbytes(self) -> int:
+        packed = 2 * sum(texts.offsets.nbytes + texts.blob.nbytes
+                         for texts in (self.titles, self.folded, self.posters))
+        return int(packed + self.item_ids.nbytes + self.has_poster.nbytes + self.years.nbytes +
+                   self.source_codes.nbytes + sum(p.nbytes for p in self.postings.values()))
+
+    def _posting_lists(self, query: str) -> List[np.ndarray]:
+        """Posting lists of the query's n-grams, rarest first."""
+        n = 3 if len(query) >= 3 else 2
+        return sorted((self.postings[n].get(gram) for gram in _grams(query, n)), key=len)
+
+    def search_positions(self, query: str, limit: int = 100, prefix: bool = False) -> List[int]:
+        """
+        Catalog positions of matching titles in popularity order.
+
+        Args:
+            query: Search text (at least 2 characters)
+            limit: Maximum number of hits
+            prefix: Only match titles starting with the query
+        """
+        query = fold(query)
+        if len(query) < min(GRAM_SIZES):
+            return []
+        # UTF-8 substring/prefix tests on bytes match the str tests exactly.
+        needle = query.encode('utf-8')
+        blob, offsets = self._folded_bytes, self.folded.offsets
+        lists = self._posting_lists(query)
+        candidates, filters = lists[0], lists[1:1 + NARROW_LISTS]
+        hits = []
+        # The rarest list is walked in chunks, each narrowed by the next
+        # rarest lists, so work stops as soon as `limit` hits are found.
+        for start in range(0, len(candidates), VERIFY_CHUNK):
+            chunk = candidates[start:start + VERIFY_CHUNK]
+            for posting in filters:
+                # Both lists are sorted: membership via binary search.
+                idx = np.minimum(np.searchsorted(posting, chunk), len(posting) - 1)
+                chunk = chunk[posting[idx] == chunk]
+            bounds = zip(chunk.tolist(), offsets[chunk].tolist(), offsets[chunk + 1].tolist())
+            for position, begin, end in bounds:
+                title = blob[begin:end]
+                if title.startswith(needle) if prefix else needle in title:
+                    hits.append(position)
+                    if len(hits) >= limit:
+                        return hits
+        return hits
+
+    def row(self, position: int) -> Dict:
+        """Result row in the /search response shape."""
+        year = int(self.years[position])
+        title_offsets, poster_offsets = self.titles.offsets, self.posters.offsets
+        poster = None
+        if self.has_poster[position]:
+            poster = self._poster_bytes[poster_offsets[position]:poster_offsets[position + 1]].decode('utf-8')
+        return {
+            'id': int(self.item_ids[position]),
+            'title': self._title_bytes[title_offsets[position]:title_offsets[position + 1]].decode('utf-8'),
+            'poster_path': poster,
+            'year': year if year >= 0 else None,
+            'source_type': self.source_labels[self.source_codes[position]],
+        }
+
+    def search(self, query: str, limit: int = 100, prefix: bool = False) -> List[Dict]:
+        """Matching rows ({id, title, poster_path, year, source_type}), most popular first."""
+        return [self.row(position) for position in self.search_positions(query, limit, prefix)]
@@ -3,33 +3,243 @@ Vector Database Operations for PostgreSQL with pgvector
 Handles multi-vector storage, indexing, and similarity search
 """
 
+import csv
+import io
 import logging
-from typing import Dict, List, Tuple, Optional
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Tuple, Optional
 import numpy as np
 import psycopg2
 from psycopg2.extras import execute_values
 import json
 from pgvector.psycopg2 import register_vector
 from keyword_similarity import weighted_jaccard_similarity, normalize_keywords
+from keyword_matrix import KeywordMatrix
+from keyword_lsh import KeywordLSH
 
 logger = logging.getLogger(__name__)
 
+SEARCH_MODES = ('exact', 'ann')
+# pgvector's default is 40; candidate lists for keyword reranking are longer
+DEFAULT_EF_SEARCH = 100
+
+# Hot queries, run as server-side prepared statements. Every parameter
+# appears exactly once (query vectors through the `q` CTE), so each vector
+# is sent and parsed once and each distance is computed once per row.
+STATEMENTS = {
+    'vdb_search_exact': """
+        WITH q AS (SELECT $1::vector AS analytical, $2::vector AS plot)
+        SELECT id, title, overview, genres, sim_analytical, sim_plot, keywords_json
+        FROM (
+            SELECT 
+                m.id,
+                m.title,
+                m.overview,
+                m.genres,
+                1 - (m.embedding_analytical <=> q.analytical) AS sim_analytical,
+                1 - (m.embedding_plot <=> q.plot) AS sim_plot,
+                m.keywords_json
+            FROM media_items m, q
+            WHERE 
+                m.embedding_analytical IS NOT NULL AND
+                m.embedding_plot IS NOT NULL
+        ) scored
+        ORDER BY $3::float8 * sim_analytical + $4::float8 * sim_plot DESC
+        LIMIT $5::int
+    """,
+    'vdb_candidate_rows': """
+        WITH q AS (SELECT $1::vector AS analytical, $2::vector AS plot)
+        SELECT 
+            m.id,
+            m.title,
+            m.overview,
+            m.genres,
+            1 - (m.embedding_analytical <=> q.analytical) AS sim_analytical,
+            1 - (m.embedding_plot <=> q.plot) AS sim_plot,
+            m.keywords_json
+        FROM media_items m, q
+        WHERE 
+            m.id = ANY($3::int[]) AND
+            m.embedding_analytical IS NOT NULL AND
+            m.embedding_plot IS NOT NULL
+    """,
+    'vdb_ann_analytical': """
+        SELECT id
+        FROM media_items
+        WHERE embedding_analytical IS NOT NULL AND embedding_plot IS NOT NULL
+        ORDER BY embedding_analytical <=> $1::vector
+        LIMIT $2::int
+    """,
+    'vdb_ann_plot': """
+        SELECT id
+        FROM media_items
+        WHERE embedding_analytical IS NOT NULL AND embedding_plot IS NOT NULL
+        ORDER BY embedding_plot <=> $1::vector
+        LIMIT $2::int
+    """,
+    # Batched variants: one row per query in `q`, numbered by `ord` (1-based),
+    # with a LATERAL top-k subquery per query.
+    'vdb_search_exact_batch': """
+        WITH q AS (
+            SELECT ord, analytical, plot
+            FROM unnest($1::vector[], $2::vector[]) WITH ORDINALITY AS q(analytical, plot, ord)
+        )
+        SELECT q.ord, c.id, c.title, c.overview, c.genres, c.sim_analytical, c.sim_plot, c.keywords_json
+        FROM q
+        CROSS JOIN LATERAL (
+            SELECT id, title, overview, genres, sim_analytical, sim_plot, keywords_json
+            FROM (
+                SELECT 
+                    m.id,
+                    m.title,
+                    m.overview,
+                    m.genres,
+                    1 - (m.embedding_analytical <=> q.analytical) AS sim_analytical,
+                    1 - (m.embedding_plot <=> q.plot) AS sim_plot,
+                    m.keywords_json
+                FROM media_items m
+                WHERE 
+                    m.embedding_analytical IS NOT NULL AND
+                    m.embedding_plot IS NOT NULL
+            ) scored
+            ORDER BY $3::float8 * sim_analytical + $4::float8 * sim_plot DESC
+            LIMIT $5::int
+        ) c
+    """,
+    'vdb_candidate_rows_batch': """
+        WITH q AS (
+            SELECT ord, analytical, plot
+            FROM unnest($1::vector[], $2::vector[]) WITH ORDINALITY AS q(analytical, plot, ord)
+        ),
+        c AS (
+            SELECT ord, id FROM unnest($3::bigint[], $4::int[]) AS c(ord, id)
+        )
+        SELECT 
+            c.ord,
+            m.id,
+            m.title,
+            m.overview,
+            m.genres,
+            1 - (m.embedding_analytical <=> q.analytical) AS sim_analytical,
+            1 - (m.embedding_plot <=> q.plot) AS sim_plot,
+            m.keywords_json
+        FROM c
+        JOIN q ON q.ord = c.ord
+        JOIN media_items m ON m.id = c.id
+        WHERE 
+            m.embedding_analytical IS NOT NULL AND
+            m.embedding_plot IS NOT NULL
+    """,
+    'vdb_ann_batch': """
+        WITH q AS (
+            SELECT ord, analytical, plot
+            FROM unnest($1::vector[], $2::vector[]) WITH ORDINALITY AS q(analytical, plot, ord)
+        )
+        SELECT q.ord, a.id
+        FROM q
+        CROSS JOIN LATERAL (
+            SELECT id
+            FROM media_items
+            WHERE embedding_analytical IS NOT NULL AND embedding_plot IS NOT NULL
+            ORDER BY embedding_analytical <=> q.analytical
+            LIMIT $3::int
+        ) a
+        UNION
+        SELECT q.ord, p.id
+        FROM q
+        CROSS JOIN LATERAL (
+            SELECT id
+            FROM media_items
+            WHERE embedding_analytical IS NOT NULL AND embedding_plot IS NOT NULL
+            ORDER BY embedding_plot <=> q.plot
+            LIMIT $4::int
+        ) p
+    """,
+}
+
+_PLACEHOLDER = re.compile(r'\$\d+')
+
+# Unlogged table a bulk rebuild of similar_items is copied into before the swap
+SIMILARITY_STAGING_TABLE = 'similar_items_staging'
+# Rows per COPY round (each round is one commit)
+COPY_CHUNK_ROWS = 50000
+
+# Table layout of the pre-calculated similarities: one similar_items row per
+# pair, or one similar_item_lists row per source show
+SIMILARITY_STORAGES = ('pairs', 'lists')
+DEFAULT_SIMILARITY_STORAGE = os.getenv('SIMILARITY_STORAGE', 'pairs')
+
+# Statements prepared on each connection: id(conn) -> (backend pid, names).
+# Prepared statements live as long as the session, and pooled connections
+# outlive VectorDB instances.
+_prepared_statements: Dict[int, Tuple[int, set]] = {}
+
+
+def plain_statement(name: str) -> str:
+    """One of STATEMENTS with psycopg2 placeholders, for unprepared execution."""
+    return _PLACEHOLDER.sub('%s', STATEMENTS[name])
+
+
+def as_vector(value) -> np.ndarray:
+    """
+    Query/insert vector as a float32 NumPy array, which pgvector's adapter
+    sends as a single '[...]' literal (parsed once by vector_in) instead of
+    an ARRAY[...] of 1024 numeric constants.
+    """
+    return np.asarray(value, dtype=np.float32)
+
+
+def vector_array(values) -> str:
+    """
+    Several vectors as one vector[] array literal ('{"[...]","[...]"}').
+    
+    Nine significant digits round-trip float32 exactly.
+    """
+    return '{' + ','.join(
+        '"[' + ','.join(map('{:.9g}'.format, as_vector(value).tolist())) + ']"' for value in values
+    ) + '}'
+
 
 class VectorDB:
     """
     PostgreSQL + pgvector operations for multi-vector TV show storage.
     """
     
-    def __init__(self, connection_string: str):
+    def __init__(self, connection_string: Optional[str] = None, conn=None,
+                 keyword_matrix: Optional[KeywordMatrix] = None, prepare_statements: bool = True,
+                 similarity_storage: Optional[str] = None):
         """
         Initialize database connection.
         
         Args:
             connection_string: PostgreSQL connection string
+            conn: Existing connection to use instead (e.g. borrowed from
+                db_pool, with pgvector already registered). It is not
+                closed by close().
+            keyword_matrix: Compiled catalog keywords used for the keyword
+                rerank (see load_keyword_matrix())
+            prepare_statements: Run the search queries as server-side
+                prepared statements (False: plain parameterized queries)
+            similarity_storage: Table the pre-calculated similarities are
+                read from and incrementally merged into, 'pairs' or 'lists'
+                (default: SIMILARITY_STORAGE environment variable, else 'pairs')
         """
+        similarity_storage = similarity_storage or DEFAULT_SIMILARITY_STORAGE
+        if similarity_storage not in SIMILARITY_STORAGES:
+            raise ValueError(f"similarity_storage must be one of {SIMILARITY_STORAGES}")
         self.connection_string = connection_string
-        self.conn = None
-        self._connect()
+        self.prepare_statements = prepare_statements
+        self.similarity_storage = similarity_storage
+        self.conn = conn
+        self.keyword_matrix = keyword_matrix
+        self.keyword_lsh = None
+        self.owns_connection = conn is None
+        if self.owns_connection:
+            if not connection_string:
+                raise ValueError("Either connection_string or conn is required")
+            self._connect()
     
     def _connect(self):
         """Establish database connection and register vector type."""
@@ -110,8 +320,8 @@ class VectorDB:
                     embedding_plot = %s
                 WHERE id = %s
             """, (
-                embeddings['analytical'].tolist(),
-                embeddings['plot'].tolist(),
+                as_vector(embeddings['analytical']),
+                as_vector(embeddings['plot']),
                 show_id
             ))
         
@@ -128,8 +338,8 @@ class VectorDB:
             # Prepare data for batch update
             update_data = [
                 (
-                    embeds['analytical'].tolist(),
-                    embeds['plot'].tolist(),
+                    as_vector(embeds['analytical']),
+                    as_vector(embeds['plot']),
                     show_id
                 )
                 for show_id, embeds in data
@@ -192,13 +402,73 @@ class VectorDB:
         self.conn.commit()
         logger.info(f"Batch inserted keywords for {len(data)} shows")
     
+    def _execute(self, cur, name: str, params: Tuple):
+        """
+        Run one of STATEMENTS, as a prepared statement unless disabled.
+        
+        Statements are prepared lazily, once per connection; the first use
+        on a connection reads pg_prepared_statements so a pooled connection
+        reused by a new VectorDB does not prepare them twice.
+        """
+        if not self.prepare_statements:
+            cur.execute(plain_statement(name), params)
+            return
+        
+        key, pid = id(self.conn), self.conn.get_backend_pid()
+        entry = _prepared_statements.get(key)
+        if entry is None or entry[0] != pid:
+            cur.execute("SELECT name FROM pg_prepared_statements")
+            entry = _prepared_statements[key] = (pid, {row[0] for row in cur.fetchall()})
+        if name not in entry[1]:
+            cur.execute(f"PREPARE {name} AS {STATEMENTS[name]}")
+            entry[1].add(name)
+        
+        placeholders = ', '.join(['%s'] * len(params))
+        try:
+            cur.execute(f"EXECUTE {name} ({placeholders})", params)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Session state was lost; prepare again on the next call.
+            _prepared_statements.pop(key, None)
+            raise
+    
+    def load_keyword_matrix(self) -> KeywordMatrix:
+        """
+        Compile the keywords_json of every show into a KeywordMatrix and use
+        it for the keyword rerank of this instance. Worth it for jobs that
+        run many searches (calculate_similarities, optimize_weights).
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT id, keywords_json FROM media_items WHERE keywords_json IS NOT NULL")
+            self.keyword_matrix = KeywordMatrix.build(cur.fetchall())
+        logger.info(f"Keyword matrix compiled: {len(self.keyword_matrix)} shows, "
+                    f"{len(self.keyword_matrix.vocabulary)} terms")
+        return self.keyword_matrix
+    
+    def load_keyword_lsh(self, **kwargs) -> KeywordLSH:
+        """
+        Build a MinHash LSH index over the compiled keywords (compiling them
+        first if needed). search_multi_vector then adds its keyword
+        candidates to the vector candidates before reranking.
+        
+        Args:
+            **kwargs: num_perm / bands for KeywordLSH.build
+        """
+        if self.keyword_matrix is None:
+            self.load_keyword_matrix()
+        self.keyword_lsh = KeywordLSH.build(self.keyword_matrix, **kwargs)
+        return self.keyword_lsh
+    
     def search_multi_vector(
         self, 
         query_vectors: Dict[str, np.ndarray] = None,
         query_keywords: Dict[str, List[str]] = None,
         weights: Dict[str, float] = None,
         limit: int = 10,
-        min_score: float = 0.0
+        min_score: float = 0.0,
+        mode: str = 'exact',
+        ef_search: Optional[int] = None,
+        ann_candidates: Optional[int] = None,
+        keyword_candidates: Optional[int] = None
     ) -> List[Dict]:
         """
         Hybrid multi-vector weighted similarity search.
@@ -207,108 +477,340 @@ class VectorDB:
         - Vector embeddings for analytical and plot (cosine similarity)
         - Weighted Jaccard for keywords (set-based matching)
         
+        Retrieval modes:
+        - 'exact': orders every row by the weighted vector score (no index
+          can serve the weighted sum, so this is a full scan)
+        - 'ann': one HNSW-backed `ORDER BY col <=> q LIMIT k` query per
+          vector column, then the union of the candidates is reranked with
+          the exact weighted score
+        
+        With a keyword LSH index (load_keyword_lsh()), shows with similar
+        keywords are added to the vector candidates before the final rerank,
+        so strong keyword matches with weaker embeddings can surface.
+        
         Args:
             query_vectors: Dict with 'analytical', 'plot' query vectors (embeddings)
             query_keywords: Dict with categorized keywords for Weighted Jaccard
             weights: Weight for each component (default: mixed profile)
             limit: Number of results to return
             min_score: Minimum similarity score threshold
+            mode: 'exact' or 'ann'
+            ef_search: hnsw.ef_search for the ANN queries (default:
+                DEFAULT_EF_SEARCH, raised to the per-column candidate count)
+            ann_candidates: Candidates per column in ANN mode (default: the
+                number of candidates reranked with keywords)
+            keyword_candidates: Candidates from the keyword LSH index
+                (default: same as the vector candidates)
             
         Returns:
             List of dicts with show data and similarity scores
         """
         if weights is None:
             weights = {'analytical': 0.40, 'plot': 0.25, 'keywords': 0.35}
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode} (expected one of {SEARCH_MODES})")
         
         # Normalize query keywords if provided
         if query_keywords:
             query_keywords = normalize_keywords(query_keywords)
         
+        if not (query_vectors and 'analytical' in query_vectors and 'plot' in query_vectors):
+            # Fallback: old behavior if no vectors provided
+            return []
+        
+        # Get more candidates than needed since we'll re-rank with keywords
+        candidate_limit = min(limit * 5, 500)  # Get 5x candidates for re-ranking
+        
         with self.conn.cursor() as cur:
-            # Fetch candidates using vector similarity for analytical + plot
-            # We'll calculate keyword similarity in Python using Weighted Jaccard
-            
-            # Get more candidates than needed since we'll re-rank with keywords
-            candidate_limit = min(limit * 5, 500)  # Get 5x candidates for re-ranking
-            
-            if query_vectors and 'analytical' in query_vectors and 'plot' in query_vectors:
+            if mode == 'ann':
+                candidate_ids = self._ann_candidate_ids(
+                    cur, query_vectors, ann_candidates or candidate_limit, ef_search
+                )
+                # Exact weighted vector score of the union, best candidate_limit kept
+                rows = sorted(
+                    self._fetch_candidate_rows(cur, query_vectors, candidate_ids),
+                    key=lambda row: weights['analytical'] * row[4] + weights['plot'] * row[5],
+                    reverse=True
+                )[:candidate_limit]
+            else:
                 # SQL query: vector search for analytical + plot only
-                cur.execute("""
-                    SELECT 
-                        id,
-                        title,
-                        overview,
-                        genres,
-                        (1 - (embedding_analytical <=> %s::vector)) as sim_analytical,
-                        (1 - (embedding_plot <=> %s::vector)) as sim_plot,
-                        keywords_json
-                    FROM media_items
-                    WHERE 
-                        embedding_analytical IS NOT NULL AND
-                        embedding_plot IS NOT NULL
-                    ORDER BY (
-                        %s * (1 - (embedding_analytical <=> %s::vector)) +
-                        %s * (1 - (embedding_plot <=> %s::vector))
-                    ) DESC
-                    LIMIT %s
-                """, (
-                    query_vectors['analytical'].tolist(),
-                    query_vectors['plot'].tolist(),
-                    weights['analytical'],
-                    query_vectors['analytical'].tolist(),
-                    weights['plot'],
-                    query_vectors['plot'].tolist(),
+                self._execute(cur, 'vdb_search_exact', (
+                    as_vector(query_vectors['analytical']),
+                    as_vector(query_vectors['plot']),
+                    float(weights['analytical']),
+                    float(weights['plot']),
                     candidate_limit
                 ))
+                rows = cur.fetchall()
             
-                results = []
+            if query_keywords and self.keyword_lsh is not None:
+                # Third candidate source: shows with similar keywords
+                seen = {row[0] for row in rows}
+                keyword_ids = [
+                    show_id for show_id in self.keyword_lsh.candidates(
+                        query_keywords, keyword_candidates or candidate_limit
+                    )
+                    if show_id not in seen
+                ]
+                if keyword_ids:
+                    rows = list(rows) + self._fetch_candidate_rows(cur, query_vectors, keyword_ids)
+        
+        # We'll calculate keyword similarity in Python using Weighted Jaccard
+        return self._rerank_with_keywords(rows, query_keywords, weights, limit, min_score)
+    
+    def search_multi_vector_batch(
+        self,
+        queries: List[Dict],
+        weights: Dict[str, float] = None,
+        limit: int = 10,
+        min_score: float = 0.0,
+        mode: str = 'exact',
+        ef_search: Optional[int] = None,
+        ann_candidates: Optional[int] = None,
+        keyword_candidates: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """
+        search_multi_vector for several queries in a single round trip.
+        
+        All query vectors are sent as two vector[] parameters; the statement
+        unnests them and runs the top-k candidate query of every query as a
+        LATERAL subquery, so the whole batch costs one statement (plus one
+        candidate-row fetch for ANN and keyword LSH candidates). The keyword
+        rerank of all candidates is then computed in one KeywordMatrix call.
+        
+        Args:
+            queries: Dicts with 'query_vectors' and optional 'query_keywords',
+                as passed to search_multi_vector
+            weights, limit, min_score, mode, ef_search, ann_candidates,
+            keyword_candidates: As in search_multi_vector, shared by all queries
+        
+        Returns:
+            One result list per query, in order (empty for queries without
+            both vectors)
+        """
+        if weights is None:
+            weights = {'analytical': 0.40, 'plot': 0.25, 'keywords': 0.35}
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode} (expected one of {SEARCH_MODES})")
+        
+        results = [[] for _ in queries]
+        active = [
+            position for position, query in enumerate(queries)
+            if query.get('query_vectors') and 'analytical' in query['query_vectors']
+            and 'plot' in query['query_vectors']
+        ]
+        if not active:
+            return results
+        
+        keyword_list = [
+            normalize_keywords(queries[position]['query_keywords'])
+            if queries[position].get('query_keywords') else None
+            for position in active
+        ]
+        analytical = vector_array(queries[position]['query_vectors']['analytical'] for position in active)
+        plot = vector_array(queries[position]['query_vectors']['plot'] for position in active)
+        candidate_limit = min(limit * 5, 500)
+        # Candidate rows of each active query (ord - 1 indexes this list)
+        grouped = [[] for _ in active]
+        
+        with self.conn.cursor() as cur:
+            if mode == 'ann':
+                k = ann_candidates or candidate_limit
+                cur.execute("SELECT set_config('hnsw.ef_search', %s, true)",
+                            (str(max(ef_search or DEFAULT_EF_SEARCH, k)),))
+                self._execute(cur, 'vdb_ann_batch', (analytical, plot, k, k))
+                pairs = cur.fetchall()
+                for row in self._fetch_candidate_rows_batch(cur, analytical, plot, pairs):
+                    grouped[row[0] - 1].append(row[1:])
+                # Exact weighted vector score of each union, best candidate_limit kept
+                grouped = [
+                    sorted(rows, key=lambda row: weights['analytical'] * row[4] + weights['plot'] * row[5],
+                           reverse=True)[:candidate_limit]
+                    for rows in grouped
+                ]
+            else:
+                self._execute(cur, 'vdb_search_exact_batch', (
+                    analytical,
+                    plot,
+                    float(weights['analytical']),
+                    float(weights['plot']),
+                    candidate_limit
+                ))
                 for row in cur.fetchall():
-                    show_id = row[0]
-                    title = row[1]
-                    overview = row[2]
-                    genres = row[3]
-                    sim_analytical = float(row[4])
-                    sim_plot = float(row[5])
-                    keywords_json = row[6]
-                    
-                    # Calculate keyword similarity using Weighted Jaccard
-                    sim_keywords = 0.0
-                    if query_keywords and keywords_json:
-                        try:
-                            show_keywords = json.loads(keywords_json) if isinstance(keywords_json, str) else keywords_json
-                            sim_keywords = weighted_jaccard_similarity(query_keywords, show_keywords)
-                        except (json.JSONDecodeError, TypeError) as e:
-                            logger.warning(f"Error parsing keywords for show {show_id}: {e}")
-                            sim_keywords = 0.0
-                    
-                    # Calculate final weighted score
-                    final_score = (
-                        weights['analytical'] * sim_analytical +
-                        weights['plot'] * sim_plot +
-                        weights['keywords'] * sim_keywords
+                    grouped[row[0] - 1].append(row[1:])
+            
+            if self.keyword_lsh is not None and any(keyword_list):
+                # Third candidate source: shows with similar keywords
+                pairs = []
+                for index, keywords in enumerate(keyword_list):
+                    if not keywords:
+                        continue
+                    seen = {row[0] for row in grouped[index]}
+                    pairs.extend(
+                        (index + 1, show_id) for show_id in self.keyword_lsh.candidates(
+                            keywords, keyword_candidates or candidate_limit
+                        )
+                        if show_id not in seen
                     )
-                    
-                    if final_score >= min_score:
-                        results.append({
-                            'id': show_id,
-                            'title': title,
-                            'overview': overview,
-                            'genres': genres,
-                            'similarity_scores': {
-                                'analytical': sim_analytical,
-                                'plot': sim_plot,
-                                'keywords': sim_keywords
-                            },
-                            'final_score': final_score
-                        })
-                
-                # Sort by final score and return top K
-                results.sort(key=lambda x: x['final_score'], reverse=True)
-                return results[:limit]
+                for row in self._fetch_candidate_rows_batch(cur, analytical, plot, pairs):
+                    grouped[row[0] - 1].append(row[1:])
+        
+        keyword_scores = [None] * len(active)
+        if self.keyword_matrix is not None and any(keyword_list):
+            keyword_scores = self.keyword_matrix.similarity_by_id_batch(
+                keyword_list, [[row[0] for row in rows] for rows in grouped]
+            )
+        
+        for index, position in enumerate(active):
+            results[position] = self._rerank_with_keywords(
+                grouped[index], keyword_list[index], weights, limit, min_score, keyword_scores[index]
+            )
+        return results
+    
+    def _fetch_candidate_rows_batch(self, cur, analytical: str, plot: str,
+                                    pairs: List[Tuple[int, int]]) -> List[Tuple]:
+        """
+        Candidate rows of (ord, id) pairs for batched queries, each row
+        prefixed with the ord of its query.
+        
+        Args:
+            analytical, plot: vector_array() literals of the batch
+            pairs: (1-based query ord, show id) pairs
+        """
+        if not pairs:
+            return []
+        self._execute(cur, 'vdb_candidate_rows_batch', (
+            analytical,
+            plot,
+            [pair[0] for pair in pairs],
+            [pair[1] for pair in pairs]
+        ))
+        return cur.fetchall()
+    
+    def _fetch_candidate_rows(self, cur, query_vectors: Dict[str, np.ndarray], ids: List[int]) -> List[Tuple]:
+        """Candidate rows (same columns as the exact query) of the given ids."""
+        self._execute(cur, 'vdb_candidate_rows', (
+            as_vector(query_vectors['analytical']),
+            as_vector(query_vectors['plot']),
+            list(ids)
+        ))
+        return cur.fetchall()
+    
+    def _ann_candidate_ids(self, cur, query_vectors: Dict[str, np.ndarray],
+                           k: int, ef_search: Optional[int] = None) -> List[int]:
+        """
+        Union of the per-column HNSW top-k ids.
+        
+        hnsw.ef_search is set for the current transaction only; an HNSW scan
+        returns at most ef_search rows, so it is never set below k.
+        """
+        ef_search = max(ef_search or DEFAULT_EF_SEARCH, k)
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(ef_search),))
+        
+        candidate_ids = {}
+        for key in ('analytical', 'plot'):
+            self._execute(cur, f"vdb_ann_{key}", (as_vector(query_vectors[key]), k))
+            candidate_ids.update((row[0], None) for row in cur.fetchall())
+        return list(candidate_ids)
+    
+    def _rerank_with_keywords(self, rows, query_keywords: Optional[Dict[str, List[str]]],
+                              weights: Dict[str, float], limit: int, min_score: float,
+                              keyword_scores: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> List[Dict]:
+        """
+        Final weighted score (vector similarities + Weighted Jaccard) of
+        candidate rows (id, title, overview, genres, sim_analytical, sim_plot,
+        keywords_json), best `limit` first.
+        
+        With a keyword matrix, Weighted Jaccard of all compiled candidates is
+        computed in one vectorized call; candidates missing from the matrix
+        (e.g. keywords added after it was compiled) use the per-row path.
+        keyword_scores passes that (scores, found) pair in when the caller
+        already computed it for several queries at once.
+        """
+        matrix_scores, in_matrix = keyword_scores if keyword_scores is not None else (None, None)
+        if matrix_scores is None and query_keywords and self.keyword_matrix is not None and rows:
+            matrix_scores, in_matrix = self.keyword_matrix.similarity_by_id(
+                query_keywords, [row[0] for row in rows]
+            )
+        
+        results = []
+        for position, row in enumerate(rows):
+            show_id = row[0]
+            title = row[1]
+            overview = row[2]
+            genres = row[3]
+            sim_analytical = float(row[4])
+            sim_plot = float(row[5])
+            keywords_json = row[6]
             
-            else:
-                # Fallback: old behavior if no vectors provided
-                return []
+            # Calculate keyword similarity using Weighted Jaccard
+            sim_keywords = 0.0
+            if matrix_scores is not None and in_matrix[position]:
+                sim_keywords = float(matrix_scores[position])
+            elif query_keywords and keywords_json:
+                try:
+                    show_keywords = json.loads(keywords_json) if isinstance(keywords_json, str) else keywords_json
+                    sim_keywords = weighted_jaccard_similarity(query_keywords, show_keywords)
+                except (json.JSONDecodeError, TypeError) as e:
+                    logger.warning(f"Error parsing keywords for show {show_id}: {e}")
+                    sim_keywords = 0.0
+            
+            # Calculate final weighted score
+            final_score = (
+                weights['analytical'] * sim_analytical +
+                weights['plot'] * sim_plot +
+                weights['keywords'] * sim_keywords
+            )
+            
+            if final_score >= min_score:
+                results.append({
+                    'id': show_id,
+                    'title': title,
+                    'overview': overview,
+                    'genres': genres,
+                    'similarity_scores': {
+                        'analytical': sim_analytical,
+                        'plot': sim_plot,
+                        'keywords': sim_keywords
+                    },
+                    'final_score': final_score
+                })
+        
+        # Sort by final score and return top K
+        results.sort(key=lambda x: x['final_score'], reverse=True)
+        return results[:limit]
+    
+    def ann_recall(
+        self,
+        query_vectors: Dict[str, np.ndarray],
+        query_keywords: Dict[str, List[str]] = None,
+        weights: Dict[str, float] = None,
+        limit: int = 10,
+        ef_search: Optional[int] = None,
+        ann_candidates: Optional[int] = None
+    ) -> Dict:
+        """
+        Compare the ANN mode with the exact path for one query.
+        
+        Returns:
+            Dict with recall@limit of the ANN results and both latencies (ms)
+        """
+        start = time.perf_counter()
+        exact = self.search_multi_vector(query_vectors, query_keywords, weights, limit)
+        exact_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        ann = self.search_multi_vector(query_vectors, query_keywords, weights, limit,
+                                       mode='ann', ef_search=ef_search, ann_candidates=ann_candidates)
+        ann_ms = (time.perf_counter() - start) * 1000
+        
+        exact_ids = {result['id'] for result in exact}
+        found = len(exact_ids & {result['id'] for result in ann})
+        return {
+            'recall': found / len(exact_ids) if exact_ids else 1.0,
+            'exact_ms': exact_ms,
+            'ann_ms': ann_ms
+        }
     
     def get_embedding_stats(self) -> Dict:
         """
@@ -342,10 +844,11 @@ class VectorDB:
             }
     
     def close(self):
-        """Close database connection."""
-        if self.conn:
+        """Close database connection (borrowed connections are only released)."""
+        if self.conn and self.owns_connection:
             self.conn.close()
             logger.info("Database connection closed")
+        self.conn = None
 
 
     def save_similarities(self, source_id: int, similarities: List[Dict]):
@@ -387,9 +890,351 @@ class VectorDB:
         
         self.conn.commit()
 
+    def save_similarity_lists(self, lists: List[Tuple[int, List[Dict]]]):
+        """
+        Save pre-calculated similarities in the compact similar_item_lists
+        table (one row per source show, arrays sorted by score).
+        
+        Every list replaces the stored one in a single row update, so
+        readers never see a partially written list.
+        
+        Args:
+            lists: (source_id, similarities) tuples; similarities as for
+                save_similarities
+        """
+        if not lists:
+            return
+        
+        with self.conn.cursor() as cur:
+            self._upsert_similarity_lists(cur, lists)
+        
+        self.conn.commit()
+    
+    def _upsert_similarity_lists(self, cur, lists: List[Tuple[int, List[Dict]]],
+                                 recomputed: bool = True):
+        """
+        Write lists into similar_item_lists without committing.
+        
+        Args:
+            cur: Open cursor
+            lists: (source_id, similarities) tuples
+            recomputed: The lists were computed in full, so a pending
+                needs_recompute mark is cleared (False for merges, which
+                keep it)
+        """
+        rows = []
+        for source_id, similarities in lists:
+            ordered = sorted(similarities, key=lambda item: item['final_score'], reverse=True)
+            rows.append((
+                source_id,
+                [item['id'] for item in ordered],
+                [float(item['final_score']) for item in ordered],
+                [float(item['similarity_scores']['analytical']) for item in ordered],
+                [float(item['similarity_scores']['plot']) for item in ordered],
+                [float(item['similarity_scores']['keywords']) for item in ordered]
+            ))
+        needs_recompute = 'false' if recomputed else 'similar_item_lists.needs_recompute'
+        
+        execute_values(
+            cur,
+            f"""
+            INSERT INTO similar_item_lists (source_id, target_ids, scores, analytical, plot, keywords)
+            VALUES %s
+            ON CONFLICT (source_id) DO UPDATE 
+            SET 
+                target_ids = EXCLUDED.target_ids,
+                scores = EXCLUDED.scores,
+                analytical = EXCLUDED.analytical,
+                plot = EXCLUDED.plot,
+                keywords = EXCLUDED.keywords,
+                needs_recompute = {needs_recompute},
+                created_at = CURRENT_TIMESTAMP
+            """,
+            rows,
+            template="(%s, %s::int[], %s::real[], %s::real[], %s::real[], %s::real[])"
+        )
+    
+    def create_similarity_staging(self):
+        """
+        (Re)create the unlogged staging table of a bulk similar_items rebuild.
+        
+        It has the columns of similar_items but no keys or indexes, so COPY
+        only appends heap pages and writes no WAL.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {SIMILARITY_STAGING_TABLE}")
+            cur.execute(f"""
+                CREATE UNLOGGED TABLE {SIMILARITY_STAGING_TABLE}
+                (LIKE similar_items INCLUDING DEFAULTS)
+            """)
+        self.conn.commit()
+        logger.info(f"Created staging table {SIMILARITY_STAGING_TABLE}")
+    
+    def get_staged_source_count(self) -> Optional[int]:
+        """Distinct sources in the staging table (None if it does not exist)."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s)", (SIMILARITY_STAGING_TABLE,))
+            if cur.fetchone()[0] is None:
+                return None
+            cur.execute(f"SELECT COUNT(DISTINCT source_id) FROM {SIMILARITY_STAGING_TABLE}")
+            return cur.fetchone()[0]
+    
+    def copy_similarities(self, entries: Iterable[Tuple[int, int, float, Dict]],
+                          chunk_rows: int = COPY_CHUNK_ROWS) -> int:
+        """
+        Stream neighbor entries into the staging table with COPY.
+        
+        Several connections may copy into the staging table at once (e.g.
+        the workers of calculate_similarities).
+        
+        Args:
+            entries: (source_id, target_id, final_score, similarity_scores) tuples
+            chunk_rows: Rows per COPY; every chunk is committed
+            
+        Returns:
+            Number of copied rows
+        """
+        copied = 0
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        pending = 0
+        
+        def flush():
+            buffer.seek(0)
+            with self.conn.cursor() as cur:
+                cur.copy_expert(
+                    f"COPY {SIMILARITY_STAGING_TABLE} (source_id, target_id, score, similarity_details) "
+                    f"FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+            self.conn.commit()
+            buffer.seek(0)
+            buffer.truncate()
+        
+        for source_id, target_id, score, details in entries:
+            writer.writerow((source_id, target_id, repr(float(score)), json.dumps(details)))
+            pending += 1
+            if pending == chunk_rows:
+                flush()
+                copied += pending
+                pending = 0
+        if pending:
+            flush()
+            copied += pending
+        return copied
+    
+    def swap_similarity_staging(self):
+        """
+        Make the staging table the new similar_items.
+        
+        The table is set LOGGED and gets the primary key, the
+        (source_id, score DESC) index and the foreign keys while readers
+        still use the old table; the swap itself is a drop and renames in
+        one transaction, so readers see either the old or the new lists.
+        """
+        staging = SIMILARITY_STAGING_TABLE
+        with self.conn.cursor() as cur:
+            # Rows of shows deleted during the run, and lists copied twice
+            # by a run that was interrupted between COPY and checkpoint
+            cur.execute(f"""
+                DELETE FROM {staging} s
+                WHERE NOT EXISTS (SELECT 1 FROM media_items m WHERE m.id = s.source_id)
+                   OR NOT EXISTS (SELECT 1 FROM media_items m WHERE m.id = s.target_id)
+            """)
+            cur.execute(f"""
+                DELETE FROM {staging} a
+                USING {staging} b
+                WHERE a.source_id = b.source_id AND a.target_id = b.target_id AND a.ctid < b.ctid
+            """)
+            cur.execute(f"ALTER TABLE {staging} SET LOGGED")
+            cur.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_pkey PRIMARY KEY (source_id, target_id)")
+            cur.execute(f"CREATE INDEX idx_{staging}_source_score ON {staging}(source_id, score DESC)")
+            for column in ('source_id', 'target_id'):
+                cur.execute(f"""
+                    ALTER TABLE {staging} ADD CONSTRAINT {staging}_{column}_fkey
+                    FOREIGN KEY ({column}) REFERENCES media_items(id) ON DELETE CASCADE
+                """)
+            cur.execute(f"ANALYZE {staging}")
+        self.conn.commit()
+        
+        with self.conn.cursor() as cur:
+            cur.execute("LOCK TABLE similar_items IN ACCESS EXCLUSIVE MODE")
+            cur.execute("DROP TABLE similar_items")
+            cur.execute(f"ALTER TABLE {staging} RENAME TO similar_items")
+            cur.execute(f"ALTER TABLE similar_items RENAME CONSTRAINT {staging}_pkey TO similar_items_pkey")
+            cur.execute(f"ALTER INDEX idx_{staging}_source_score RENAME TO idx_similar_items_source_score")
+            for column in ('source_id', 'target_id'):
+                cur.execute(
+                    f"ALTER TABLE similar_items RENAME CONSTRAINT {staging}_{column}_fkey "
+                    f"TO similar_items_{column}_fkey"
+                )
+        self.conn.commit()
+        logger.info("Swapped the rebuilt similar_items into place")
+    
+    def get_similarity_thresholds(self, top_k: int) -> Dict[int, float]:
+        """
+        Score a new target has to beat to enter each stored neighbor list.
+        
+        Ranks every list along idx_similar_items_source_score (source_id,
+        score DESC); with list storage it is the top_k-th array element.
+        
+        Args:
+            top_k: Length of a full list
+            
+        Returns:
+            source_id -> K-th best score (-inf for lists shorter than
+            top_k); sources without a stored list are absent
+        """
+        with self.conn.cursor() as cur:
+            if self.similarity_storage == 'lists':
+                cur.execute("""
+                    SELECT source_id, cardinality(scores), scores[%s]
+                    FROM similar_item_lists
+                """, (top_k,))
+                return {
+                    source_id: (kth_score if count >= top_k else float('-inf'))
+                    for source_id, count, kth_score in cur.fetchall()
+                }
+            
+            cur.execute("""
+                SELECT source_id, COUNT(*), MIN(score) FILTER (WHERE rank <= %s)
+                FROM (
+                    SELECT 
+                        source_id,
+                        score,
+                        row_number() OVER (PARTITION BY source_id ORDER BY score DESC) AS rank
+                    FROM similar_items
+                ) ranked
+                GROUP BY source_id
+            """, (top_k,))
+            return {
+                source_id: (kth_score if count >= top_k else float('-inf'))
+                for source_id, count, kth_score in cur.fetchall()
+            }
+    
+    def get_similarity_sources(self, target_ids: List[int]) -> List[Tuple[int, int]]:
+        """(source_id, target_id) pairs of stored lists that contain the targets."""
+        with self.conn.cursor() as cur:
+            if self.similarity_storage == 'lists':
+                # && is answered by the GIN index on target_ids
+                cur.execute("""
+                    SELECT l.source_id, t.target_id
+                    FROM similar_item_lists l
+                    CROSS JOIN LATERAL unnest(l.target_ids) AS t(target_id)
+                    WHERE l.target_ids && %s::int[] AND t.target_id = ANY(%s::int[])
+                """, (list(target_ids), list(target_ids)))
+                return cur.fetchall()
+            
+            cur.execute(
+                "SELECT source_id, target_id FROM similar_items WHERE target_id = ANY(%s)",
+                (list(target_ids),)
+            )
+            return cur.fetchall()
+    
+    def merge_similarities(self, entries: List[Tuple[int, int, float, Dict]], top_k: int):
+        """
+        Insert or update entries of existing neighbor lists and trim every
+        touched list back to its best top_k, in one transaction.
+        
+        Args:
+            entries: (source_id, target_id, final_score, similarity_scores) tuples
+            top_k: Length of a full list
+        """
+        if not entries:
+            return
+        if self.similarity_storage == 'lists':
+            self._merge_similarity_lists(entries, top_k)
+            return
+        
+        with self.conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO similar_items (source_id, target_id, score, similarity_details)
+                VALUES %s
+                ON CONFLICT (source_id, target_id) DO UPDATE 
+                SET score = EXCLUDED.score, similarity_details = EXCLUDED.similarity_details
+                """,
+                [
+                    (source_id, target_id, score, json.dumps(details))
+                    for source_id, target_id, score, details in entries
+                ]
+            )
+            
+            cur.execute("""
+                DELETE FROM similar_items s
+                USING (
+                    SELECT 
+                        source_id,
+                        target_id,
+                        row_number() OVER (PARTITION BY source_id ORDER BY score DESC) AS rank
+                    FROM similar_items
+                    WHERE source_id = ANY(%s)
+                ) ranked
+                WHERE 
+                    s.source_id = ranked.source_id AND
+                    s.target_id = ranked.target_id AND
+                    ranked.rank > %s
+            """, (sorted({entry[0] for entry in entries}), top_k))
+        
+        self.conn.commit()
+
+    def _merge_similarity_lists(self, entries: List[Tuple[int, int, float, Dict]], top_k: int):
+        """
+        merge_similarities for similar_item_lists: the touched lists are
+        locked and read, merged and trimmed here, and written back as whole
+        rows. Entries of sources without a stored list are ignored.
+        """
+        by_source = {}
+        for source_id, target_id, score, details in entries:
+            by_source.setdefault(source_id, {})[target_id] = (score, details)
+        
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT source_id, target_ids, scores, analytical, plot, keywords
+                FROM similar_item_lists
+                WHERE source_id = ANY(%s)
+                FOR UPDATE
+            """, (sorted(by_source),))
+            
+            lists = []
+            for source_id, target_ids, scores, analytical, plot, keywords in cur.fetchall():
+                merged = {
+                    target_id: (score, {'analytical': a, 'plot': p, 'keywords': k})
+                    for target_id, score, a, p, k in zip(target_ids, scores, analytical, plot, keywords)
+                }
+                merged.update(by_source[source_id])
+                similarities = sorted(
+                    (
+                        {'id': target_id, 'final_score': score, 'similarity_scores': details}
+                        for target_id, (score, details) in merged.items()
+                    ),
+                    key=lambda item: item['final_score'],
+                    reverse=True
+                )
+                lists.append((source_id, similarities[:top_k]))
+            
+            self._upsert_similarity_lists(cur, lists, recomputed=False)
+        
+        self.conn.commit()
+
+    def get_stale_similarity_lists(self) -> List[int]:
+        """
+        Source ids of similar_item_lists rows marked needs_recompute (a
+        neighbor was deleted, see migration 005).
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT source_id FROM similar_item_lists
+                WHERE needs_recompute
+                ORDER BY source_id
+            """)
+            return [row[0] for row in cur.fetchall()]
+
     def get_similar_shows(self, show_id: int, limit: int = 20) -> List[Dict]:
         """
-        Get pre-calculated similar shows from database.
+        Get pre-calculated similar shows from database (from
+        similar_item_lists when similarity_storage is 'lists').
         
         Args:
             show_id: ID of the show
@@ -398,6 +1243,9 @@ class VectorDB:
         Returns:
             List of similar shows with details
         """
+        if self.similarity_storage == 'lists':
+            return self.get_similar_shows_from_lists(show_id, limit)
+        
         with self.conn.cursor() as cur:
             cur.execute("""
                 SELECT 
@@ -429,6 +1277,57 @@ class VectorDB:
             
             return results
 
+    def get_similar_shows_from_lists(self, show_id: int, limit: int = 20) -> List[Dict]:
+        """
+        get_similar_shows backed by similar_item_lists: one primary key
+        lookup for the list, then the shows in list order. Returns the same
+        dicts as get_similar_shows.
+        
+        Args:
+            show_id: ID of the show
+            limit: Max number of results
+            
+        Returns:
+            List of similar shows with details
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT 
+                    m.id,
+                    m.title,
+                    m.overview,
+                    m.genres,
+                    m.year,
+                    l.scores[n.position],
+                    l.analytical[n.position],
+                    l.plot[n.position],
+                    l.keywords[n.position]
+                FROM similar_item_lists l
+                CROSS JOIN LATERAL unnest(l.target_ids) WITH ORDINALITY AS n(target_id, position)
+                JOIN media_items m ON m.id = n.target_id
+                WHERE l.source_id = %s
+                ORDER BY n.position
+                LIMIT %s
+            """, (show_id, limit))
+            
+            results = []
+            for row in cur.fetchall():
+                results.append({
+                    'id': row[0],
+                    'title': row[1],
+                    'overview': row[2],
+                    'genres': row[3],
+                    'year': row[4],
+                    'score': row[5],
+                    'similarity_details': {
+                        'analytical': row[6],
+                        'plot': row[7],
+                        'keywords': row[8]
+                    }
+                })
+            
+            return results
+
 # Weight profiles for different query intents
 WEIGHT_PROFILES = {
     'user_custom': {
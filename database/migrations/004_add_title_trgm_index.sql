@@ -0,0 +1,6 @@
+-- Trigram index for substring title search (/api/search with TITLE_INDEX_ENABLED=0)
+-- The btree idx_media_items_title cannot serve ILIKE '%q%'; a pg_trgm GIN index can.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_media_items_title_trgm ON media_items USING GIN (title gin_trgm_ops);
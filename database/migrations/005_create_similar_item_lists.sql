@@ -0,0 +1,68 @@
+-- Compact storage for pre-calculated similarities: one row per source show
+-- holding its whole neighbor list as parallel arrays, sorted by score DESC.
+-- Reading a list is one primary key lookup and one tuple, instead of one
+-- similar_items row (plus JSONB) per neighbor.
+CREATE TABLE IF NOT EXISTS similar_item_lists (
+    source_id INTEGER PRIMARY KEY REFERENCES media_items(id) ON DELETE CASCADE,
+    target_ids INTEGER[] NOT NULL,
+    scores REAL[] NOT NULL,
+    -- Per-component similarities, aligned with target_ids
+    analytical REAL[] NOT NULL,
+    plot REAL[] NOT NULL,
+    keywords REAL[] NOT NULL,
+    -- Set when a neighbor was deleted from the list (see the trigger below);
+    -- cleared when the list is rewritten by calculate_similarities.py
+    needs_recompute BOOLEAN NOT NULL DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Lists containing a given show (incremental updates of calculate_similarities)
+CREATE INDEX IF NOT EXISTS idx_similar_item_lists_target_ids ON similar_item_lists USING GIN (target_ids);
+
+-- Lists waiting for a recompute
+CREATE INDEX IF NOT EXISTS idx_similar_item_lists_needs_recompute
+    ON similar_item_lists (source_id) WHERE needs_recompute;
+
+-- Arrays cannot reference media_items, so the ON DELETE CASCADE of
+-- similar_items.target_id is done here: a deleted show is cut out of every
+-- list containing it (all parallel arrays at the same position), and the
+-- list, now one neighbor short, is marked for recompute. The next
+-- `calculate_similarities.py --storage lists --changed-ids ...` run
+-- recomputes marked lists.
+CREATE OR REPLACE FUNCTION similar_item_lists_remove_target() RETURNS trigger AS $$
+BEGIN
+    UPDATE similar_item_lists l
+    SET
+        target_ids = l.target_ids[:d.p - 1] || l.target_ids[d.p + 1:],
+        scores = l.scores[:d.p - 1] || l.scores[d.p + 1:],
+        analytical = l.analytical[:d.p - 1] || l.analytical[d.p + 1:],
+        plot = l.plot[:d.p - 1] || l.plot[d.p + 1:],
+        keywords = l.keywords[:d.p - 1] || l.keywords[d.p + 1:],
+        needs_recompute = true
+    FROM (
+        SELECT source_id, array_position(target_ids, OLD.id) AS p
+        FROM similar_item_lists
+        WHERE target_ids && ARRAY[OLD.id]
+    ) d
+    WHERE l.source_id = d.source_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS media_items_remove_similar_target ON media_items;
+CREATE TRIGGER media_items_remove_similar_target
+    AFTER DELETE ON media_items
+    FOR EACH ROW EXECUTE FUNCTION similar_item_lists_remove_target();
+
+-- Backfill from the row-per-pair table
+INSERT INTO similar_item_lists (source_id, target_ids, scores, analytical, plot, keywords)
+SELECT
+    source_id,
+    array_agg(target_id ORDER BY score DESC, target_id),
+    array_agg(score::real ORDER BY score DESC, target_id),
+    array_agg(COALESCE((similarity_details->>'analytical')::real, 0) ORDER BY score DESC, target_id),
+    array_agg(COALESCE((similarity_details->>'plot')::real, 0) ORDER BY score DESC, target_id),
+    array_agg(COALESCE((similarity_details->>'keywords')::real, 0) ORDER BY score DESC, target_id)
+FROM similar_items
+GROUP BY source_id
+ON CONFLICT (source_id) DO NOTHING;
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { getSimilarMap, type Show } from '../services/api';
 import DetailConnectionMap from './DetailConnectionMap';
 import '../styles/SimilarShows.css';
@@ -12,12 +12,20 @@ interface SimilarShowsProps {
 const ITEMS_PER_ROW = 7;
 const INITIAL_ROWS = 3;
 const MAX_ROWS = 30;
+// Rows requested from the API per page; the next page is fetched before the
+// loaded rows run out
+const PAGE_ROWS = 6;
+const PAGE_SIZE = PAGE_ROWS * ITEMS_PER_ROW;
 
 const SimilarShows: React.FC<SimilarShowsProps> = ({ showId, onBack, onShowClick }) => {
     const [sourceShow, setSourceShow] = useState<Show | null>(null);
 
-    // allSimilarShows holds the full list fetched from API (up to 210 items)
+    // allSimilarShows holds the pages fetched from the API so far (up to 210 items)
     const [allSimilarShows, setAllSimilarShows] = useState<Show[]>([]);
+    const [hasMore, setHasMore] = useState(false);
+    const isFetchingMore = useRef(false);
+    const latestShowId = useRef(showId);
+    latestShowId.current = showId;
 
     // visibleRows controls how many rows (chunks of 7) are currently rendered
     const [visibleRows, setVisibleRows] = useState(INITIAL_ROWS);
@@ -32,10 +40,11 @@ const SimilarShows: React.FC<SimilarShowsProps> = ({ showId, onBack, onShowClick
         const loadSimilar = async () => {
             setIsLoading(true);
             try {
-                const data = await getSimilarMap(showId);
+                const data = await getSimilarMap(showId, 0, PAGE_SIZE);
                 setSourceShow(data.source_item);
-                // Set full list and reset view to initial 3 rows
+                // Set first page and reset view to initial 3 rows
                 setAllSimilarShows(data.similar_items || []);
+                setHasMore(Boolean(data.has_more));
                 setVisibleRows(INITIAL_ROWS);
             } catch (error) {
                 console.error("Failed to load similar shows", error);
@@ -47,10 +56,25 @@ const SimilarShows: React.FC<SimilarShowsProps> = ({ showId, onBack, onShowClick
         loadSimilar();
     }, [showId]);
 
+    // Fetch the next page of the ranking
+    const loadMore = useCallback(async () => {
+        if (isFetchingMore.current || !hasMore) return;
+        isFetchingMore.current = true;
+        try {
+            const data = await getSimilarMap(showId, allSimilarShows.length, PAGE_SIZE);
+            // Drop a page that arrives after navigating to another show
+            if (latestShowId.current !== showId) return;
+            setAllSimilarShows(prev => prev.concat(data.similar_items || []));
+            setHasMore(Boolean(data.has_more));
+        } finally {
+            isFetchingMore.current = false;
+        }
+    }, [showId, hasMore, allSimilarShows.length]);
+
     // Infinite Scroll Handler (Throttled)
     const handleScroll = useCallback(() => {
         // Return early if we've reached max rows or ran out of items
-        if (visibleRows >= MAX_ROWS || (visibleRows * ITEMS_PER_ROW) >= allSimilarShows.length) {
+        if (visibleRows >= MAX_ROWS || (!hasMore && (visibleRows * ITEMS_PER_ROW) >= allSimilarShows.length)) {
             return;
         }
 
@@ -61,8 +85,12 @@ const SimilarShows: React.FC<SimilarShowsProps> = ({ showId, onBack, onShowClick
         if (scrolledToBottom) {
             // Append exactly one row
             setVisibleRows(prev => prev + 1);
+            // Keep at least two rows beyond the visible ones loaded
+            if ((visibleRows + 2) * ITEMS_PER_ROW > allSimilarShows.length) {
+                loadMore();
+            }
         }
-    }, [visibleRows, allSimilarShows.length]);
+    }, [visibleRows, allSimilarShows.length, hasMore, loadMore]);
 
     // Attach scroll listener with debounce
     useEffect(() => {
@@ -391,7 +391,7 @@ const TrendingHero: React.FC<TrendingHeroProps> = ({ show, onShowClick }) => {
             setFetchedSimilar(heroShow.similar);
         } else {
             // Fetch similar if not provided
-            getSimilarMap(show.id).then(data => {
+            getSimilarMap(show.id, 0, 15).then(data => {
                 if (data.similar_items && data.similar_items.length > 0) {
                     setFetchedSimilar(data.similar_items);
                 }
@@ -9,11 +9,15 @@ import {
     getPopularShows,
     getByGenre,
     getSimilarMap,
+    getSimilarBatch,
     type Show
 } from '../services/api';
 import '../styles/Dashboard.css';
 import '../styles/HomeHero.css';
 
+// Nodes shown by the hero SimilarMap
+const HERO_MAP_SIZE = 40;
+
 const Home: React.FC = () => {
     const navigate = useNavigate();
 
@@ -29,6 +33,8 @@ const Home: React.FC = () => {
     const [heroSelectedIndex, setHeroSelectedIndex] = useState(0);
     const [heroSelectedShow, setHeroSelectedShow] = useState<Show | null>(null);
     const [heroSimilarShows, setHeroSimilarShows] = useState<Show[]>([]);
+    // Similar shows of every stack item, fetched in one batch request
+    const [heroSimilarById, setHeroSimilarById] = useState<Record<number, Show[]>>({});
 
     useEffect(() => {
         const loadAllCategories = async () => {
@@ -61,12 +67,25 @@ const Home: React.FC = () => {
         loadAllCategories();
     }, []);
 
+    // Load the similar shows of the whole hero stack at once
+    useEffect(() => {
+        if (heroStackItems.length === 0) return;
+        getSimilarBatch(heroStackItems.map(show => show.id), HERO_MAP_SIZE)
+            .then(setHeroSimilarById)
+            .catch(err => console.error('Error loading hero maps', err));
+    }, [heroStackItems]);
+
     // Effect to load similar shows for the hero map when selection changes
     useEffect(() => {
         const loadHeroMap = async () => {
             if (heroSelectedShow) {
+                const batched = heroSimilarById[heroSelectedShow.id];
+                if (batched) {
+                    setHeroSimilarShows(batched);
+                    return;
+                }
                 try {
-                    const data = await getSimilarMap(heroSelectedShow.id);
+                    const data = await getSimilarMap(heroSelectedShow.id, 0, HERO_MAP_SIZE);
                     setHeroSimilarShows(data.similar_items || []);
                 } catch (err) {
                     console.error('Error loading hero map', err);
@@ -74,7 +93,7 @@ const Home: React.FC = () => {
             }
         };
         loadHeroMap();
-    }, [heroSelectedShow]);
+    }, [heroSelectedShow, heroSimilarById]);
 
     // Sync selected show when index changes
     useEffect(() => {
@@ -90,9 +90,14 @@ export async function getPopularShows(): Promise<Show[]> {
 }
 
 // Get similar items for visual similarity map with enhanced database fields
-export async function getSimilarMap(itemId: number): Promise<{ source_item: Show, similar_items: Show[] }> {
+// (one page of the ranking, which holds up to 210 items)
+export async function getSimilarMap(
+    itemId: number,
+    offset: number = 0,
+    limit: number = 210
+): Promise<{ source_item: Show, similar_items: Show[], has_more?: boolean }> {
     try {
-        const response = await fetch(`${API_BASE}/similar-map/${itemId}`);
+        const response = await fetch(`${API_BASE}/similar-map/${itemId}?offset=${offset}&limit=${limit}`);
         if (!response.ok) throw new Error('Failed to get similar items');
         return await response.json();
     } catch (error) {
@@ -101,6 +106,47 @@ export async function getSimilarMap(itemId: number): Promise<{ source_item: Show
     }
 }
 
+// Get similar items of several shows in one request, keyed by show id
+export async function getSimilarBatch(ids: number[], limit: number = 20): Promise<Record<number, Show[]>> {
+    try {
+        const response = await fetch(`${API_BASE}/similar/batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ids, limit })
+        });
+        if (!response.ok) throw new Error('Failed to get similar items');
+        const data: { results: { source_id: number, similar_items: Show[] }[] } = await response.json();
+        const bySource: Record<number, Show[]> = {};
+        for (const result of data.results) {
+            bySource[result.source_id] = result.similar_items;
+        }
+        return bySource;
+    } catch (error) {
+        console.error('Similar batch error:', error);
+        return {};
+    }
+}
+
+// Get shows similar to a set of favorites (optionally weighted) in one request
+export async function getSimilarToFavorites(
+    seeds: (number | { id: number, weight?: number })[],
+    limit: number = 20
+): Promise<Show[]> {
+    try {
+        const response = await fetch(`${API_BASE}/similar/favorites`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ seeds, limit })
+        });
+        if (!response.ok) throw new Error('Failed to get similar items');
+        const data: { similar_items: Show[] } = await response.json();
+        return data.similar_items;
+    } catch (error) {
+        console.error('Similar favorites error:', error);
+        return [];
+    }
+}
+
 // Get popular movies
 export async function getPopularMovies(): Promise<Show[]> {
     try {
@@ -0,0 +1,173 @@
+"""
+Benchmark the candidate query of VectorDB.search_multi_vector.
+
+Compares, on the same sampled source shows:
+- legacy: the original statement (Python-list vectors, each sent twice)
+- plain: the current statement as a parameterized query (vectors sent once
+  as pgvector literals)
+- prepared: the current statement as a server-side prepared statement
+
+Reports the mean/p95 latency and the size of the SQL text sent per query.
+"""
+
+import os
+import sys
+import time
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# Add app root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from vector_db import VectorDB, WEIGHT_PROFILES, as_vector, plain_statement
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LEGACY_QUERY = """
+    SELECT
+        id,
+        title,
+        overview,
+        genres,
+        (1 - (embedding_analytical <=> %s::vector)) as sim_analytical,
+        (1 - (embedding_plot <=> %s::vector)) as sim_plot,
+        keywords_json
+    FROM media_items
+    WHERE
+        embedding_analytical IS NOT NULL AND
+        embedding_plot IS NOT NULL
+    ORDER BY (
+        %s * (1 - (embedding_analytical <=> %s::vector)) +
+        %s * (1 - (embedding_plot <=> %s::vector))
+    ) DESC
+    LIMIT %s
+"""
+
+
+def sample_queries(vector_db: VectorDB, count: int) -> List[Dict[str, np.ndarray]]:
+    """Embeddings of `count` random shows."""
+    with vector_db.conn.cursor() as cur:
+        cur.execute("""
+            SELECT embedding_analytical, embedding_plot
+            FROM media_items
+            WHERE embedding_analytical IS NOT NULL AND embedding_plot IS NOT NULL
+            ORDER BY random()
+            LIMIT %s
+        """, (count,))
+        return [{'analytical': np.asarray(row[0]), 'plot': np.asarray(row[1])} for row in cur.fetchall()]
+
+
+def time_variant(run: Callable[[Dict[str, np.ndarray]], None],
+                 queries: List[Dict[str, np.ndarray]], warmup: int = 3) -> Dict[str, float]:
+    """Latency statistics (ms) of one variant over all queries."""
+    for query in queries[:warmup]:
+        run(query)
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        run(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'mean_ms': float(np.mean(timings)), 'p95_ms': float(np.percentile(timings, 95))}
+
+
+def benchmark(database_url: str, count: int = 50, limit: int = 20):
+    """Run all variants and log a comparison table."""
+    weights = WEIGHT_PROFILES['user_custom']
+    candidate_limit = min(limit * 5, 500)
+
+    plain_db = VectorDB(database_url, prepare_statements=False)
+    prepared_db = VectorDB(database_url, prepare_statements=True)
+    queries = sample_queries(plain_db, count)
+    if not queries:
+        logger.error("No shows with embeddings found")
+        return
+
+    def legacy_params(query):
+        return (
+            query['analytical'].tolist(), query['plot'].tolist(),
+            weights['analytical'], query['analytical'].tolist(),
+            weights['plot'], query['plot'].tolist(),
+            candidate_limit
+        )
+
+    def current_params(query):
+        return (
+            as_vector(query['analytical']), as_vector(query['plot']),
+            float(weights['analytical']), float(weights['plot']),
+            candidate_limit
+        )
+
+    def run_legacy(query):
+        with plain_db.conn.cursor() as cur:
+            cur.execute(LEGACY_QUERY, legacy_params(query))
+            cur.fetchall()
+        plain_db.conn.commit()
+
+    def run_current(vector_db):
+        def run(query):
+            with vector_db.conn.cursor() as cur:
+                vector_db._execute(cur, 'vdb_search_exact', current_params(query))
+                cur.fetchall()
+            vector_db.conn.commit()
+        return run
+
+    with plain_db.conn.cursor() as cur:
+        legacy_bytes = len(cur.mogrify(LEGACY_QUERY, legacy_params(queries[0])))
+        placeholders = ', '.join(['%s'] * 5)
+        prepared_bytes = len(cur.mogrify(f"EXECUTE vdb_search_exact ({placeholders})", current_params(queries[0])))
+        plain_bytes = len(cur.mogrify(plain_statement('vdb_search_exact'), current_params(queries[0])))
+
+    results = {
+        'legacy': (time_variant(run_legacy, queries), legacy_bytes),
+        'plain': (time_variant(run_current(plain_db), queries), plain_bytes),
+        'prepared': (time_variant(run_current(prepared_db), queries), prepared_bytes),
+    }
+
+    logger.info("=" * 60)
+    logger.info(f"CANDIDATE QUERY BENCHMARK ({len(queries)} queries, LIMIT {candidate_limit})")
+    logger.info("=" * 60)
+    for name, (stats, sql_bytes) in results.items():
+        logger.info(f"{name:<9} mean {stats['mean_ms']:8.2f} ms   p95 {stats['p95_ms']:8.2f} ms   "
+                    f"sql {sql_bytes / 1024:7.1f} KiB")
+    logger.info("=" * 60)
+
+    plain_db.close()
+    prepared_db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark VectorDB candidate queries")
+    parser.add_argument(
+        '--database-url',
+        default=os.getenv('DATABASE_URL'),
+        help='PostgreSQL connection string'
+    )
+    parser.add_argument(
+        '--queries',
+        type=int,
+        default=50,
+        help='Number of sampled source shows (default: 50)'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=20,
+        help='Result limit; the query fetches 5x candidates (default: 20)'
+    )
+
+    args = parser.parse_args()
+
+    if not args.database_url:
+        logger.error("DATABASE_URL not provided")
+        sys.exit(1)
+
+    benchmark(args.database_url, args.queries, args.limit)
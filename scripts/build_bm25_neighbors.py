@@ -0,0 +1,170 @@
+"""
+Precompute the BM25 overview neighbors of every popular item.
+
+Writes the table that app.py uses for the BM25 part of /similar instead of
+scoring the whole corpus per request (see backend/bm25_neighbors.py).
+
+The job is incremental: when the previous table (--previous, the deployed
+file by default) exists and was built against the same BM25 index, only items
+whose overview changed (or that entered the popular set) are re-queried. Run
+it after import_data.py / a BM25 rebuild.
+
+docker-compose mounts ./embeddings read-only at /app/embeddings, so inside
+the backend container the table is written to /tmp and copied to the host:
+
+    docker compose exec backend python scripts/build_bm25_neighbors.py
+    docker compose cp backend:/tmp/bm25_neighbors.bin ./embeddings/
+    docker compose restart backend
+"""
+
+import os
+import sys
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+import psycopg2
+
+# Add app root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bm25_index import SparseBM25
+from bm25_neighbors import BM25NeighborTable
+from text_processing import preprocess_text
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def fetch_popular_items(conn, limit: int):
+    """Fetch ids and overviews of the popular set, in popularity order."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, overview
+            FROM media_items
+            WHERE source_type='tv' AND original_language='en'
+            ORDER BY popularity DESC NULLS LAST
+            LIMIT %s
+        """, (limit,))
+        rows = cur.fetchall()
+    return [row[0] for row in rows], [row[1] or '' for row in rows]
+
+
+def build_bm25_neighbors(
+    database_url: str,
+    bm25_path: str,
+    output_path: str,
+    limit: int = 10000,
+    top_n: int = 50,
+    full: bool = False,
+    previous_path: Optional[str] = None
+):
+    """
+    Build or update the neighbor table.
+
+    Args:
+        database_url: PostgreSQL connection string
+        bm25_path: Sparse BM25 index (.npz from export_bm25_index.py)
+        output_path: Destination table file
+        limit: Size of the popular set (POPULAR_ITEMS_LIMIT in app.py)
+        top_n: BM25 documents stored per item; a /similar request for `limit`
+            results reads its BM25-only additions from the table when
+            2 * limit + 2 <= top_n and scores the corpus live otherwise
+        full: Ignore an existing table and recompute every row
+        previous_path: Existing table whose current rows are reused
+            (default: output_path)
+    """
+    index = SparseBM25.load(bm25_path)
+    logger.info(f"Loaded BM25 index {bm25_path}: {len(index)} documents")
+
+    conn = psycopg2.connect(database_url)
+    try:
+        item_ids, overviews = fetch_popular_items(conn, limit)
+    finally:
+        conn.close()
+    logger.info(f"Popular set: {len(item_ids)} items")
+
+    previous_path = previous_path or output_path
+    previous = None
+    if not full and os.path.exists(previous_path):
+        try:
+            previous = BM25NeighborTable.load(previous_path)
+            logger.info(f"Existing table {previous_path}: {len(previous)} items, "
+                        f"{len(previous.changed_items(item_ids, overviews))} new or changed")
+        except ValueError as e:
+            logger.warning(f"Ignoring existing table: {e}")
+
+    start_time = time.time()
+    table, recomputed = BM25NeighborTable.build(
+        index, item_ids, overviews, preprocess_text, top_n, previous=previous)
+    # Release the old mapping before the file is replaced
+    del previous
+    table.save(output_path)
+
+    elapsed = time.time() - start_time
+    logger.info(f"Wrote {output_path}: {len(table)} items, {recomputed} recomputed "
+                f"in {elapsed:.1f}s ({table.nbytes / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute BM25 overview neighbors of popular items")
+    parser.add_argument(
+        '--database-url',
+        default=os.getenv('DATABASE_URL'),
+        help='PostgreSQL connection URL'
+    )
+    parser.add_argument(
+        '--bm25-index',
+        default=os.getenv('BM25_INDEX_PATH', '/app/embeddings/bm25_overview.npz'),
+        help='Sparse BM25 index (.npz)'
+    )
+    parser.add_argument(
+        '--output',
+        default='/tmp/bm25_neighbors.bin',
+        help='Destination file (must be writable). /app/embeddings is mounted read-only '
+             'in the backend container: copy the file into ./embeddings on the host afterwards'
+    )
+    parser.add_argument(
+        '--previous',
+        default=os.getenv('BM25_NEIGHBORS_PATH', '/app/embeddings/bm25_neighbors.bin'),
+        help='Deployed table whose unchanged rows are reused (read only)'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=10000,
+        help='Number of popular items'
+    )
+    parser.add_argument(
+        '--top-n',
+        type=int,
+        default=50,
+        help='BM25 documents stored per item (covers /similar limits up to (top_n - 2) / 2)'
+    )
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='Recompute every row even if the existing table is current'
+    )
+
+    args = parser.parse_args()
+
+    if not args.database_url:
+        logger.error("DATABASE_URL not provided")
+        sys.exit(1)
+
+    build_bm25_neighbors(
+        args.database_url,
+        args.bm25_index,
+        args.output,
+        args.limit,
+        args.top_n,
+        args.full,
+        args.previous
+    )
@@ -1,20 +1,38 @@
 """
 Calculate and store similarities between TV shows.
 This script performs a weighted vector search for each show and stores the results.
+
+Source shows are split across a pool of worker processes, each with its own
+database connection. With --in-process the embedding matrices are loaded once
+in the parent and shared with the forked workers (copy-on-write), and each
+worker's BLAS pool is limited to its share of the CPUs. With --checkpoint-dir every worker appends the ids it
+has stored to its own file, and a rerun skips those ids, so an interrupted
+run resumes where it stopped.
+
+With --bulk the lists are streamed with COPY into an unlogged staging table
+and swapped in for similar_items in one transaction at the end, instead of
+a DELETE + INSERT + commit per show. With --storage lists every show's list
+is stored as one row of similar_item_lists instead of one row per pair; set
+SIMILARITY_STORAGE=lists so VectorDB.get_similar_shows reads that table.
+Deleting a show removes it from those lists through a trigger and marks them
+needs_recompute; every incremental run (--changed-ids, also without ids, or
+--changed-ids-file) recomputes the marked lists.
 """
 
 import os
 import logging
+import multiprocessing
 import sys
 import time
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Set
 import numpy as np
 
 # Add app root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from vector_db import VectorDB, WEIGHT_PROFILES
+from pairwise_similarity import PairwiseSimilarity
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,8 +40,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def get_all_shows_with_embeddings(vector_db: VectorDB) -> List[Dict]:
-    """Fetch all shows that have valid embeddings."""
+# --in-process engine, loaded by the parent before the workers are forked
+_SHARED_ENGINE: Optional[PairwiseSimilarity] = None
+
+def get_all_shows_with_embeddings(vector_db: VectorDB, ids: Optional[List[int]] = None) -> List[Dict]:
+    """Fetch all shows (or the given ids) that have valid embeddings."""
     with vector_db.conn.cursor() as cur:
         cur.execute("""
             SELECT 
@@ -35,9 +56,10 @@ def get_all_shows_with_embeddings(vector_db: VectorDB) -> List[Dict]:
             FROM media_items 
             WHERE 
                 embedding_analytical IS NOT NULL AND
-                embedding_plot IS NOT NULL
+                embedding_plot IS NOT NULL AND
+                (%s::int[] IS NULL OR id = ANY(%s::int[]))
             ORDER BY id
-        """)
+        """, (ids, ids))
         
         shows = []
         for row in cur.fetchall():
@@ -53,73 +75,509 @@ def get_all_shows_with_embeddings(vector_db: VectorDB) -> List[Dict]:
         
         return shows
 
+def get_show_ids_with_embeddings(vector_db: VectorDB) -> List[int]:
+    """Ids of all shows that have valid embeddings."""
+    with vector_db.conn.cursor() as cur:
+        cur.execute("""
+            SELECT id
+            FROM media_items 
+            WHERE 
+                embedding_analytical IS NOT NULL AND
+                embedding_plot IS NOT NULL
+            ORDER BY id
+        """)
+        return [row[0] for row in cur.fetchall()]
+
+def checkpoint_file(checkpoint_dir: str, worker: int) -> Path:
+    """Append-only file of the source ids stored by one worker."""
+    return Path(checkpoint_dir) / f"worker-{worker}.ids"
+
+def load_checkpoint(checkpoint_dir: Optional[str]) -> Set[int]:
+    """Source ids stored by earlier (interrupted) runs."""
+    completed = set()
+    if not checkpoint_dir or not Path(checkpoint_dir).is_dir():
+        return completed
+    for path in Path(checkpoint_dir).glob("worker-*.ids"):
+        # Only newline-terminated lines count; a line cut off by a crash
+        # is not a completed id
+        for line in path.read_text().split('\n')[:-1]:
+            if line.strip().isdigit():
+                completed.add(int(line))
+    return completed
+
+def clear_checkpoint(checkpoint_dir: str):
+    """Remove the checkpoint files after a complete run."""
+    for path in Path(checkpoint_dir).glob("worker-*.ids"):
+        path.unlink()
+
+class WorkerProgress:
+    """
+    Progress, throughput and checkpoint of one worker.
+    """
+    
+    def __init__(self, worker: int, total: int, batch_size: int, checkpoint_dir: Optional[str] = None):
+        self.worker = worker
+        self.total = total
+        self.batch_size = batch_size
+        self.processed = 0
+        self.failed = 0
+        self.start_time = time.time()
+        self.checkpoint = None
+        if checkpoint_dir:
+            Path(checkpoint_dir).mkdir(parents=True, exist_ok=True)
+            self.checkpoint = open(checkpoint_file(checkpoint_dir, self.worker), 'a')
+    
+    def done(self, source_id: int):
+        """Record a stored (committed) source show."""
+        self.processed += 1
+        if self.checkpoint:
+            self.checkpoint.write(f"{source_id}\n")
+            self.checkpoint.flush()
+        
+        if self.processed % self.batch_size == 0:
+            elapsed = time.time() - self.start_time
+            rate = self.processed / elapsed
+            remaining = (self.total - self.processed) / rate
+            logger.info(
+                f"[worker {self.worker}] Processed {self.processed}/{self.total} "
+                f"({self.processed/self.total*100:.1f}%) - {rate:.1f} shows/s - ETA: {remaining/60:.1f} min"
+            )
+    
+    def fail(self, count: int = 1):
+        """Record source shows that could not be stored."""
+        self.failed += count
+    
+    def summary(self) -> Dict:
+        """Final counters of the worker."""
+        if self.checkpoint:
+            os.fsync(self.checkpoint.fileno())
+            self.checkpoint.close()
+            self.checkpoint = None
+        elapsed = time.time() - self.start_time
+        return {
+            'worker': self.worker,
+            'processed': self.processed,
+            'failed': self.failed,
+            'seconds': elapsed,
+            'rate': self.processed / elapsed if elapsed > 0 else 0.0
+        }
+
+class SimilarityWriter:
+    """
+    Stores neighbor lists: per show with save_similarities, buffered and
+    copied into the bulk staging table, or buffered into similar_item_lists.
+    """
+    
+    def __init__(self, vector_db: VectorDB, progress: WorkerProgress, bulk: bool = False,
+                 storage: str = 'pairs', buffer_shows: int = 500):
+        self.vector_db = vector_db
+        self.progress = progress
+        self.bulk = bulk
+        self.storage = storage
+        self.buffer_shows = buffer_shows
+        self.buffer = []
+    
+    def write(self, source_id: int, similar_shows: List[Dict]):
+        """Store (or buffer) the list of one source show."""
+        if self.storage == 'pairs' and not self.bulk:
+            self.vector_db.save_similarities(source_id, similar_shows)
+            self.progress.done(source_id)
+            return
+        self.buffer.append((source_id, similar_shows))
+        if len(self.buffer) >= self.buffer_shows:
+            self.flush()
+    
+    def flush(self):
+        """Store the buffered lists; they count as done once committed."""
+        if not self.buffer:
+            return
+        buffer, self.buffer = self.buffer, []
+        try:
+            if self.storage == 'lists':
+                self.vector_db.save_similarity_lists(buffer)
+            else:
+                self.vector_db.copy_similarities(
+                    (source_id, item['id'], item['final_score'], item['similarity_scores'])
+                    for source_id, similar_shows in buffer
+                    for item in similar_shows
+                )
+        except Exception as e:
+            logger.error(f"Error storing similarities of {len(buffer)} shows: {e}")
+            self.vector_db.conn.rollback()
+            self.progress.fail(len(buffer))
+            return
+        for source_id, _ in buffer:
+            self.progress.done(source_id)
+
+def build_pairwise_engine(shows: List[Dict]) -> PairwiseSimilarity:
+    """Load the embedding matrices and keywords of the shows."""
+    return PairwiseSimilarity(
+        [show['id'] for show in shows],
+        np.stack([show['embeddings']['analytical'] for show in shows]),
+        np.stack([show['embeddings']['plot'] for show in shows]),
+        [show['keywords_json'] for show in shows]
+    )
+
+def calculate_similarities_in_process(vector_db: VectorDB, engine: PairwiseSimilarity, top_k: int,
+                                      progress: WorkerProgress, source_ids: Optional[List[int]] = None,
+                                      bulk: bool = False, storage: str = 'pairs'):
+    """
+    Compute the neighbors of the source shows in process (blocked all-pairs
+    matrix products against every show) and store them.
+    """
+    writer = SimilarityWriter(vector_db, progress, bulk, storage)
+    for source_id, results in engine.search_all(WEIGHT_PROFILES['user_custom'], limit=top_k + 1,
+                                                source_ids=source_ids):
+        try:
+            # Filter out self
+            similar_shows = [r for r in results if r['id'] != source_id][:top_k]
+            writer.write(source_id, similar_shows)
+            
+        except Exception as e:
+            logger.error(f"Error storing similarities of show {source_id}: {e}")
+            vector_db.conn.rollback()
+            progress.fail()
+            continue
+    writer.flush()
+
+def calculate_similarities_in_database(vector_db: VectorDB, shows: List[Dict], top_k: int,
+                                       progress: WorkerProgress, query_batch: int = 32,
+                                       mode: str = 'exact', ef_search: int = None, bulk: bool = False,
+                                       storage: str = 'pairs'):
+    """
+    Search the source shows in the database, query_batch shows per round
+    trip, and store their neighbors.
+    """
+    writer = SimilarityWriter(vector_db, progress, bulk, storage)
+    for batch_start in range(0, len(shows), query_batch):
+        batch = shows[batch_start:batch_start + query_batch]
+        try:
+            # One statement searches the whole batch
+            batch_results = vector_db.search_multi_vector_batch(
+                [
+                    {'query_vectors': show['embeddings'], 'query_keywords': show.get('keywords_json')}
+                    for show in batch
+                ],
+                weights=WEIGHT_PROFILES['user_custom'], # Assuming 'user_custom' is the intended weight profile
+                limit=top_k + 1,  # +1 to exclude itself
+                mode=mode,
+                ef_search=ef_search
+            )
+        except Exception as e:
+            logger.error(f"Error searching shows {batch[0]['id']}..{batch[-1]['id']}: {e}")
+            vector_db.conn.rollback()
+            progress.fail(len(batch))
+            continue
+        
+        for source_show, results in zip(batch, batch_results):
+            try:
+                # Filter out self
+                similar_shows = [r for r in results if r['id'] != source_show['id']]
+                similar_shows = similar_shows[:top_k]
+                
+                # Store results
+                writer.write(source_show['id'], similar_shows)
+                
+            except Exception as e:
+                logger.error(f"Error processing show {source_show['id']} ({source_show['title']}): {e}")
+                vector_db.conn.rollback()
+                progress.fail()
+                continue
+    writer.flush()
+
+def limit_blas_threads(threads: int):
+    """Pool initializer: cap the BLAS thread pool of a worker process."""
+    # numpy is already initialized in a forked worker, so OMP_NUM_THREADS and
+    # friends no longer apply; threadpoolctl resizes the loaded BLAS pool.
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=threads)
+
+def run_worker(task: Dict) -> Dict:
+    """
+    Process one shard of source ids on its own connection.
+    
+    Args:
+        task: Dict with 'worker', 'ids', 'database_url' and the options of
+            calculate_similarities
+    
+    Returns:
+        WorkerProgress.summary() of the shard
+    """
+    progress = WorkerProgress(task['worker'], len(task['ids']), task['batch_size'], task['checkpoint_dir'])
+    vector_db = VectorDB(task['database_url'])
+    try:
+        if task['in_process']:
+            # Targets are the whole catalog (shared with the parent), sources only this shard
+            calculate_similarities_in_process(vector_db, _SHARED_ENGINE, task['top_k'], progress,
+                                              source_ids=task['ids'], bulk=task['bulk'],
+                                              storage=task['storage'])
+        else:
+            # Keyword rerank of every search runs on the compiled keyword matrix
+            vector_db.load_keyword_matrix()
+            if task['keyword_lsh']:
+                # Keyword-similar shows become candidates alongside the vector ones
+                vector_db.load_keyword_lsh()
+            shows = get_all_shows_with_embeddings(vector_db, task['ids'])
+            calculate_similarities_in_database(vector_db, shows, task['top_k'], progress,
+                                               task['query_batch'], task['mode'], task['ef_search'],
+                                               bulk=task['bulk'], storage=task['storage'])
+    finally:
+        vector_db.close()
+    return progress.summary()
+
+def update_similarities_incremental(database_url: str, changed_ids: List[int], top_k: int = 50,
+                                    batch_size: int = 50, storage: str = 'pairs'):
+    """
+    Refresh the stored lists (similar_items, or similar_item_lists with
+    storage='lists') after a few shows were added or changed, without
+    recomputing the catalog.
+    
+    1. The neighbor lists of the changed shows are recomputed.
+    2. Reverse-neighbor merge: every changed show is scored as a neighbor of
+       every other show (O(N) each), and enters a stored list only where it
+       beats that list's K-th score. Existing entries of changed shows get
+       their new score. Touched lists are trimmed back to top_k.
+    3. A list where a changed show dropped below the old K-th score may now
+       miss a show that was never stored, so it is recomputed in full. With
+       storage='lists' so are the lists a deleted show was cut out of
+       (needs_recompute, set by the trigger of migration 005), also when
+       no show changed. Deleted ids in changed_ids are skipped.
+    
+    The merge only looks at the final score; a full run would also need the
+    show to be among the list's vector candidates (min(5 * limit, 500)), so
+    a show with a strong keyword match but weak embeddings can enter a list
+    here that a full run would not give it.
+    """
+    logger.info(f"Incremental update for {len(changed_ids)} changed shows...")
+    weights = WEIGHT_PROFILES['user_custom']
+    start_time = time.time()
+    
+    vector_db = VectorDB(database_url, similarity_storage=storage)
+    logger.info("Loading embedding matrices...")
+    engine = build_pairwise_engine(get_all_shows_with_embeddings(vector_db))
+    
+    rows = engine.keyword_matrix.rows_of(changed_ids)
+    missing = [show_id for show_id, row in zip(changed_ids, rows) if row < 0]
+    if missing:
+        logger.warning(f"Skipping {len(missing)} deleted shows or shows without complete embeddings: "
+                       f"{missing[:10]}")
+    changed = [int(engine.item_ids[row]) for row in sorted(set(rows[rows >= 0].tolist()))]
+    stale = set(vector_db.get_stale_similarity_lists()) if storage == 'lists' else set()
+    if not changed and not stale:
+        logger.warning("No changed shows to update. Exiting.")
+        vector_db.close()
+        return
+    
+    # 1. Neighbor lists of the changed shows
+    progress = WorkerProgress(0, len(changed), batch_size)
+    if changed:
+        calculate_similarities_in_process(vector_db, engine, top_k, progress, source_ids=changed, storage=storage)
+    
+    # 2. Reverse-neighbor merge into the other shows' lists
+    thresholds = np.full(len(engine), np.inf)
+    stored = vector_db.get_similarity_thresholds(top_k)
+    stored_ids = list(stored)
+    stored_rows = engine.keyword_matrix.rows_of(stored_ids)
+    known = stored_rows >= 0
+    thresholds[stored_rows[known]] = np.array([stored[show_id] for show_id in stored_ids])[known]
+    # Lists of the changed shows were just recomputed
+    changed_rows = engine.keyword_matrix.rows_of(changed)
+    thresholds[changed_rows] = np.inf
+    
+    listing = {}
+    for source_id, target_id in vector_db.get_similarity_sources(changed):
+        listing.setdefault(target_id, []).append(source_id)
+    
+    entries = []
+    # Lists that lost a deleted show are recomputed instead of merged into
+    recompute = set(stale) - set(changed)
+    for target_id, sim_analytical, sim_plot, sim_keywords, final in engine.reverse_scores(changed, weights):
+        merge = final > thresholds
+        listed_rows = engine.keyword_matrix.rows_of(listing.get(target_id, []))
+        listed_rows = listed_rows[listed_rows >= 0]
+        merge[listed_rows] = True
+        merge[changed_rows] = False
+        demoted = listed_rows[final[listed_rows] < thresholds[listed_rows]]
+        recompute.update(engine.item_ids[demoted].tolist())
+        for row in np.flatnonzero(merge):
+            entries.append((
+                int(engine.item_ids[row]),
+                target_id,
+                float(final[row]),
+                {
+                    'analytical': float(sim_analytical[row]),
+                    'plot': float(sim_plot[row]),
+                    'keywords': float(sim_keywords[row])
+                }
+            ))
+    
+    entries = [entry for entry in entries if entry[0] not in recompute]
+    vector_db.merge_similarities(entries, top_k)
+    touched = len({entry[0] for entry in entries})
+    
+    # 3. Lists that lost a changed or deleted show
+    if recompute:
+        logger.info(f"Recomputing {len(recompute)} lists where a changed or deleted show dropped out...")
+        recompute_progress = WorkerProgress(0, len(recompute), batch_size)
+        calculate_similarities_in_process(vector_db, engine, top_k, recompute_progress,
+                                          source_ids=sorted(recompute), storage=storage)
+    
+    logger.info("=" * 60)
+    logger.info("INCREMENTAL UPDATE COMPLETE")
+    logger.info(f"Computed {progress.processed} changed-show lists ({progress.failed} failed), "
+                f"merged {len(entries)} entries into {touched} lists, "
+                f"recomputed {len(recompute)} demoted lists ({len(stale)} marked stale) "
+                f"in {time.time() - start_time:.1f} seconds")
+    logger.info("=" * 60)
+    vector_db.close()
+
+def read_changed_ids(path: str) -> List[int]:
+    """Show ids listed one per line (e.g. by process_embeddings.py --changed-ids-file)."""
+    return [int(line) for line in Path(path).read_text().split() if line.strip()]
+
 def calculate_similarities(
     database_url: str,
     top_k: int = 50,
-    batch_size: int = 50
+    batch_size: int = 50,
+    mode: str = 'exact',
+    ef_search: int = None,
+    keyword_lsh: bool = False,
+    query_batch: int = 32,
+    in_process: bool = False,
+    workers: int = 1,
+    checkpoint_dir: Optional[str] = None,
+    bulk: bool = False,
+    storage: str = 'pairs'
 ):
     """
     Main function to calculate and store similarities.
     """
     logger.info("Starting similarity calculation...")
     
-    vector_db = VectorDB(database_url)
+    if in_process and (mode != 'exact' or keyword_lsh):
+        logger.warning("--in-process computes exact results; --mode/--keyword-lsh are ignored")
+    if bulk and storage == 'lists':
+        # Each list is already replaced by a single-row upsert
+        logger.warning("--bulk applies to --storage pairs only; ignored")
+        bulk = False
     
-    # 1. Fetch all shows
+    # 1. Fetch all show ids
     logger.info("Fetching shows with embeddings...")
-    shows = get_all_shows_with_embeddings(vector_db)
-    total_shows = len(shows)
+    vector_db = VectorDB(database_url)
+    show_ids = get_show_ids_with_embeddings(vector_db)
+    total_shows = len(show_ids)
     logger.info(f"Found {total_shows} shows with complete embeddings")
     
     if total_shows == 0:
         logger.warning("No shows found. Exiting.")
+        vector_db.close()
         return
-
-    # 2. Process each show
-    start_time = time.time()
-    processed = 0
     
-    for i, source_show in enumerate(shows):
+    completed = load_checkpoint(checkpoint_dir)
+    if bulk:
+        staged = vector_db.get_staged_source_count()
+        if completed and (staged is None or staged < len(completed)):
+            # Unlogged tables are emptied by a crash restart
+            logger.warning("Staging table does not hold the checkpointed lists; starting the bulk rebuild over")
+            clear_checkpoint(checkpoint_dir)
+            completed = set()
+        if not completed:
+            vector_db.create_similarity_staging()
+    vector_db.close()
+    remaining = [show_id for show_id in show_ids if show_id not in completed]
+    if completed:
+        logger.info(f"Resuming from checkpoint: {total_shows - len(remaining)} shows already stored")
+    if not remaining:
+        logger.info("Nothing left to calculate.")
+        if bulk:
+            swap_staging(database_url)
+        if checkpoint_dir:
+            clear_checkpoint(checkpoint_dir)
+        return
+
+    global _SHARED_ENGINE
+    if in_process:
+        # Loaded once here; forked workers share the matrices instead of each
+        # holding its own copy of the catalog
+        logger.info("Loading embedding matrices...")
+        vector_db = VectorDB(database_url)
         try:
-            # Perform vector search for this show
-            # We exclude the show itself in the query logic usually, but let's handle it explicitly if needed
-            # The search_multi_vector method returns top K matches
-            
-            # 2. Calculate similarities
-            results = vector_db.search_multi_vector(
-                query_vectors=source_show['embeddings'],
-                query_keywords=source_show.get('keywords_json'),
-                weights=WEIGHT_PROFILES['user_custom'], # Assuming 'user_custom' is the intended weight profile
-                limit=top_k + 1  # +1 to exclude itself
-            )
-            
-            # Filter out self
-            similar_shows = [r for r in results if r['id'] != source_show['id']]
-            similar_shows = similar_shows[:top_k]
-            
-            # Store results
-            vector_db.save_similarities(source_show['id'], similar_shows)
-            
-            processed += 1
-            
-            if processed % batch_size == 0:
-                elapsed = time.time() - start_time
-                rate = processed / elapsed
-                remaining = (total_shows - processed) / rate
-                logger.info(f"Processed {processed}/{total_shows} ({processed/total_shows*100:.1f}%) - ETA: {remaining/60:.1f} min")
-                
-        except Exception as e:
-            logger.error(f"Error processing show {source_show['id']} ({source_show['title']}): {e}")
-            vector_db.conn.rollback()
-            continue
+            _SHARED_ENGINE = build_pairwise_engine(get_all_shows_with_embeddings(vector_db))
+        finally:
+            vector_db.close()
 
+    # 2. Process the shards (round-robin split, so every worker gets a mix of ids)
+    workers = max(1, min(workers, len(remaining)))
+    tasks = [
+        {
+            'worker': worker,
+            'ids': remaining[worker::workers],
+            'database_url': database_url,
+            'top_k': top_k,
+            'batch_size': batch_size,
+            'mode': mode,
+            'ef_search': ef_search,
+            'keyword_lsh': keyword_lsh,
+            'query_batch': query_batch,
+            'in_process': in_process,
+            'checkpoint_dir': checkpoint_dir,
+            'bulk': bulk,
+            'storage': storage
+        }
+        for worker in range(workers)
+    ]
+    logger.info(f"Processing {len(remaining)} shows with {workers} worker(s)")
+    start_time = time.time()
+    
+    try:
+        if workers == 1:
+            summaries = [run_worker(tasks[0])]
+        else:
+            # Fork explicitly: the workers inherit _SHARED_ENGINE. Every worker
+            # gets cpu_count / workers BLAS threads, so the products of all
+            # workers together do not oversubscribe the CPUs.
+            context = multiprocessing.get_context('fork')
+            blas_threads = max(1, (os.cpu_count() or 1) // workers)
+            with context.Pool(workers, initializer=limit_blas_threads, initargs=(blas_threads,)) as pool:
+                summaries = pool.map(run_worker, tasks, chunksize=1)
+    finally:
+        _SHARED_ENGINE = None
+    
     total_time = time.time() - start_time
+    processed = sum(summary['processed'] for summary in summaries)
+    failed = sum(summary['failed'] for summary in summaries)
     logger.info("=" * 60)
     logger.info("CALCULATION COMPLETE")
-    logger.info(f"Processed {processed} shows in {total_time/60:.1f} minutes")
+    for summary in summaries:
+        logger.info(
+            f"  worker {summary['worker']}: {summary['processed']} shows, {summary['failed']} failed, "
+            f"{summary['rate']:.1f} shows/s"
+        )
+    logger.info(f"Processed {processed} shows in {total_time/60:.1f} minutes ({processed / total_time:.1f} shows/s)")
     logger.info("=" * 60)
     
-    vector_db.close()
+    complete = failed == 0 and processed == len(remaining)
+    if bulk:
+        if complete:
+            swap_staging(database_url)
+        else:
+            logger.warning("Not all shows were staged; similar_items was left unchanged")
+    if checkpoint_dir:
+        if complete:
+            clear_checkpoint(checkpoint_dir)
+        else:
+            logger.info(f"{failed} shows failed; rerun with the same --checkpoint-dir to retry them")
+
+def swap_staging(database_url: str):
+    """Swap the bulk staging table in for similar_items."""
+    logger.info("Building indexes and swapping in the new similar_items...")
+    start_time = time.time()
+    vector_db = VectorDB(database_url)
+    try:
+        vector_db.swap_similarity_staging()
+    finally:
+        vector_db.close()
+    logger.info(f"Swap done in {time.time() - start_time:.1f} seconds")
 
 if __name__ == "__main__":
     import argparse
@@ -137,13 +595,96 @@ if __name__ == "__main__":
         help='Number of similar items to store per show'
     )
     
+    parser.add_argument(
+        '--mode',
+        choices=['exact', 'ann'],
+        default='exact',
+        help='Retrieval mode: exact weighted scan or per-column HNSW candidates (default: exact)'
+    )
+    parser.add_argument(
+        '--ef-search',
+        type=int,
+        default=None,
+        help='hnsw.ef_search for --mode ann'
+    )
+    parser.add_argument(
+        '--keyword-lsh',
+        action='store_true',
+        help='Add MinHash LSH keyword candidates to the vector candidates'
+    )
+    parser.add_argument(
+        '--query-batch',
+        type=int,
+        default=32,
+        help='Shows searched per database round trip (default: 32)'
+    )
+    parser.add_argument(
+        '--in-process',
+        action='store_true',
+        help='Compute all pairs in process with blocked matrix products instead of per-show database searches '
+             '(the catalog is loaded once and shared with the forked workers)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Worker processes, each with its own connection and cpu_count / workers BLAS threads '
+             '(default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--checkpoint-dir',
+        default=None,
+        help='Directory of per-worker checkpoint files; an interrupted run resumes from it'
+    )
+    
+    parser.add_argument(
+        '--bulk',
+        action='store_true',
+        help='Rebuild similar_items via COPY into an unlogged staging table and swap it in atomically'
+    )
+    parser.add_argument(
+        '--storage',
+        choices=['pairs', 'lists'],
+        default=os.getenv('SIMILARITY_STORAGE', 'pairs'),
+        help='Store one similar_items row per pair, or one similar_item_lists row per show '
+             '(default: SIMILARITY_STORAGE or pairs; VectorDB.get_similar_shows reads the same setting)'
+    )
+    parser.add_argument(
+        '--changed-ids',
+        type=int,
+        nargs='*',
+        default=None,
+        help='Only refresh similarities for these added/changed show ids (incremental mode); '
+             'with no ids, only the lists marked after show deletions are recomputed'
+    )
+    parser.add_argument(
+        '--changed-ids-file',
+        default=None,
+        help='File with changed show ids, one per line (incremental mode)'
+    )
+    
     args = parser.parse_args()
     
     if not args.database_url:
         logger.error("DATABASE_URL not provided")
         sys.exit(1)
-        
-    calculate_similarities(
-        database_url=args.database_url,
-        top_k=args.top_k
-    )
+    
+    if args.changed_ids is not None or args.changed_ids_file:
+        changed_ids = list(args.changed_ids or [])
+        if args.changed_ids_file:
+            changed_ids += read_changed_ids(args.changed_ids_file)
+        update_similarities_incremental(args.database_url, changed_ids, top_k=args.top_k, storage=args.storage)
+    else:
+        calculate_similarities(
+            database_url=args.database_url,
+            top_k=args.top_k,
+            mode=args.mode,
+            ef_search=args.ef_search,
+            keyword_lsh=args.keyword_lsh,
+            query_batch=args.query_batch,
+            in_process=args.in_process,
+            workers=args.workers,
+            checkpoint_dir=args.checkpoint_dir,
+            bulk=args.bulk,
+            storage=args.storage
+        )
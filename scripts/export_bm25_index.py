@@ -0,0 +1,86 @@
+"""
+Convert the pickled rank_bm25 overview model into the sparse .npz index
+loaded by app.py (see backend/bm25_index.py).
+
+docker-compose mounts ./embeddings read-only at /app/embeddings, so inside
+the backend container the index is written to /tmp and copied to the host:
+
+    docker compose exec backend python scripts/export_bm25_index.py
+    docker compose cp backend:/tmp/bm25_overview.npz ./embeddings/
+    docker compose restart backend
+"""
+
+import os
+import sys
+import logging
+import pickle
+import random
+from pathlib import Path
+
+import numpy as np
+
+# Add app root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bm25_index import SparseBM25
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def export_bm25_index(input_path: str, output_path: str, verify: int = 20):
+    """
+    Compile the pickle into CSR arrays and check the scores are identical.
+
+    Args:
+        input_path: bm25_overview.pkl ({'bm25_model', 'item_ids'})
+        output_path: Destination .npz
+        verify: Number of corpus documents re-scored against the original
+            model as queries (0 disables the check)
+    """
+    logger.info(f"Loading {input_path}")
+    with open(input_path, 'rb') as f:
+        bm25_data = pickle.load(f)
+    model = bm25_data['bm25_model']
+
+    index = SparseBM25.from_okapi(model, bm25_data['item_ids'])
+    index.save(output_path)
+    logger.info(f"Wrote {output_path}: {len(index)} documents, {len(index.vocabulary)} terms, "
+                f"{len(index.data)} entries ({index.nbytes / 1e6:.1f} MB)")
+
+    if verify:
+        rng = random.Random(0)
+        for position in rng.sample(range(len(model.doc_freqs)), min(verify, len(model.doc_freqs))):
+            query = list(model.doc_freqs[position].keys())
+            if not np.array_equal(model.get_scores(query), index.get_scores(query)):
+                raise RuntimeError(f"Score mismatch for query built from document {position}")
+        logger.info(f"Verified {verify} queries: scores identical to rank_bm25")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert bm25_overview.pkl to a sparse .npz index")
+    parser.add_argument(
+        '--input',
+        default='/app/embeddings/bm25_overview.pkl',
+        help='Pickled BM25 model'
+    )
+    parser.add_argument(
+        '--output',
+        default='/tmp/bm25_overview.npz',
+        help='Destination .npz (must be writable). /app/embeddings is mounted read-only '
+             'in the backend container: copy the file into ./embeddings on the host afterwards'
+    )
+    parser.add_argument(
+        '--verify',
+        type=int,
+        default=20,
+        help='Number of sample queries compared against rank_bm25'
+    )
+
+    args = parser.parse_args()
+    export_bm25_index(args.input, args.output, args.verify)
@@ -0,0 +1,173 @@
+"""
+Export the popular-items embedding components into a memory-mapped store.
+
+Reads the `embeddings` JSONB column of the most popular English TV shows
+(the same set app.py serves from /similar) and writes the versioned binary
+file that app.py opens read-only at startup (see backend/embedding_store.py).
+
+docker-compose mounts ./embeddings read-only at /app/embeddings, so inside
+the backend container the store is written to /tmp and copied to the host:
+
+    docker compose exec backend python scripts/export_embedding_store.py
+    docker compose cp backend:/tmp/popular_components.bin ./embeddings/
+    docker compose restart backend
+"""
+
+import os
+import sys
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+import psycopg2
+
+# Add app root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from embedding_store import write_embedding_store
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPONENT_KEYS = ['emb_genres', 'emb_overview', 'emb_cast', 'emb_creator', 'emb_proco']
+
+
+def fetch_popular_items(conn, limit: int):
+    """Fetch ids and overviews of the popular set, in popularity order."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, overview
+            FROM media_items
+            WHERE source_type='tv' AND original_language='en'
+            ORDER BY popularity DESC NULLS LAST
+            LIMIT %s
+        """, (limit,))
+        rows = cur.fetchall()
+    return [row[0] for row in rows], [row[1] or '' for row in rows]
+
+
+def iter_component_blocks(
+    conn,
+    item_ids: List[int],
+    component_keys: List[str],
+    dim: int,
+    block_size: int
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Stream raw component blocks in the row order of item_ids using a
+    server-side cursor, so the JSONB payload is never fully in memory.
+    """
+    with conn.cursor(name='export_embedding_store') as cur:
+        cur.itersize = block_size
+        cur.execute("""
+            SELECT m.embeddings
+            FROM unnest(%s::int[]) WITH ORDINALITY AS o(id, ord)
+            JOIN media_items m ON m.id = o.id
+            ORDER BY o.ord
+        """, (list(item_ids),))
+
+        while True:
+            rows = cur.fetchmany(block_size)
+            if not rows:
+                break
+            block = {key: np.zeros((len(rows), dim), dtype=np.float32) for key in component_keys}
+            for i, (embeddings,) in enumerate(rows):
+                if not embeddings:
+                    continue
+                for key in component_keys:
+                    vector = embeddings.get(key)
+                    if vector:
+                        block[key][i] = vector
+            yield block
+
+
+def export_embedding_store(
+    database_url: str,
+    output: str,
+    limit: int = 10000,
+    dim: int = 2560,
+    component_keys: List[str] = None,
+    block_size: int = 500
+):
+    """
+    Main export function.
+
+    Args:
+        database_url: PostgreSQL connection string
+        output: Destination store file
+        limit: Size of the popular set (POPULAR_ITEMS_LIMIT in app.py)
+        dim: Component embedding dimension (EMB_DIM in app.py)
+        component_keys: Components to export, in weight order
+        block_size: Rows fetched and normalized per block
+    """
+    component_keys = component_keys or DEFAULT_COMPONENT_KEYS
+    start_time = time.time()
+
+    conn = psycopg2.connect(database_url)
+    try:
+        item_ids, overviews = fetch_popular_items(conn, limit)
+        logger.info(f"Exporting {len(item_ids)} items x {len(component_keys)} components to {output}")
+
+        write_embedding_store(
+            output,
+            item_ids,
+            overviews,
+            dim,
+            component_keys,
+            iter_component_blocks(conn, item_ids, component_keys, dim, block_size),
+            meta={
+                'limit': limit,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+        )
+    finally:
+        conn.close()
+
+    logger.info(f"Export finished in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export popular-item embeddings to a memory-mapped store")
+    parser.add_argument(
+        '--database-url',
+        default=os.getenv('DATABASE_URL'),
+        help='PostgreSQL connection string'
+    )
+    parser.add_argument(
+        '--output',
+        default='/tmp/popular_components.bin',
+        help='Destination store file (must be writable). /app/embeddings is mounted read-only '
+             'in the backend container: copy the file into ./embeddings on the host afterwards'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=10000,
+        help='Number of popular shows to export'
+    )
+    parser.add_argument(
+        '--block-size',
+        type=int,
+        default=500,
+        help='Rows processed per block'
+    )
+
+    args = parser.parse_args()
+
+    if not args.database_url:
+        logger.error("DATABASE_URL not provided")
+        sys.exit(1)
+
+    export_embedding_store(
+        database_url=args.database_url,
+        output=args.output,
+        limit=args.limit,
+        block_size=args.block_size
+    )
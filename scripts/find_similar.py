@@ -1,11 +1,12 @@
 """
-Find similar shows for a given TV show on-demand.
+Find similar shows for one or more TV shows on-demand.
 """
 
 import os
 import sys
 import logging
 from pathlib import Path
+from typing import List
 
 # Add app root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -19,21 +20,27 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def find_similar_shows(show_title: str, database_url: str, limit: int = 20):
+def find_similar_shows(show_titles: List[str], database_url: str, limit: int = 20,
+                       mode: str = 'exact', ef_search: int = None, check_recall: bool = False):
     """
-    Find similar shows for a given show title.
+    Find similar shows for the given show titles.
+    
+    All titles are searched with one batched query.
     
     Args:
-        show_title: Title of the show to search for
+        show_titles: Titles of the shows to search for
         database_url: Database connection URL
-        limit: Number of similar shows to return
+        limit: Number of similar shows to return per show
+        mode: Retrieval mode of search_multi_vector ('exact' or 'ann')
+        ef_search: hnsw.ef_search for the ANN mode
+        check_recall: Also compare the ANN mode against the exact path
     """
     vector_db = VectorDB(database_url)
     
-    # Fetch the show and its embeddings + keywords
+    # Fetch the shows and their embeddings + keywords
     with vector_db.conn.cursor() as cur:
         cur.execute("""
-            SELECT 
+            SELECT DISTINCT ON (LOWER(title))
                 id, 
                 title,
                 embedding_analytical,
@@ -41,20 +48,21 @@ def find_similar_shows(show_title: str, database_url: str, limit: int = 20):
                 keywords_json
             FROM media_items 
             WHERE 
-                LOWER(title) = LOWER(%s) AND
+                LOWER(title) = ANY(%s) AND
                 embedding_analytical IS NOT NULL AND
                 embedding_plot IS NOT NULL
-            LIMIT 1
-        """, (show_title,))
-        
-        row = cur.fetchone()
+            ORDER BY LOWER(title), id
+        """, ([title.lower() for title in show_titles],))
         
+        rows = {row[1].lower(): row for row in cur.fetchall()}
+    
+    source_shows = []
+    for show_title in show_titles:
+        row = rows.get(show_title.lower())
         if not row:
             logger.error(f"Show not found or embeddings not available: {show_title}")
-            vector_db.close()
-            return
-        
-        source_show = {
+            continue
+        source_shows.append({
             'id': row[0],
             'title': row[1],
             'embeddings': {
@@ -62,41 +70,64 @@ def find_similar_shows(show_title: str, database_url: str, limit: int = 20):
                 'plot': row[3]
             },
             'keywords': row[4] if row[4] else None
-        }
+        })
+    
+    if not source_shows:
+        vector_db.close()
+        return
     
-    logger.info(f"Found show: {source_show['title']} (ID: {source_show['id']})")
+    for source_show in source_shows:
+        logger.info(f"Found show: {source_show['title']} (ID: {source_show['id']})")
     logger.info(f"Searching for {limit} similar shows using weight profile: user_custom")
     logger.info(f"Weights: {WEIGHT_PROFILES['user_custom']}")
     
     # Search for similar shows using hybrid approach
-    results = vector_db.search_multi_vector(
-        query_vectors=source_show['embeddings'],
-        query_keywords=source_show['keywords'],
+    batch_results = vector_db.search_multi_vector_batch(
+        [
+            {'query_vectors': source_show['embeddings'], 'query_keywords': source_show['keywords']}
+            for source_show in source_shows
+        ],
         weights=WEIGHT_PROFILES['user_custom'],
-        limit=limit + 1  # +1 to exclude itself
+        limit=limit + 1,  # +1 to exclude itself
+        mode=mode,
+        ef_search=ef_search
     )
     
-    # Filter out the source show itself
-    similar_shows = [r for r in results if r['id'] != source_show['id']][:limit]
-    
-    # Display results
-    print("\n" + "="*80)
-    print(f"SIMILAR SHOWS TO: {source_show['title']}")
-    print("="*80)
-    
-    for i, show in enumerate(similar_shows, 1):
-        print(f"\n{i}. {show['title']}")
-        print(f"   Score: {show['final_score']:.4f}")
-        print(f"   Genres: {show['genres']}")
-        print(f"   Detail Scores:")
-        print(f"     - Analytical: {show['similarity_scores']['analytical']:.4f}")
-        print(f"     - Plot:       {show['similarity_scores']['plot']:.4f}")
-        print(f"     - Keywords:   {show['similarity_scores']['keywords']:.4f}")
-        if show['overview']:
-            overview = show['overview'][:100] + "..." if len(show['overview']) > 100 else show['overview']
-            print(f"   Overview: {overview}")
-    
-    print("\n" + "="*80)
+    for source_show, results in zip(source_shows, batch_results):
+        # Filter out the source show itself
+        similar_shows = [r for r in results if r['id'] != source_show['id']][:limit]
+        
+        # Display results
+        print("\n" + "="*80)
+        print(f"SIMILAR SHOWS TO: {source_show['title']}")
+        print("="*80)
+        
+        for i, show in enumerate(similar_shows, 1):
+            print(f"\n{i}. {show['title']}")
+            print(f"   Score: {show['final_score']:.4f}")
+            print(f"   Genres: {show['genres']}")
+            print(f"   Detail Scores:")
+            print(f"     - Analytical: {show['similarity_scores']['analytical']:.4f}")
+            print(f"     - Plot:       {show['similarity_scores']['plot']:.4f}")
+            print(f"     - Keywords:   {show['similarity_scores']['keywords']:.4f}")
+            if show['overview']:
+                overview = show['overview'][:100] + "..." if len(show['overview']) > 100 else show['overview']
+                print(f"   Overview: {overview}")
+        
+        print("\n" + "="*80)
+        
+        if check_recall:
+            report = vector_db.ann_recall(
+                query_vectors=source_show['embeddings'],
+                query_keywords=source_show['keywords'],
+                weights=WEIGHT_PROFILES['user_custom'],
+                limit=limit + 1,
+                ef_search=ef_search
+            )
+            logger.info(
+                f"ANN recall@{limit + 1} for {source_show['title']}: {report['recall']:.3f} "
+                f"(exact {report['exact_ms']:.1f} ms, ann {report['ann_ms']:.1f} ms)"
+            )
     
     vector_db.close()
 
@@ -106,9 +137,10 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description="Find similar TV shows")
     parser.add_argument(
-        'show_title',
+        'show_titles',
         type=str,
-        help='Title of the TV show'
+        nargs='+',
+        help='Titles of the TV shows'
     )
     parser.add_argument(
         '--database-url',
@@ -119,7 +151,25 @@ if __name__ == "__main__":
         '--limit',
         type=int,
         default=20,
-        help='Number of similar shows to return (default: 20)'
+        help='Number of similar shows to return per show (default: 20)'
+    )
+    
+    parser.add_argument(
+        '--mode',
+        choices=['exact', 'ann'],
+        default='exact',
+        help='Retrieval mode: exact weighted scan or per-column HNSW candidates (default: exact)'
+    )
+    parser.add_argument(
+        '--ef-search',
+        type=int,
+        default=None,
+        help='hnsw.ef_search for --mode ann'
+    )
+    parser.add_argument(
+        '--check-recall',
+        action='store_true',
+        help='Report recall and latency of the ANN mode against the exact path'
     )
     
     args = parser.parse_args()
@@ -128,4 +178,5 @@ if __name__ == "__main__":
         logger.error("DATABASE_URL not provided")
         sys.exit(1)
     
-    find_similar_shows(args.show_title, args.database_url, args.limit)
+    find_similar_shows(args.show_titles, args.database_url, args.limit,
+                       mode=args.mode, ef_search=args.ef_search, check_recall=args.check_recall)
@@ -5,13 +5,20 @@ Bu script TMDB_tv_dataset.csv dosyasından TV dizi verilerini okuyup PostgreSQL
 """
 
 import os
+import sys
 import csv
 import json
 import psycopg2
 import psycopg2.extras
 from datetime import datetime
+from pathlib import Path
 from dotenv import load_dotenv
 
+# Add app root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from catalog_version import bump_catalog_version
+
 # Environment değişkenlerini yükle
 load_dotenv()
 
@@ -179,6 +186,9 @@ def import_tv_shows():
         cur.close()
         conn.close()
         print("\n✅ Veritabanı bağlantısı kapatıldı")
+        # Çalışan uygulamadaki önbellekler (liste cevapları vb.) yenilensin
+        bump_catalog_version()
+        print("🔄 Katalog sürümü güncellendi, API önbellekleri yenilenecek")
 
 def insert_batch(cursor, batch):
     """Batch insert işlemi yapar"""
@@ -64,26 +64,25 @@ def get_show_by_title(vector_db: VectorDB, title: str) -> Dict:
         }
 
 
-def calculate_match_score(vector_db: VectorDB, source_show: Dict, expected_similar_title: str, weights: Dict) -> float:
+def load_golden_sources(vector_db: VectorDB, golden_set: List[Tuple[str, str]]) -> Dict[str, Dict]:
+    """Fetch every distinct source show of the golden set once (title -> show)."""
+    sources = {}
+    for source_title, _ in golden_set:
+        if source_title in sources:
+            continue
+        source_show = get_show_by_title(vector_db, source_title)
+        if not source_show:
+            logger.warning(f"Source show not found: {source_title}")
+            continue
+        sources[source_title] = source_show
+    return sources
+
+
+def calculate_match_score(results: List[Dict], expected_similar_title: str) -> float:
     """
     Calculate how well a weight configuration performs for a single expected match.
     Returns a score between 0 and 1 (higher is better).
     """
-    # Ensure weights are plain Python floats (not numpy types)
-    clean_weights = {
-        'analytical': float(weights['analytical']),
-        'plot': float(weights['plot']),
-        'keywords': float(weights['keywords'])
-    }
-    
-    # Perform search with given weights
-    results = vector_db.search_multi_vector(
-        query_vectors=source_show['embeddings'],
-        query_keywords=source_show.get('keywords'),
-        weights=clean_weights,
-        limit=50  # Check top 50
-    )
-    
     # Find the rank of expected match
     for rank, result in enumerate(results, start=1):
         if result['title'] == expected_similar_title:
@@ -95,21 +94,44 @@ def calculate_match_score(vector_db: VectorDB, source_show: Dict, expected_simil
     return 0.0
 
 
-def evaluate_weights(vector_db: VectorDB, weights: Dict, golden_set: List[Tuple[str, str]]) -> float:
+def evaluate_weights(vector_db: VectorDB, weights: Dict, golden_set: List[Tuple[str, str]],
+                     sources: Dict[str, Dict] = None) -> float:
     """
     Evaluate a weight configuration across all golden set pairs.
+    Every source show is searched once, all of them in one batched query.
     Returns average score.
     """
+    if sources is None:
+        sources = load_golden_sources(vector_db, golden_set)
+    if not sources:
+        return 0.0
+    
+    # Ensure weights are plain Python floats (not numpy types)
+    clean_weights = {
+        'analytical': float(weights['analytical']),
+        'plot': float(weights['plot']),
+        'keywords': float(weights['keywords'])
+    }
+    
+    # Perform search with given weights
+    titles = list(sources)
+    batch_results = vector_db.search_multi_vector_batch(
+        [
+            {'query_vectors': sources[title]['embeddings'], 'query_keywords': sources[title].get('keywords')}
+            for title in titles
+        ],
+        weights=clean_weights,
+        limit=50  # Check top 50
+    )
+    results_by_title = dict(zip(titles, batch_results))
+    
     scores = []
     
     for source_title, expected_title in golden_set:
-        source_show = get_show_by_title(vector_db, source_title)
-        
-        if not source_show:
-            logger.warning(f"Source show not found: {source_title}")
+        if source_title not in results_by_title:
             continue
         
-        score = calculate_match_score(vector_db, source_show, expected_title, weights)
+        score = calculate_match_score(results_by_title[source_title], expected_title)
         scores.append(score)
         logger.debug(f"{source_title} -> {expected_title}: Score = {score:.4f}")
     
@@ -133,6 +155,8 @@ def grid_search_weights(vector_db: VectorDB, step: float = 0.05) -> Tuple[Dict,
     logger.info("Starting grid search for optimal weights...")
     logger.info(f"Step size: {step}")
     
+    sources = load_golden_sources(vector_db, GOLDEN_SET)
+    
     # Generate all possible weight combinations that sum to 1.0
     best_weights = None
     best_score = -1
@@ -171,7 +195,7 @@ def grid_search_weights(vector_db: VectorDB, step: float = 0.05) -> Tuple[Dict,
                 'keywords': keywords
             }
             
-            score = evaluate_weights(vector_db, weights, GOLDEN_SET)
+            score = evaluate_weights(vector_db, weights, GOLDEN_SET, sources)
             evaluated += 1
             
             if score > best_score:
@@ -208,6 +232,8 @@ def main():
         sys.exit(1)
     
     vector_db = VectorDB(args.database_url)
+    # Keyword rerank of every search runs on the compiled keyword matrix
+    vector_db.load_keyword_matrix()
     
     # Verify golden set shows exist
     logger.info("Verifying golden set...")
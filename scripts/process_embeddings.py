@@ -126,7 +126,8 @@ def process_embeddings(
     results_dir: str,
     database_url: str,
     batch_size: int = 32,
-    limit: int = None
+    limit: int = None,
+    changed_ids_file: str = None
 ):
     """
     Main processing function: load data, generate embeddings, store in DB.
@@ -136,6 +137,8 @@ def process_embeddings(
         database_url: PostgreSQL connection string
         batch_size: Number of shows to process at once
         limit: Maximum number of shows to process (optional)
+        changed_ids_file: Write the ids of the embedded shows here, one per
+            line, for calculate_similarities.py --changed-ids-file (optional)
     """
     logger.info("Starting embedding processing pipeline")
     
@@ -169,6 +172,7 @@ def process_embeddings(
     # Process in batches
     total = len(show_data)
     processed = 0
+    changed_ids = []
     
     for i in range(0, total, batch_size):
         batch = show_data[i:i+batch_size]
@@ -202,10 +206,15 @@ def process_embeddings(
         if keywords_data:
             vector_db.insert_keywords_batch(keywords_data)
         
+        changed_ids.extend(show_id for show_id, _ in db_data)
         processed += len(batch)
         logger.info(f"Progress: {processed}/{total} ({processed/total*100:.1f}%)")
 
     
+    if changed_ids_file:
+        Path(changed_ids_file).write_text(''.join(f"{show_id}\n" for show_id in changed_ids))
+        logger.info(f"Wrote {len(changed_ids)} changed show ids to {changed_ids_file}")
+    
     # Print statistics
     stats = vector_db.get_embedding_stats()
     logger.info("=" * 60)
@@ -246,6 +255,11 @@ if __name__ == "__main__":
         default=None,
         help='Limit number of shows to process'
     )
+    parser.add_argument(
+        '--changed-ids-file',
+        default=None,
+        help='Write the embedded show ids to this file (input of calculate_similarities.py --changed-ids-file)'
+    )
     
     args = parser.parse_args()
     
@@ -257,5 +271,6 @@ if __name__ == "__main__":
         results_dir=args.results_dir,
         database_url=args.database_url,
         batch_size=args.batch_size,
-        limit=args.limit
+        limit=args.limit,
+        changed_ids_file=args.changed_ids_file
     )